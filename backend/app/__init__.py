@@ -1,32 +1,90 @@
 import os
+import hmac
 import logging
-from flask import Flask
+from flask import Flask, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
 
 from app.routes.export_docx import export_bp
 from app.routes.export_pandoc import pandoc_export_bp
+from app.routes.export_pdf import pdf_export_bp
+from app.routes.export_bundle import bundle_export_bp
 
 from app.blueprints.authorization import auth_bp
 from app.blueprints.api import api_bp
 from app.blueprints.smart import smart_bp
-from .blueprints.stripe import stripe_bp
-from openai import OpenAI
-from app.utils.embeddings import get_embedder
+from .blueprints.stripe import stripe_bp, warm_catalog
+from app.utils.embeddings import get_embedder, set_torch_threads
+from app.services.smart_resume_advisor import get_kw
+from app.services.docx_skeletons import warm_skeletons
+from app.services.pdf_renderer import warm_pdf_templates
+from app.services.export_cache import get_export_cache
+from app.services.profile_cache import get_profile_cache
+from app.utils.auth_tokens import get_token_verifier
+from app.services.stripe_events import get_stripe_event_worker, resume_pending_events
+from app.services.subscription_cache import get_subscription_cache
+from app.services.subscription_reconcile import start_reconcile_schedule
+from app.services.llm_gateway import get_llm_gateway
+from app.services.llm_cache import get_llm_cache
+from app.services.speculative_enrich import get_speculative_enrichment
+from app.services.analysis_pool import get_analysis_pool, warm_analysis_pool
+from app.services.admission import admission_stats
+from app.services.singleflight import singleflight_stats
+from app.services.analysis_jobs import get_analysis_jobs, recover_analysis_jobs
+from app.utils.leader import run_as_leader
+from app.utils.storage import check_durable_storage
+
+
+def preloading() -> bool:
+    """True when gunicorn loads the app in the master and forks workers from it (gunicorn.conf.py)."""
+    return os.getenv("APP_PRELOAD") == "1"
+
+
+def start_leader_services():
+    """
+    Background jobs that must run once per host, not once per worker.
+
+    Started by the worker holding the leader lock (app.utils.leader); another
+    worker takes over if that one exits.
+    """
+    resume_pending_events()  # webhook events logged before the last restart
+    start_reconcile_schedule()  # every SUBSCRIPTION_RECONCILE_INTERVAL seconds (default 1h, 0 = off)
+    warm_catalog()  # look up / create Stripe products and prices once
+    recover_analysis_jobs()  # refund analysis jobs a dead worker left unfinished
+
+
+def start_background_services():
+    """
+    Threads, processes and connections owned by one serving process.
+
+    None of these survive a fork, so under preload they are started in each
+    worker by the post_fork hook instead of in create_app().
+    """
+    warm_analysis_pool()  # ANALYSIS_WORKERS > 0 runs the advisor in worker processes
+    run_as_leader(start_leader_services)
+
 
 def create_app():
     load_dotenv()
+    # Under gunicorn (production) refuse to keep unprocessed state in the temp dir
+    check_durable_storage(strict=preloading())
     app = Flask(__name__)
+    if preloading():
+        # No intra-op thread pool in the master; workers size theirs after fork
+        set_torch_threads(1)
+    # Models and static tables are loaded once; under preload forked workers share them
     get_embedder()  # load SentenceTransformer at startup, not on first request
+    get_kw()
+    warm_skeletons()  # build styled DOCX base documents once per process
+    warm_pdf_templates()
     app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev")
 
     # Reduce noisy logs from httpx/stripe
     logging.getLogger("httpx").setLevel(logging.WARNING)
     logging.getLogger("stripe").setLevel(logging.WARNING)
 
-    openai_key = os.getenv("OPENAI_API_KEY")
-    app.config["OPENAI_CLIENT"] = OpenAI(api_key=openai_key) if openai_key else None
-    app.logger.info("OpenAI configured: %s", bool(openai_key))
+    # OpenAI calls go through the shared LLM gateway (app.services.llm_gateway)
+    app.logger.info("OpenAI configured: %s", bool(os.getenv("OPENAI_API_KEY")))
 
 
     CORS(
@@ -41,7 +99,8 @@ def create_app():
                 ],
                 "supports_credentials": True,
                 "methods": ["GET", "POST", "OPTIONS"],
-                "allow_headers": ["Content-Type", "Authorization", "X-Requested-With", "X-User-Id"],
+                "allow_headers": ["Content-Type", "Authorization", "X-Requested-With", "X-User-Id", "If-None-Match"],
+                "expose_headers": ["ETag", "Retry-After"],
             },
         },
     )
@@ -53,11 +112,49 @@ def create_app():
     app.register_blueprint(auth_bp)
     app.register_blueprint(export_bp)
     app.register_blueprint(pandoc_export_bp)
+    app.register_blueprint(pdf_export_bp)
+    app.register_blueprint(bundle_export_bp)
+
+    if not preloading():
+        start_background_services()
 
     @app.get("/health")
     def health():
         return {"status": "ok"}
 
+    @app.get("/metrics")
+    def metrics():
+        """
+        Internal counters. With METRICS_TOKEN set, requires
+        "Authorization: Bearer <token>"; without it, only local requests
+        (e.g. the container's own health tooling) are answered.
+        """
+        from app.utils.memory_report import process_memory  # also runs as a script (python -m)
+
+        token = os.getenv("METRICS_TOKEN")
+        if token:
+            given = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+            if not hmac.compare_digest(given.encode("utf-8"), token.encode("utf-8")):
+                return jsonify({"error": "forbidden"}), 403
+        elif request.remote_addr not in ("127.0.0.1", "::1"):
+            return jsonify({"error": "forbidden"}), 403
+
+        return {
+            "profile_cache": get_profile_cache().stats(),
+            "export_cache": get_export_cache().stats(),
+            "auth": get_token_verifier().stats(),
+            "stripe_events": get_stripe_event_worker().stats(),
+            "subscriptions": get_subscription_cache().stats(),
+            "llm": get_llm_gateway().stats() if get_llm_gateway() else None,
+            "llm_cache": get_llm_cache().stats(),
+            "llm_speculative": get_speculative_enrichment().stats(),
+            "analysis_pool": get_analysis_pool().stats() if get_analysis_pool() else None,
+            "admission": admission_stats(),
+            "analysis_jobs": get_analysis_jobs().stats(),
+            "singleflight": singleflight_stats(),
+            "memory": process_memory(),
+        }
+
     @app.get("/_ah/warmup")
     def warmup():
         get_embedder()
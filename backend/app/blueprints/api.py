@@ -2,6 +2,8 @@ import os
 from flask import Blueprint, request, jsonify
 from werkzeug.exceptions import BadRequest
 from app.utils.extractors import extract_any, sniff_ext
+from app.services.admission import admission
+from app.services.singleflight import singleflight
 
 from app.utils.embeddings import get_embedder
 import os
@@ -30,6 +32,7 @@ STOPWORDS = {
 }
 
 @api_bp.post("/extract")
+@admission("extract")
 def extract_file():
     if "file" not in request.files:
         raise BadRequest("No file provided")
@@ -74,6 +77,7 @@ def _as_text(v):
 
 
 @api_bp.route("/score", methods=["POST", "OPTIONS"])
+@singleflight("score")
 def score_resume_to_job():
     # Handle CORS preflight
     if request.method == "OPTIONS":
@@ -1,55 +1,32 @@
-import os, time, mimetypes, traceback
+import os, traceback
 from flask import Blueprint, request, jsonify, make_response, Response
 import json
-from supabase import create_client
-from dotenv import load_dotenv
+from app.utils.supabase_client import get_supabase
+from app.utils.auth_tokens import bearer_token, current_identity
+from app.services.profile_cache import get_profile_cache
+from app.services.avatar_pipeline import AvatarBusyError, AvatarError, process_avatar, upload_avatar
 import logging
 logger = logging.getLogger(__name__)
 auth_bp = Blueprint("auth_api", __name__, url_prefix="/api")
 
-def _get_supabase():
-    load_dotenv()
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-    if not url or not key:
-        return None
-    return create_client(url, key)
-def _bearer_token():
-    auth = request.headers.get("Authorization", "")
-    if auth.startswith("Bearer "):
-        return auth[len("Bearer "):]
-    return None
-def _resolve_user(supabase, token):
-    user = None
-    try:
-        if hasattr(supabase.auth, "api") and hasattr(supabase.auth.api, "get_user"):
-            resp = supabase.auth.api.get_user(token)
-            user = (resp.get("data") or {}).get("user") if isinstance(resp, dict) else getattr(resp, "user", None)
-        elif hasattr(supabase.auth, "get_user"):
-            resp2 = supabase.auth.get_user(token)
-            user = (resp2.get("data") or {}).get("user") if isinstance(resp2, dict) else getattr(resp2, "user", None)
-    except Exception:
-        user = None
-    if not user:
+def _resolve_user():
+    identity = current_identity()
+    if not identity:
         return None, None, None
-    if isinstance(user, dict):
-        return user.get("id"), user.get("email"), user.get("user_metadata") or {}
-    return getattr(user, "id", None), getattr(user, "email", None), getattr(user, "user_metadata", {}) or {}
+    return identity.uid, identity.email, identity.metadata
 
 @auth_bp.post("/auth/create_profile")
 def create_profile():
     """Create profile once after signup with starter credits (no full_name)."""
     try:
-        supabase = _get_supabase()
+        supabase = get_supabase()
         if not supabase:
             return jsonify({"error": "server_misconfigured"}), 500
 
-        auth = request.headers.get("Authorization", "")
-        if not auth.lower().startswith("bearer "):
+        if not bearer_token():
             return jsonify({"error": "unauthorized"}), 401
-        token = auth.split(" ", 1)[1].strip()
 
-        uid, email, _meta = _resolve_user(supabase, token)
+        uid, email, _meta = _resolve_user()
         if not uid:
             return jsonify({"error": "unauthorized"}), 401
 
@@ -63,6 +40,7 @@ def create_profile():
             supabase.table("profiles").upsert(row, on_conflict="user_id").execute()
         except TypeError:
             supabase.table("profiles").upsert(row).execute()
+        get_profile_cache().invalidate(uid)
 
         return jsonify({"user_id": uid, "email": email, "credits": 10, "avatar_url": None}), 200
     except Exception:
@@ -71,26 +49,20 @@ def create_profile():
 
 @auth_bp.get("/me")
 def me():
-    token = _bearer_token()
-
     """Return current user id, email, credits, avatar_url."""
     try:
-        supabase = _get_supabase()
+        supabase = get_supabase()
         if not supabase:
             return jsonify({"error": "server_misconfigured"}), 500
 
-        auth = request.headers.get("Authorization", "")
-        if not auth.lower().startswith("bearer "):
+        if not bearer_token():
             return jsonify({"error": "unauthorized"}), 401
-        token = auth.split(" ", 1)[1].strip()
 
-        uid, email, _meta = _resolve_user(supabase, token)
+        uid, email, _meta = _resolve_user()
         if not uid:
             return jsonify({"error": "unauthorized"}), 401
 
-        res = supabase.table("profiles").select("credits, avatar_url, subscription_id, subscription_status, subscription_period_end").eq("user_id", uid).limit(1).execute()
-        raw = res.get("data") if isinstance(res, dict) else getattr(res, "data", None)
-        row = raw[0] if isinstance(raw, list) and raw else {}
+        row = get_profile_cache().get(uid) or {}
 
         return jsonify({
             "user_id": uid,
@@ -109,16 +81,14 @@ def me():
 def update_profile():
     """Upload/replace avatar. multipart/form-data field 'avatar'."""
     try:
-        supabase = _get_supabase()
+        supabase = get_supabase()
         if not supabase:
             return jsonify({"error": "server_misconfigured"}), 500
 
-        auth = request.headers.get("Authorization", "")
-        if not auth.lower().startswith("bearer "):
+        if not bearer_token():
             return jsonify({"error": "unauthorized"}), 401
-        token = auth.split(" ", 1)[1].strip()
 
-        uid, email, _meta = _resolve_user(supabase, token)
+        uid, email, _meta = _resolve_user()
         if not uid:
             return jsonify({"error": "unauthorized"}), 401
 
@@ -129,22 +99,28 @@ def update_profile():
         if not avatar_file:
             return jsonify({"error": "no_file"}), 400
 
-        bucket = os.getenv("SUPABASE_AVATAR_BUCKET", "avatars")
         try:
-            supabase.storage.create_bucket(bucket, {"public": True})
-        except Exception:
-            pass
+            avatar = process_avatar(avatar_file.stream, uid)
+        except AvatarError as e:
+            status = 413 if str(e) == "file_too_large" else 400
+            return jsonify({"error": str(e)}), status
+        except AvatarBusyError as e:
+            resp = jsonify({"error": str(e), "message": "Avatar processing is busy, please retry shortly."})
+            resp.headers["Retry-After"] = "5"
+            return resp, 503
 
-        ext = os.path.splitext(avatar_file.filename or "")[1].lower() or ".bin"
-        mime = mimetypes.guess_type(avatar_file.filename or "")[0] or "application/octet-stream"
-        path = f"{uid}/{int(time.time())}{ext}"
-        data = avatar_file.read()
+        bucket = os.getenv("SUPABASE_AVATAR_BUCKET", "avatars")
+        path = avatar.primary.path
 
-        try:
-            supabase.storage.from_(bucket).upload(path, data, {"content-type": mime})
-        except Exception as e:
-            logger.error(f"Storage upload failed: {e}")
-            return jsonify({"error": f"upload_failed: {str(e)}"}), 500
+        current = get_profile_cache().get(uid) or {}
+        unchanged = (current.get("avatar_url") or "").split("?")[0].endswith(path)
+
+        if not unchanged:
+            try:
+                upload_avatar(supabase, bucket, avatar)
+            except Exception as e:
+                logger.error(f"Storage upload failed: {e}")
+                return jsonify({"error": f"upload_failed: {str(e)}"}), 500
 
         # Get public URL (no expiry)
         try:
@@ -168,21 +144,21 @@ def update_profile():
             logger.error(f"Public URL failed: {e}")
             return jsonify({"error": f"public_url_error: {str(e)}"}), 500
 
-        # Update database
-        update = {"user_id": uid, "avatar_url": avatar_url}
-        try:
-            supabase.table("profiles").upsert(update, on_conflict="user_id").execute()
-        except TypeError:
-            supabase.table("profiles").upsert(update).execute()
-        except Exception as e:
-            logger.error(f"Profile update failed: {e}")
-            return jsonify({"error": f"db_update_failed: {str(e)}"}), 500
+        # Update database (skipped when the same picture is already in place)
+        if not unchanged:
+            update = {"user_id": uid, "avatar_url": avatar_url}
+            try:
+                supabase.table("profiles").upsert(update, on_conflict="user_id").execute()
+            except TypeError:
+                supabase.table("profiles").upsert(update).execute()
+            except Exception as e:
+                logger.error(f"Profile update failed: {e}")
+                return jsonify({"error": f"db_update_failed: {str(e)}"}), 500
+            get_profile_cache().update(uid, {"avatar_url": avatar_url})
 
         # Fetch updated profile
         try:
-            sel = supabase.table("profiles").select("credits, avatar_url").eq("user_id", uid).limit(1).execute()
-            raw = sel.get("data") if isinstance(sel, dict) else getattr(sel, "data", None)
-            row = raw[0] if isinstance(raw, list) and raw else {}
+            row = get_profile_cache().get(uid) or {}
         except Exception as e:
             logger.error(f"Profile fetch failed: {e}")
             row = {}
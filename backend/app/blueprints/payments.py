@@ -1,11 +1,10 @@
 from flask import Blueprint, request, jsonify
 import os
-from supabase import create_client
 from datetime import datetime
+from app.utils.supabase_client import get_supabase
 
 bp = Blueprint("payments", __name__, url_prefix="/api/payments")
 
-SUPABASE = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_ROLE_KEY"])
 DEV_PAYMENTS = os.getenv("DEV_PAYMENTS", "false").lower() == "true"
 
 def get_user_id(req):
@@ -29,12 +28,15 @@ def grant_dev_credits():
     uid = get_user_id(request)
     if not uid:
         return jsonify({"error": "Missing user"}), 401
-    SUPABASE.table("profiles").upsert({"user_id": uid}).execute()
-    SUPABASE.rpc("increment_profile_credits", {"p_user_id": uid, "p_delta": 10}).execute() \
-        if "increment_profile_credits" in [f["name"] for f in SUPABASE.rpc("").functions] \
-        else SUPABASE.table("profiles").update({"credits": SUPABASE.sql("credits + 10")}).eq("user_id", uid).execute()
+    supabase = get_supabase()
+    if not supabase:
+        return jsonify({"error": "server_misconfigured"}), 500
+    supabase.table("profiles").upsert({"user_id": uid}).execute()
+    supabase.rpc("increment_profile_credits", {"p_user_id": uid, "p_delta": 10}).execute() \
+        if "increment_profile_credits" in [f["name"] for f in supabase.rpc("").functions] \
+        else supabase.table("profiles").update({"credits": supabase.sql("credits + 10")}).eq("user_id", uid).execute()
     # record pseudo purchase
-    SUPABASE.table("purchases").insert({
+    supabase.table("purchases").insert({
         "user_id": uid, "amount_cents": 500, "credits_granted": 10, "status": "DEV_GRANTED"
     }).execute()
     return jsonify({"ok": True, "granted": 10})
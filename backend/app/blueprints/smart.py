@@ -1,18 +1,27 @@
-from flask import Blueprint, current_app, request, jsonify
-from app.services.smart_resume_advisor import smart_predict_resume_improvements
-from supabase import create_client
-import os
-from dotenv import load_dotenv
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from app.services.analysis_pool import AnalysisTimeoutError, run_analysis
+from app.utils.supabase_client import get_supabase
+from app.utils.auth_tokens import current_identity
+from app.services.credit_ledger import get_credit_ledger
+from app.services.write_behind import get_analysis_writer
 import logging
 import json
 from uuid import uuid4 
 from app.services.suggestion_safety import enforce_no_fake_metrics
+from app.services.llm_gateway import LLMBusyError, LLMCancelledError, client_disconnected, get_llm_gateway
+from app.utils.json_stream import IncrementalJsonParser
+from app.services.prompt_builder import compact_resume, relevant_job_text, relevant_resume_text
+from app.services.llm_cache import get_llm_cache, llm_cache_key, semantic_scope
+from app.services.speculative_enrich import get_speculative_enrichment
+from app.services.admission import admission
+from app.services.analysis_jobs import JobQueueFull, get_analysis_jobs
+from app.services.singleflight import request_fingerprint, singleflight
 
 smart_bp = Blueprint("smart", __name__, url_prefix="/api/smart")
 logger = logging.getLogger(__name__)
 
 _HEADER_USER_ID = "X-User-Id"
-_HEADER_AUTH = "Authorization"
+_LLM_MODEL = "gpt-4.1-mini"
 
 def get_user_id():
     return request.headers.get(_HEADER_USER_ID)
@@ -33,11 +42,26 @@ def _resume_json_to_text(resume_json: dict) -> str:
                 parts.append(str(txt))
     return "\n".join(parts)
 
+def _resume_items(resume_json: dict) -> list:
+    """(section id, item id, text) of every resume item, the things suggestions refer to."""
+    if not isinstance(resume_json, dict):
+        return []
+    items = []
+    for sec in (resume_json.get("sections") or []):
+        if not isinstance(sec, dict):
+            continue
+        for it in (sec.get("items") or []):
+            if isinstance(it, dict):
+                items.append([sec.get("id"), it.get("id"), it.get("text")])
+    return items
+
+
 @smart_bp.post("/suggest")
+@admission("llm")
 def suggest():
     body = request.get_json(force=True) or {}
     resume = body.get("resume") or {}
-    job_text = (body.get("jobText") or "")[:4000]
+    job_text = body.get("jobText") or ""
     resume_text = _resume_json_to_text(resume)
 
     def fallback_list():
@@ -84,16 +108,16 @@ def suggest():
             },
         ]
 
-    client = current_app.config.get("OPENAI_CLIENT")
-    if not client:
+    gateway = get_llm_gateway()
+    if not gateway:
         suggestions = enforce_no_fake_metrics(fallback_list(), resume_text)
         return jsonify({"suggestions": suggestions})
 
     prompt = f"""
 You generate resume edit suggestions.
 
-Resume JSON: {resume}
-Job: {job_text}
+Resume JSON: {compact_resume(resume, job_text)}
+Job: {relevant_job_text(job_text, resume_text)}
 
 Return JSON array of 5 suggestions.
 
@@ -113,14 +137,26 @@ Each object:
 JSON only.
 """.strip()
 
+    uid = _resolve_uid()
+    cache = get_llm_cache()
+    cache_key = llm_cache_key("suggest", _LLM_MODEL, resume=resume, job_text=job_text)
+    # Suggestions point at section/item ids and quote item text: only reuse
+    # them for a resume with the same items
+    scope = semantic_scope("suggest", _LLM_MODEL, items=_resume_items(resume))
+
     try:
-        completion = client.responses.create(
-            model="gpt-4.1-mini",
-            input=[{"role": "user", "content": prompt}],
-            max_output_tokens=1200,
-        )
-        raw = completion.output[0].content[0].text
-        suggestions = json.loads(raw)
+        suggestions, vectors = cache.get(cache_key, uid, scope, resume_text, job_text)
+        if suggestions is None:
+            completion = gateway.responses(
+                uid,
+                disconnected=_disconnected(),
+                model=_LLM_MODEL,
+                input=[{"role": "user", "content": prompt}],
+                max_output_tokens=1200,
+            )
+            raw = completion.output[0].content[0].text
+            suggestions = json.loads(raw)
+            cache.put(cache_key, suggestions, uid, scope, vectors)
         suggestions = enforce_no_fake_metrics(suggestions, resume_text)
         if isinstance(suggestions, list):
             suggestions = suggestions[:5]
@@ -131,156 +167,299 @@ JSON only.
     return jsonify({"suggestions": suggestions})
 
 
-def _resolve_uid(supabase):
+def _disconnected():
+    """Callable telling the LLM gateway whether this request's client went away."""
+    environ = request.environ
+    return lambda: client_disconnected(environ)
+
+
+def _resolve_uid():
     uid = request.headers.get(_HEADER_USER_ID)
     if uid:
         return uid
-    auth = request.headers.get(_HEADER_AUTH) or ""
-    if not auth.lower().startswith("bearer "):
+    identity = current_identity()
+    return identity.uid if identity else None
+
+
+def _analysis_inputs(d) -> tuple | None:
+    """(resume_text, job_text, job_title) from an analyze request body, None if incomplete."""
+    if not d or not d.get("resume_text") or not d.get("job_text"):
         return None
-    token = auth.split(" ", 1)[1].strip()
+    return d.get("resume_text", ""), d.get("job_text", ""), d.get("job_title", "")
+
+
+def _perform_analysis(uid: str, resume_text: str, job_text: str, job_title: str, reservation) -> tuple:
+    """
+    Run the ML analysis paid for by `reservation`. Needs no request context,
+    so analysis jobs run it too. The caller (AnalysisJobRunner) commits or
+    refunds the reservation, so it is settled exactly once even if job
+    recovery fails the job meanwhile.
+
+    Returns:
+        (response body, HTTP status)
+    """
+    # The LLM enrichment starts as soon as the skill gaps are known and
+    # runs while the rest of the analysis (and the client round trip) happens
+    speculation = {"id": None}
+
+    def start_enrichment(present, missing, critical):
+        speculation["id"] = _start_speculative_enrich(uid, {
+            "resume_text": resume_text,
+            "job_text": job_text,
+            "job_title": job_title,
+            "present_skills": present,
+            "missing_skills": missing,
+            "critical_gaps": critical,
+        })
+
     try:
-        if hasattr(supabase.auth, "get_user"):
-            uresp = supabase.auth.get_user(token)
-            if isinstance(uresp, dict):
-                user = (uresp.get("data") or {}).get("user")
-            else:
-                user = getattr(uresp, "user", None)
-        elif hasattr(supabase.auth, "api") and hasattr(supabase.auth.api, "get_user"):
-            uresp = supabase.auth.api.get_user(token)
-            user = (uresp.get("data") or {}).get("user") if isinstance(uresp, dict) else getattr(uresp, "user", None)
-        else:
-            return None
-        if user:
-            return user.get("id") if isinstance(user, dict) else getattr(user, "id", None)
+        res = run_analysis(resume_text, job_text, job_title, on_skills=start_enrichment)
+    except AnalysisTimeoutError:
+        get_speculative_enrichment().cancel(speculation["id"])
+        return {"error": "analysis_timeout", "message": "Analysis took too long, please retry."}, 504
     except Exception:
-        pass
-    return None
+        get_speculative_enrichment().cancel(speculation["id"])
+        raise
+    if res is None:
+        get_speculative_enrichment().cancel(speculation["id"])
+        return {"error": "Analysis failed"}, 500
+
+    present_skills = res.present_skills or []
+    missing_skills = res.missing_skills or []
+    critical_gaps = res.critical_gaps or []
+    section_suggestions = res.section_suggestions or {}
+    ready_bullets = res.ready_bullets or []
+    rewrite_hints = res.rewrite_hints or []
+
+    # History row is written in the background, batched with other inserts
+    get_analysis_writer().submit({
+        "user_id": uid,
+        "job_title": job_title,
+        "fit_estimate": res.fit_estimate,
+        "payload": {
+            "fit_estimate": res.fit_estimate,
+            "similarity_resume_job": res.sim_resume_jd,
+            "present_skills": present_skills,
+            "missing_skills": missing_skills,
+            "critical_gaps": critical_gaps,
+            "section_suggestions": section_suggestions,
+            "ready_bullets": ready_bullets,
+            "rewrite_hints": rewrite_hints,
+        },
+        "resume_excerpt": resume_text[:300]
+    })
 
+    return {
+        "fit_estimate": res.fit_estimate,
+        "similarity_resume_job": res.sim_resume_jd,
+        "present_skills": present_skills,
+        "missing_skills": missing_skills,
+        "critical_gaps": critical_gaps,
+        "section_suggestions": section_suggestions,
+        "ready_bullets": ready_bullets,
+        "rewrite_hints": rewrite_hints,
+        "remaining_credits": reservation.balance,
+        "analysis_id": speculation["id"],
+    }, 200
 
-def _make_supabase():
-    load_dotenv()
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-    if not url or not key:
-        return None
-    return create_client(url, key)
+
+def _no_credits():
+    return jsonify({"error": "no_credits", "message": "Please purchase credits to use Smart Analysis."}), 402
 
 
 @smart_bp.route("/analyze", methods=["POST", "OPTIONS"])
+@singleflight("analyze")
+@admission("analyze")
 def analyze():
-    """Phase 1 — ML analysis only. Returns fit/skills/gaps immediately and deducts one credit."""
+    """
+    Phase 1 — ML analysis only. Returns fit/skills/gaps immediately and deducts one credit.
+
+    Runs as an analysis job row in this request, so an identical request
+    (same user and body) on any worker waits for its result uncharged.
+    """
     if request.method == "OPTIONS":
         return ("", 204)
     try:
-        supabase = _make_supabase()
+        supabase = get_supabase()
         if not supabase:
             return jsonify({"error": "server_misconfigured"}), 500
 
-        uid = _resolve_uid(supabase)
+        uid = _resolve_uid()
         if not uid:
             return jsonify({"error": "Unauthorized"}), 401
 
-        profile_res = supabase.table("profiles").select("credits").eq("user_id", uid).execute()
-        pdata_raw = getattr(profile_res, "data", None) or (profile_res.get("data") if isinstance(profile_res, dict) else None)
-        pdata = (pdata_raw[0] if isinstance(pdata_raw, list) else pdata_raw) or {}
-        credits = pdata.get("credits", 0)
-
-        if credits <= 0:
-            return jsonify({"error": "no_credits", "message": "Please purchase credits to use Smart Analysis."}), 402
-
-        d = request.get_json(force=True)
-        if not d or not d.get("resume_text") or not d.get("job_text"):
+        inputs = _analysis_inputs(request.get_json(force=True))
+        if inputs is None:
             return jsonify({"error": "Missing resume_text or job_text"}), 400
 
-        resume_text = d.get("resume_text", "")
-        job_text = d.get("job_text", "")
-        job_title = d.get("job_title", "")
-
-        res = smart_predict_resume_improvements(
-            resume_text=resume_text,
-            job_text=job_text,
-            job_title=job_title
-        )
-        if res is None:
-            return jsonify({"error": "Analysis failed"}), 500
-
-        present_skills = res.present_skills or []
-        missing_skills = res.missing_skills or []
-        critical_gaps = res.critical_gaps or []
-        section_suggestions = res.section_suggestions or {}
-        ready_bullets = res.ready_bullets or []
-        rewrite_hints = res.rewrite_hints or []
+        jobs = get_analysis_jobs()
+        request_key = request_fingerprint("analyze", uid, request.get_data(cache=True))
+        duplicate = jobs.duplicate_of(request_key)
+        if duplicate is not None:
+            body, status = jobs.outcome(duplicate, uid)
+            return jsonify(body), status
 
-        try:
-            supabase.table("profiles").update({"credits": credits - 1}).eq("user_id", uid).execute()
-        except Exception:
-            logger.exception("Failed to deduct credits")
+        # One conditional decrement; refunded if the analysis fails
+        reservation = get_credit_ledger().reserve(uid)
+        if reservation is None:
+            return _no_credits()
 
-        try:
-            supabase.table("analyses").insert({
-                "user_id": uid,
-                "job_title": job_title,
-                "fit_estimate": res.fit_estimate,
-                "payload": {
-                    "fit_estimate": res.fit_estimate,
-                    "similarity_resume_job": res.sim_resume_jd,
-                    "present_skills": present_skills,
-                    "missing_skills": missing_skills,
-                    "critical_gaps": critical_gaps,
-                    "section_suggestions": section_suggestions,
-                    "ready_bullets": ready_bullets,
-                    "rewrite_hints": rewrite_hints,
-                },
-                "resume_excerpt": resume_text[:300]
-            }).execute()
-        except Exception:
-            logger.exception("Failed to save analysis")
-
-        return jsonify({
-            "fit_estimate": res.fit_estimate,
-            "similarity_resume_job": res.sim_resume_jd,
-            "present_skills": present_skills,
-            "missing_skills": missing_skills,
-            "critical_gaps": critical_gaps,
-            "section_suggestions": section_suggestions,
-            "ready_bullets": ready_bullets,
-            "rewrite_hints": rewrite_hints,
-            "remaining_credits": credits - 1,
-        }), 200
+        body, status = jobs.run_inline(
+            uid, reservation, lambda: _perform_analysis(uid, *inputs, reservation), request_key
+        )
+        return jsonify(body), status
 
     except Exception:
         logger.exception("smart_analyze error")
         return jsonify({"error": "internal_server_error"}), 500
 
 
-@smart_bp.route("/enrich", methods=["POST", "OPTIONS"])
-def enrich():
-    """Phase 2 — OpenAI suggestions only. No credit deduction. Called after /analyze returns."""
+@smart_bp.route("/analyze/jobs", methods=["POST", "OPTIONS"])
+def create_analysis_job():
+    """
+    Phase 1, asynchronous. Reserves one credit, enqueues the analysis and
+    returns 202 {job_id} at once; poll GET /analyze/jobs/<job_id> for the
+    result. The credit is refunded if the job fails. Resubmitting the same
+    body while that job runs (or right after) returns the same job, uncharged.
+    """
     if request.method == "OPTIONS":
         return ("", 204)
     try:
-        supabase = _make_supabase()
-        if not supabase:
+        if not get_supabase():
             return jsonify({"error": "server_misconfigured"}), 500
 
-        uid = _resolve_uid(supabase)
+        uid = _resolve_uid()
         if not uid:
             return jsonify({"error": "Unauthorized"}), 401
 
-        d = request.get_json(force=True) or {}
-        resume_text = d.get("resume_text", "")
-        job_text = d.get("job_text", "")
-        job_title = d.get("job_title", "")
-        present_skills = d.get("present_skills", [])
-        missing_skills = d.get("missing_skills", [])
-        critical_gaps = d.get("critical_gaps", [])
-
-        client = current_app.config.get("OPENAI_CLIENT")
-        if not client:
-            return jsonify({"personal_suggestions": None, "lego_resume": None, "lego_suggestions": None}), 200
+        inputs = _analysis_inputs(request.get_json(force=True))
+        if inputs is None:
+            return jsonify({"error": "Missing resume_text or job_text"}), 400
 
-        prompt = f'''
+        jobs = get_analysis_jobs()
+        request_key = request_fingerprint("analyze", uid, request.get_data(cache=True))
+        duplicate = jobs.duplicate_of(request_key)
+        if duplicate is not None:
+            resp = jsonify({"job_id": duplicate, "status": "queued", "duplicate": True})
+            resp.headers["Location"] = f"{smart_bp.url_prefix}/analyze/jobs/{duplicate}"
+            return resp, 202
+
+        ledger = get_credit_ledger()
+        try:
+            jobs.check_capacity(uid)
+            reservation = ledger.reserve(uid)
+            if reservation is None:
+                return _no_credits()
+            try:
+                job_id = jobs.submit(
+                    uid, reservation, lambda: _perform_analysis(uid, *inputs, reservation), request_key
+                )
+            except Exception:
+                ledger.refund(reservation)
+                raise
+        except JobQueueFull as e:
+            resp = jsonify({"error": "too_many_jobs", "reason": str(e), "message": "Too many analyses queued, please retry shortly."})
+            resp.headers["Retry-After"] = "5"
+            return resp, 429
+
+        resp = jsonify({"job_id": job_id, "status": "queued", "remaining_credits": reservation.balance})
+        resp.headers["Location"] = f"{smart_bp.url_prefix}/analyze/jobs/{job_id}"
+        return resp, 202
+
+    except Exception:
+        logger.exception("smart_analyze job error")
+        return jsonify({"error": "internal_server_error"}), 500
+
+
+@smart_bp.get("/analyze/jobs/<job_id>")
+def get_analysis_job(job_id):
+    """Status of an analysis job: queued | running | done (with result) | failed (with error)."""
+    uid = _resolve_uid()
+    if not uid:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    job = get_analysis_jobs().status(job_id, uid)
+    if job is None:
+        return jsonify({"error": "job_not_found"}), 404
+    resp = jsonify(job)
+    if job["status"] in ("queued", "running"):
+        resp.headers["Retry-After"] = "1"
+    resp.headers["Cache-Control"] = "no-store"
+    return resp, 200
+
+
+def _enrich_inputs(d: dict) -> dict:
+    return {
+        "resume_text": d.get("resume_text", ""),
+        "job_text": d.get("job_text", ""),
+        "job_title": d.get("job_title", ""),
+        "present_skills": d.get("present_skills", []),
+        "missing_skills": d.get("missing_skills", []),
+        "critical_gaps": d.get("critical_gaps", []),
+    }
+
+
+def _enrich_scope(inputs: dict) -> str:
+    """Semantic cache scope: near-duplicate resumes only share advice for the same skill gaps."""
+    return semantic_scope(
+        "enrich",
+        _LLM_MODEL,
+        present=sorted(str(s).lower() for s in inputs["present_skills"]),
+        missing=sorted(str(s).lower() for s in inputs["missing_skills"]),
+        critical=sorted(str(s).lower() for s in inputs["critical_gaps"]),
+    )
+
+
+def _enrich_payload(uid: str, inputs: dict, disconnected=None) -> dict:
+    """Model payload for the enrich inputs: LLM cache first, then OpenAI via the gateway."""
+    cache = get_llm_cache()
+    cache_key = llm_cache_key("enrich", _LLM_MODEL, **inputs)
+    scope = _enrich_scope(inputs)
+    model_payload, vectors = cache.get(cache_key, uid, scope, inputs["resume_text"], inputs["job_text"])
+    if model_payload is None:
+        completion = get_llm_gateway().responses(
+            uid,
+            disconnected=disconnected,
+            model=_LLM_MODEL,
+            input=_enrich_prompt(**inputs),
+            text={"format": {"type": "json_object"}}
+        )
+        raw = completion.output[0].content[0].text
+        model_payload = json.loads(raw)
+        cache.put(cache_key, model_payload, uid, scope, vectors)
+    return model_payload
+
+
+def _start_speculative_enrich(uid: str, inputs: dict) -> str | None:
+    """Start enrichment in the background; returns the analysis id (None if not started)."""
+    if not get_llm_gateway():
+        return None
+    try:
+        key = llm_cache_key("enrich", _LLM_MODEL, **inputs)
+        return get_speculative_enrichment().start(uid, key, lambda: _enrich_payload(uid, inputs))
+    except Exception:
+        logger.exception("speculative enrich not started")
+        return None
+
+
+def _claim_speculative_enrich(d: dict, uid: str, inputs: dict, disconnected):
+    """Payload of the enrichment /analyze started for these inputs, if any."""
+    gateway = get_llm_gateway()
+    return get_speculative_enrichment().claim(
+        d.get("analysis_id"),
+        uid,
+        llm_cache_key("enrich", _LLM_MODEL, **inputs),
+        timeout=gateway.timeout + gateway.queue_timeout,
+        disconnected=disconnected,
+    )
+
+
+def _enrich_prompt(job_title, present_skills, missing_skills, critical_gaps, resume_text, job_text, **_):
+    # Most relevant content within the token budget, not just the first 3500 chars
+    focus = list(critical_gaps or []) + list(missing_skills or [])
+    resume_excerpt = relevant_resume_text(resume_text, job_text, focus)
+    job_excerpt = relevant_job_text(job_text, resume_text, focus)
+    return f'''
 You are an ATS expert and resume editor.
 
 Your job is to analyze the resume and job description and propose improvements focused ONLY on hard technical skills, tools, frameworks, and concrete deliverables.
@@ -306,10 +485,10 @@ Critical gaps:
 {", ".join(critical_gaps)}
 
 Resume (raw text):
-"""{resume_text[:3500]}"""
+"""{resume_excerpt}"""
 
 Job description (raw text):
-"""{job_text[:3500]}"""
+"""{job_excerpt}"""
 
 Return a SINGLE JSON object with this structure:
 
@@ -352,37 +531,166 @@ Requirements:
 - structuredResume.sections[].items[].id must be unique and used in suggestions[].targetItemId for rewrite_bullet.
 - All suggestions must be about HARD TECHNICAL improvements, not soft skills.
 - Return ONLY valid JSON with no comments.
-        '''.strip()
+    '''.strip()
 
-        suggestions_text = None
-        lego_resume = None
-        lego_suggestions = None
 
-        try:
-            completion = client.responses.create(
-                model="gpt-4.1-mini",
-                input=prompt,
-                text={"format": {"type": "json_object"}}
-            )
-            raw = completion.output[0].content[0].text
-            model_payload = json.loads(raw)
+def _enrich_response(model_payload: dict, resume_text: str) -> dict:
+    """Map the model payload to the /enrich response (metrics guard applied)."""
+    lego_suggestions = model_payload.get("suggestions")
+    if isinstance(lego_suggestions, list):
+        lego_suggestions = enforce_no_fake_metrics(lego_suggestions, resume_text)[:5]
+    return {
+        "personal_suggestions": model_payload.get("personalSuggestionsText"),
+        "lego_resume": model_payload.get("structuredResume"),
+        "lego_suggestions": lego_suggestions,
+    }
+
 
-            suggestions_text = model_payload.get("personalSuggestionsText")
-            lego_resume = model_payload.get("structuredResume")
-            lego_suggestions = model_payload.get("suggestions")
+def _llm_busy():
+    resp = jsonify({"error": "llm_busy", "message": "Suggestions are busy, please retry shortly."})
+    resp.headers["Retry-After"] = "5"
+    return resp, 503
 
-            if isinstance(lego_suggestions, list):
-                lego_suggestions = enforce_no_fake_metrics(lego_suggestions, resume_text)
-                lego_suggestions = lego_suggestions[:5]
+
+@smart_bp.route("/enrich", methods=["POST", "OPTIONS"])
+@admission("llm")
+def enrich():
+    """
+    Phase 2 — OpenAI suggestions only. No credit deduction. Called after /analyze returns.
+
+    Pass the analysis_id /analyze returned to pick up the enrichment it already
+    started for the same inputs instead of calling OpenAI again.
+    """
+    if request.method == "OPTIONS":
+        return ("", 204)
+    try:
+        supabase = get_supabase()
+        if not supabase:
+            return jsonify({"error": "server_misconfigured"}), 500
+
+        uid = _resolve_uid()
+        if not uid:
+            return jsonify({"error": "Unauthorized"}), 401
+
+        d = request.get_json(force=True) or {}
+        inputs = _enrich_inputs(d)
+        resume_text = inputs["resume_text"]
+
+        gateway = get_llm_gateway()
+        if not gateway:
+            return jsonify({"personal_suggestions": None, "lego_resume": None, "lego_suggestions": None}), 200
+
+        result = {"personal_suggestions": None, "lego_resume": None, "lego_suggestions": None}
+        try:
+            disconnected = _disconnected()
+            model_payload = _claim_speculative_enrich(d, uid, inputs, disconnected)
+            if model_payload is None:
+                model_payload = _enrich_payload(uid, inputs, disconnected)
+            result = _enrich_response(model_payload, resume_text)
+        except LLMBusyError:
+            return _llm_busy()
         except Exception:
             logger.exception("OpenAI enrich failed")
 
-        return jsonify({
-            "personal_suggestions": suggestions_text,
-            "lego_resume": lego_resume,
-            "lego_suggestions": lego_suggestions,
-        }), 200
+        return jsonify(result), 200
 
     except Exception:
         logger.exception("smart_enrich error")
         return jsonify({"error": "internal_server_error"}), 500
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def _sse_for_value(path, value, resume_text: str):
+    """SSE frame for one completed piece of the enrich JSON (None if not streamed)."""
+    if len(path) == 2 and path[0] == "suggestions" and isinstance(value, dict):
+        if path[1] >= 5:
+            return None
+        return _sse("suggestion", {"index": path[1], **enforce_no_fake_metrics([value], resume_text)[0]})
+    if path == ("personalSuggestionsText",):
+        return _sse("personal_suggestions", value)
+    if path == ("structuredResume",):
+        return _sse("lego_resume", value)
+    return None
+
+
+@smart_bp.route("/enrich/stream", methods=["POST", "OPTIONS"])
+@admission("llm")
+def enrich_stream():
+    """
+    Streaming variant of /enrich (Server-Sent Events).
+
+    Events: personal_suggestions, lego_resume, one suggestion per completed
+    suggestions[] object (metrics guard applied as it arrives), then done with
+    the same body /enrich returns, or error.
+    """
+    if request.method == "OPTIONS":
+        return ("", 204)
+    if not get_supabase():
+        return jsonify({"error": "server_misconfigured"}), 500
+
+    uid = _resolve_uid()
+    if not uid:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    d = request.get_json(force=True) or {}
+    inputs = _enrich_inputs(d)
+    resume_text = inputs["resume_text"]
+    gateway = get_llm_gateway()
+    cache = get_llm_cache()
+    cache_key = llm_cache_key("enrich", _LLM_MODEL, **inputs)
+    scope = _enrich_scope(inputs)
+    disconnected = _disconnected()
+
+    def generate():
+        if not gateway:
+            yield _sse("done", {"personal_suggestions": None, "lego_resume": None, "lego_suggestions": None})
+            return
+        try:
+            model_payload, vectors = _claim_speculative_enrich(d, uid, inputs, disconnected), None
+            if model_payload is None:
+                model_payload, vectors = cache.get(cache_key, uid, scope, resume_text, inputs["job_text"])
+            if model_payload is None:
+                parser = IncrementalJsonParser()
+                events = gateway.stream(
+                    uid,
+                    lambda: gateway.client.responses.create(
+                        model=_LLM_MODEL,
+                        input=_enrich_prompt(**inputs),
+                        text={"format": {"type": "json_object"}},
+                        stream=True,
+                    ),
+                    disconnected=disconnected,
+                )
+                for event in events:
+                    if getattr(event, "type", None) != "response.output_text.delta":
+                        continue
+                    for path, value in parser.feed(event.delta):
+                        frame = _sse_for_value(path, value, resume_text)
+                        if frame:
+                            yield frame
+                model_payload = json.loads(parser.text)
+                cache.put(cache_key, model_payload, uid, scope, vectors)
+            else:
+                for key in ("personalSuggestionsText", "structuredResume"):
+                    yield _sse_for_value((key,), model_payload.get(key), resume_text)
+                for i, item in enumerate(model_payload.get("suggestions") or []):
+                    frame = _sse_for_value(("suggestions", i), item, resume_text)
+                    if frame:
+                        yield frame
+            yield _sse("done", _enrich_response(model_payload, resume_text))
+        except LLMBusyError:
+            yield _sse("error", {"error": "llm_busy", "retry_after": 5})
+        except LLMCancelledError:
+            return
+        except Exception:
+            logger.exception("OpenAI enrich stream failed")
+            yield _sse("error", {"error": "enrich_failed"})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -2,8 +2,14 @@ import os
 import json
 import stripe
 from flask import Blueprint, request, jsonify, current_app
-from supabase import create_client
 from dotenv import load_dotenv
+from app.utils.supabase_client import get_supabase
+from app.utils.auth_tokens import current_identity
+from app.services.credit_ledger import get_credit_ledger
+from app.services.profile_cache import get_profile_cache
+from app.services.stripe_events import ingest_event, save_subscription_status
+from app.services.stripe_catalog import CatalogItem, StripeCatalog, default_catalog_path
+from app.services.subscription_cache import get_subscription_cache, period_end as sub_period_end
 load_dotenv()
 
 stripe_bp = Blueprint("stripe_payments", __name__, url_prefix="/api/payments")
@@ -11,52 +17,49 @@ stripe_bp = Blueprint("stripe_payments", __name__, url_prefix="/api/payments")
 STRIPE_SECRET = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173").rstrip("/")
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
 if STRIPE_SECRET:
     stripe.api_key = STRIPE_SECRET
 
-SUPABASE = None
-if SUPABASE_URL and SUPABASE_KEY:
-    try:
-        SUPABASE = create_client(SUPABASE_URL, SUPABASE_KEY)
-    except Exception:
-        pass
-
 PACKS = {
     "pro": {"credits": 10, "amount_dollars": 5, "interval": "month"},
 }
 
 CUSTOM_USD_PER_CREDIT = 1  # $1 per credit for one-time purchases
 
+# One Stripe Product/Price per sellable item; checkout sends only price ids
+CATALOG = StripeCatalog(
+    [
+        CatalogItem(
+            key=pack_id,
+            name=f"Pro Subscription — {pack['credits']} credits/{pack.get('interval', 'month')}",
+            unit_amount=int(round(pack["amount_dollars"] * 100)),
+            interval=pack.get("interval", "month"),
+        )
+        for pack_id, pack in PACKS.items()
+    ]
+    + [CatalogItem(key="credit", name="Resume credit", unit_amount=CUSTOM_USD_PER_CREDIT * 100)],
+    path=default_catalog_path(),
+)
 
-def _resolve_user_id(req):
-    auth = req.headers.get("Authorization", "") or ""
-    if auth.lower().startswith("bearer "):
-        token = auth.split(" ", 1)[1].strip()
-        try:
-            if SUPABASE:
-                resp = None
-                if hasattr(SUPABASE.auth, "get_user"):
-                    resp = SUPABASE.auth.get_user(token)
-                elif hasattr(SUPABASE.auth, "api") and hasattr(SUPABASE.auth.api, "get_user"):
-                    resp = SUPABASE.auth.api.get_user(token)
-
-                if resp:
-                    user = None
-                    if hasattr(resp, "user") and resp.user:
-                        user = resp.user
-                    elif isinstance(resp, dict):
-                        user = resp.get("user") or (resp.get("data") or {}).get("user")
-
-                    if user:
-                        uid = user.get("id") if isinstance(user, dict) else getattr(user, "id", None)
-                        if uid:
-                            return uid
-        except Exception as e:
-            current_app.logger.warning("supabase get_user failed: %s", type(e).__name__)
 
+def warm_catalog():
+    CATALOG.sync_in_background()
+
+
+def _line_item(catalog_key, quantity, inline_price_data):
+    """Catalog price line item, or inline price_data if the catalog is unavailable."""
+    try:
+        return {"price": CATALOG.price_id(catalog_key), "quantity": quantity}
+    except Exception:
+        current_app.logger.exception("Stripe catalog unavailable; using inline price_data")
+        return {"price_data": inline_price_data, "quantity": 1}
+
+
+def _resolve_user_id(req):
+    identity = current_identity()
+    if identity:
+        return identity.uid
     return req.headers.get("X-User-Id")
 
 
@@ -96,15 +99,12 @@ def checkout():
                 payment_method_types=["card"],
                 mode="subscription",
                 line_items=[
-                    {
-                        "price_data": {
-                            "currency": "usd",
-                            "product_data": {"name": product_name},
-                            "unit_amount": amount_cents,
-                            "recurring": {"interval": interval},
-                        },
-                        "quantity": 1,
-                    }
+                    _line_item(pack_id, 1, {
+                        "currency": "usd",
+                        "product_data": {"name": product_name},
+                        "unit_amount": amount_cents,
+                        "recurring": {"interval": interval},
+                    })
                 ],
                 subscription_data={
                     "metadata": {"user_id": user_id, "pack_id": pack_id, "credits": str(credits)},
@@ -128,14 +128,11 @@ def checkout():
                 payment_method_types=["card"],
                 mode="payment",
                 line_items=[
-                    {
-                        "price_data": {
-                            "currency": "usd",
-                            "product_data": {"name": product_name},
-                            "unit_amount": amount_cents,
-                        },
-                        "quantity": 1,
-                    }
+                    _line_item("credit", credits, {
+                        "currency": "usd",
+                        "product_data": {"name": product_name},
+                        "unit_amount": amount_cents,
+                    })
                 ],
                 metadata={"user_id": user_id, "pack_id": "custom", "credits": str(credits)},
                 success_url=f"{origin}/pay/success?session_id={{CHECKOUT_SESSION_ID}}",
@@ -152,67 +149,34 @@ def checkout():
 
 
 def _grant_credits(uid, credits, stripe_id, amount_cents, status="COMPLETED"):
-    """Helper to grant credits and record purchase. Returns True on success."""
-    if not SUPABASE or not uid:
-        current_app.logger.warning("Cannot grant credits: supabase or uid missing")
+    """Helper to grant credits and record purchase. Returns True on success (or if already granted)."""
+    if not uid:
+        current_app.logger.warning("Cannot grant credits: uid missing")
         return False
 
     try:
-        try:
-            profile_check = SUPABASE.table("profiles").select("user_id").eq("user_id", uid).execute()
-            profile_data = getattr(profile_check, "data", None) or (profile_check.get("data") if isinstance(profile_check, dict) else None)
-            if not profile_data:
-                SUPABASE.table("profiles").insert({"user_id": uid, "credits": 0}).execute()
-        except Exception as profile_err:
-            if "duplicate" not in str(profile_err).lower() and "23505" not in str(profile_err):
-                current_app.logger.warning("Profile check/create failed: %s", type(profile_err).__name__)
-
-        try:
-            SUPABASE.table("purchases").insert({
-                "user_id": uid,
-                "amount_cents": amount_cents,
-                "credits_granted": credits,
-                "status": status,
-                "stripe_session_id": stripe_id,
-            }).execute()
-        except Exception as insert_err:
-            if "duplicate" in str(insert_err).lower() or "unique" in str(insert_err).lower() or "23505" in str(insert_err):
-                return True
-            raise
-
-        current_credits = 0
-        try:
-            cur = SUPABASE.table("profiles").select("credits").eq("user_id", uid).limit(1).execute()
-            cur_data = getattr(cur, "data", None) or (cur.get("data") if isinstance(cur, dict) else None)
-            if cur_data and isinstance(cur_data, list) and len(cur_data) > 0:
-                current_credits = int(cur_data[0].get("credits") or 0)
-            elif cur_data and isinstance(cur_data, dict):
-                current_credits = int(cur_data.get("credits") or 0)
-        except Exception as read_err:
-            current_app.logger.warning("Could not read current credits: %s", type(read_err).__name__)
-
-        new_credits = current_credits + credits
-        SUPABASE.table("profiles").update({"credits": new_credits}).eq("user_id", uid).execute()
+        balance = get_credit_ledger().grant(uid, credits, stripe_id, amount_cents, status)
+        if balance is None:
+            current_app.logger.info("Purchase %s already granted", stripe_id)
         return True
     except Exception:
         current_app.logger.exception("Failed to grant credits")
         return False
 
 
+def _grant_once(uid, credits, ref, amount_cents, status):
+    """Grant through the ledger; True only if this call added the credits."""
+    try:
+        return get_credit_ledger().grant(uid, credits, ref, amount_cents, status) is not None
+    except Exception:
+        current_app.logger.exception("Failed to grant credits for %s", ref)
+        return False
+
+
 def _update_subscription_status(uid, subscription_id, status, period_end=None):
     """Update user's subscription info in profiles table."""
-    if not SUPABASE or not uid:
-        current_app.logger.warning("Cannot update subscription: supabase or uid missing")
-        return
     try:
-        update_data = {
-            "subscription_id": subscription_id,
-            "subscription_status": status,
-        }
-        if period_end:
-            update_data["subscription_period_end"] = period_end
-
-        SUPABASE.table("profiles").update(update_data).eq("user_id", uid).execute()
+        save_subscription_status(uid, subscription_id, status, period_end)
     except Exception:
         current_app.logger.exception("Failed to update subscription status")
 
@@ -220,9 +184,12 @@ def _update_subscription_status(uid, subscription_id, status, period_end=None):
 @stripe_bp.post("/webhook")
 def webhook():
     """
-    Handle Stripe webhooks for subscriptions.
-    Events handled:
-      - checkout.session.completed: Initial subscription, grant first month credits
+    Receive Stripe webhooks.
+
+    The event is verified, appended to the local event log (deduplicated by
+    event id) and acknowledged immediately; app.services.stripe_events applies
+    it in the background. Events handled:
+      - checkout.session.completed: Initial subscription / one-time purchase
       - invoice.paid: Recurring payment, grant monthly credits
       - customer.subscription.deleted: Subscription cancelled
     """
@@ -233,111 +200,35 @@ def webhook():
     try:
         if STRIPE_WEBHOOK_SECRET and sig_header:
             event = stripe.Webhook.construct_event(payload, sig_header, STRIPE_WEBHOOK_SECRET)
+            event = event.to_dict() if hasattr(event, "to_dict") else dict(event)
         else:
             event = json.loads(payload)
     except Exception:
         current_app.logger.exception("Webhook signature verification failed")
         return jsonify({"error": "invalid_webhook"}), 400
 
-    event_type = event.get("type")
-    current_app.logger.info("Webhook received: %s", event_type)
-
-    if event_type == "checkout.session.completed":
-        session = event["data"]["object"]
-        stripe_session_id = session.get("id")
-        subscription_id = session.get("subscription")
-        mode = session.get("mode")
-
-        metadata = session.get("metadata", {}) or {}
-        uid = metadata.get("user_id")
-
-        if subscription_id and uid:
-            period_end = None
-            try:
-                sub = stripe.Subscription.retrieve(subscription_id)
-                period_end = getattr(sub, "current_period_end", None) or getattr(sub, "cancel_at", None)
-            except Exception:
-                current_app.logger.warning("Could not retrieve subscription for period_end")
-            _update_subscription_status(uid, subscription_id, "active", period_end)
-
-        elif mode == "payment" and uid:
-            try:
-                credits = int(metadata.get("credits", "0") or 0)
-            except Exception:
-                credits = 0
-            amount_total = int(session.get("amount_total") or 0)
-
-            if credits > 0:
-                already_processed = False
-                if SUPABASE:
-                    try:
-                        res = SUPABASE.table("purchases").select("id").eq("stripe_session_id", stripe_session_id).limit(1).execute()
-                        already = getattr(res, "data", None) or (res.get("data") if isinstance(res, dict) else None)
-                        if already:
-                            already_processed = True
-                    except Exception:
-                        current_app.logger.exception("Failed idempotency check")
-
-                if not already_processed:
-                    _grant_credits(uid, credits, stripe_session_id, amount_total, "ONE_TIME_PURCHASE")
-
-    elif event_type == "invoice.paid":
-        invoice = event["data"]["object"]
-        invoice_id = invoice.get("id")
-        subscription_id = invoice.get("subscription")
-        amount_paid = int(invoice.get("amount_paid") or 0)
-        billing_reason = invoice.get("billing_reason")
-
-        if billing_reason == "subscription_create":
-            return jsonify({"received": True}), 200
-
-        if SUPABASE:
-            try:
-                res = SUPABASE.table("purchases").select("id").eq("stripe_session_id", invoice_id).limit(1).execute()
-                already = getattr(res, "data", None) or (res.get("data") if isinstance(res, dict) else None)
-                if already:
-                    return jsonify({"received": True}), 200
-            except Exception:
-                current_app.logger.exception("Failed idempotency check")
-
-        uid = None
-        credits = PACKS.get("pro", {}).get("credits", 10)
-        period_end = None
-
-        if subscription_id:
-            try:
-                sub = stripe.Subscription.retrieve(subscription_id)
-                sub_metadata = getattr(sub, "metadata", {}) or {}
-                uid = sub_metadata.get("user_id") if isinstance(sub_metadata, dict) else getattr(sub_metadata, "user_id", None)
-                period_end = getattr(sub, "current_period_end", None) or getattr(sub, "cancel_at", None)
-                credits_str = sub_metadata.get("credits") if isinstance(sub_metadata, dict) else getattr(sub_metadata, "credits", None)
-                if credits_str:
-                    credits = int(credits_str)
-            except Exception:
-                current_app.logger.exception("Failed to retrieve subscription")
-
-        if uid and credits > 0:
-            _grant_credits(uid, credits, invoice_id, amount_paid, "SUBSCRIPTION_RENEWAL")
-            if subscription_id:
-                _update_subscription_status(uid, subscription_id, "active", period_end)
-        else:
-            current_app.logger.warning("Cannot grant credits: uid or credits missing")
-
-    elif event_type == "customer.subscription.deleted":
-        subscription = event["data"]["object"]
-        subscription_id = subscription.get("id")
-        metadata = subscription.get("metadata", {}) or {}
-        uid = metadata.get("user_id")
+    if not isinstance(event, dict) or not event.get("id") or not isinstance(event.get("data"), dict):
+        return jsonify({"error": "invalid_webhook"}), 400
 
-        if uid:
-            _update_subscription_status(uid, subscription_id, "cancelled")
+    try:
+        created = ingest_event(event)
+    except Exception:
+        # Not logged: let Stripe redeliver
+        current_app.logger.exception("Failed to record webhook event")
+        return jsonify({"error": "event_log_unavailable"}), 503
 
+    current_app.logger.info("Webhook %s %s (%s)", event.get("type"), event["id"], "queued" if created else "duplicate")
     return jsonify({"received": True}), 200
 
 
 @stripe_bp.get("/subscription")
 def get_subscription():
-    """Get current user's subscription status. Also fetches period_end from Stripe if missing."""
+    """
+    Get current user's subscription status.
+
+    Answered from the profile row only; drift from Stripe is repaired by
+    webhooks and the bulk job in app.services.subscription_reconcile.
+    """
     if not STRIPE_SECRET:
         return jsonify({"error": "stripe_not_configured"}), 501
 
@@ -346,36 +237,13 @@ def get_subscription():
         return jsonify({"error": "unauthorized"}), 401
 
     try:
-        if SUPABASE:
-            res = SUPABASE.table("profiles").select("subscription_id, subscription_status, subscription_period_end").eq("user_id", user_id).single().execute()
-            data = getattr(res, "data", None) or (res.get("data") if isinstance(res, dict) else None)
-
-            if data:
-                subscription_id = data.get("subscription_id")
-                status = data.get("subscription_status")
-                period_end = data.get("subscription_period_end")
-
-                if subscription_id and status in ("active", "cancelling"):
-                    try:
-                        sub = stripe.Subscription.retrieve(subscription_id)
-                        stripe_status = getattr(sub, "status", None)
-
-                        if stripe_status == "canceled" and status != "cancelled":
-                            _update_subscription_status(user_id, None, "cancelled")
-                            status = "cancelled"
-                            subscription_id = None
-                        elif not period_end:
-                            period_end = getattr(sub, "current_period_end", None) or getattr(sub, "cancel_at", None)
-                            if period_end:
-                                _update_subscription_status(user_id, subscription_id, status, period_end)
-                    except Exception:
-                        current_app.logger.exception("Failed to fetch subscription from Stripe")
-
-                return jsonify({
-                    "subscription_id": subscription_id,
-                    "status": status,
-                    "period_end": period_end,
-                }), 200
+        data = get_profile_cache().get(user_id) if get_supabase() else None
+        if data:
+            return jsonify({
+                "subscription_id": data.get("subscription_id"),
+                "status": data.get("subscription_status"),
+                "period_end": data.get("subscription_period_end"),
+            }), 200
         return jsonify({"subscription_id": None, "status": None, "period_end": None}), 200
     except Exception:
         current_app.logger.exception("Failed to get subscription status")
@@ -385,6 +253,7 @@ def get_subscription():
 @stripe_bp.post("/subscription/cancel")
 def cancel_subscription():
     """Cancel user's subscription."""
+    supabase = get_supabase()
     if not STRIPE_SECRET:
         return jsonify({"error": "stripe_not_configured"}), 501
 
@@ -393,10 +262,10 @@ def cancel_subscription():
         return jsonify({"error": "unauthorized"}), 401
 
     try:
-        if not SUPABASE:
+        if not supabase:
             return jsonify({"error": "database_not_configured"}), 501
 
-        res = SUPABASE.table("profiles").select("subscription_id").eq("user_id", user_id).single().execute()
+        res = supabase.table("profiles").select("subscription_id").eq("user_id", user_id).single().execute()
         data = getattr(res, "data", None) or (res.get("data") if isinstance(res, dict) else None)
         subscription_id = data.get("subscription_id") if data else None
 
@@ -404,7 +273,7 @@ def cancel_subscription():
             return jsonify({"error": "no_active_subscription"}), 400
 
         sub = stripe.Subscription.modify(subscription_id, cancel_at_period_end=True)
-        period_end = getattr(sub, "current_period_end", None) or getattr(sub, "cancel_at", None)
+        period_end = sub_period_end(get_subscription_cache().put(sub))
         _update_subscription_status(user_id, subscription_id, "cancelling", period_end)
 
         return jsonify({"ok": True, "message": "Subscription will cancel at end of billing period", "period_end": period_end}), 200
@@ -445,27 +314,18 @@ def sync_subscription():
                 credits = 0
             amount_total = int(session.amount_total or 0)
 
-            already_processed = False
+            credits_granted = 0
             if credits > 0:
-                if SUPABASE:
-                    try:
-                        res = SUPABASE.table("purchases").select("id").eq("stripe_session_id", session_id).limit(1).execute()
-                        already = getattr(res, "data", None) or (res.get("data") if isinstance(res, dict) else None)
-                        if already:
-                            already_processed = True
-                    except Exception:
-                        current_app.logger.exception("Failed idempotency check in sync")
-
-                if not already_processed:
-                    _grant_credits(user_id, credits, session_id, amount_total, "ONE_TIME_PURCHASE_SYNC")
+                if _grant_once(user_id, credits, session_id, amount_total, "ONE_TIME_PURCHASE_SYNC"):
+                    credits_granted = credits
 
-            return jsonify({"ok": True, "credits_granted": credits if not already_processed else 0}), 200
+            return jsonify({"ok": True, "credits_granted": credits_granted}), 200
 
         if not subscription_id:
             return jsonify({"error": "no_subscription_in_session"}), 400
 
-        sub = stripe.Subscription.retrieve(subscription_id)
-        period_end = getattr(sub, "current_period_end", None)
+        sub = get_subscription_cache().get(subscription_id) or {}
+        period_end = sub.get("current_period_end")
 
         _update_subscription_status(user_id, subscription_id, "active", period_end)
 
@@ -476,15 +336,8 @@ def sync_subscription():
         amount_total = int(session.amount_total or 0)
 
         credits_granted = 0
-        if credits > 0 and SUPABASE:
-            try:
-                res = SUPABASE.table("purchases").select("id").eq("stripe_session_id", subscription_id).limit(1).execute()
-                already = getattr(res, "data", None) or (res.get("data") if isinstance(res, dict) else None)
-                if not already:
-                    _grant_credits(user_id, credits, subscription_id, amount_total, "SUBSCRIPTION_INITIAL")
-                    credits_granted = credits
-            except Exception:
-                current_app.logger.exception("Failed to process credits in sync")
+        if credits > 0 and _grant_once(user_id, credits, subscription_id, amount_total, "SUBSCRIPTION_INITIAL"):
+            credits_granted = credits
 
         return jsonify({"ok": True, "subscription_id": subscription_id, "status": "active", "period_end": period_end, "credits_granted": credits_granted}), 200
     except stripe.error.StripeError:
@@ -503,6 +356,7 @@ def redeem_promo():
     Valid codes are set via PROMO_CODES env var (comma-separated),
     Each user can redeem each code only once.
     """
+    supabase = get_supabase()
     user_id = _resolve_user_id(request)
     if not user_id:
         return jsonify({"error": "unauthorized", "message": "Please log in to redeem a promo code"}), 401
@@ -524,11 +378,11 @@ def redeem_promo():
     if code not in valid_codes:
         return jsonify({"error": "invalid_code", "message": "Invalid promo code"}), 400
 
-    if not SUPABASE:
+    if not supabase:
         return jsonify({"error": "database_not_configured"}), 501
 
     try:
-        res = SUPABASE.table("promo_redemptions").select("id").eq("user_id", user_id).eq("code", code).limit(1).execute()
+        res = supabase.table("promo_redemptions").select("id").eq("user_id", user_id).eq("code", code).limit(1).execute()
         already = getattr(res, "data", None) or (res.get("data") if isinstance(res, dict) else None)
         if already:
             return jsonify({"error": "already_redeemed", "message": "You've already used this promo code"}), 400
@@ -537,15 +391,15 @@ def redeem_promo():
         return jsonify({"error": "internal_error"}), 500
 
     try:
-        profile_check = SUPABASE.table("profiles").select("user_id").eq("user_id", user_id).execute()
+        profile_check = supabase.table("profiles").select("user_id").eq("user_id", user_id).execute()
         profile_data = getattr(profile_check, "data", None) or (profile_check.get("data") if isinstance(profile_check, dict) else None)
         if not profile_data:
-            SUPABASE.table("profiles").insert({"user_id": user_id, "credits": 0}).execute()
+            supabase.table("profiles").insert({"user_id": user_id, "credits": 0}).execute()
     except Exception:
         pass
 
     try:
-        SUPABASE.table("promo_redemptions").insert({"user_id": user_id, "code": code}).execute()
+        supabase.table("promo_redemptions").insert({"user_id": user_id, "code": code}).execute()
     except Exception:
         current_app.logger.exception("Failed to record promo redemption")
         return jsonify({"error": "internal_error"}), 500
@@ -561,6 +415,7 @@ def redeem_promo():
 @stripe_bp.post("/subscription/reactivate")
 def reactivate_subscription():
     """Reactivate a subscription that was set to cancel at period end."""
+    supabase = get_supabase()
     if not STRIPE_SECRET:
         return jsonify({"error": "stripe_not_configured"}), 501
 
@@ -569,10 +424,10 @@ def reactivate_subscription():
         return jsonify({"error": "unauthorized"}), 401
 
     try:
-        if not SUPABASE:
+        if not supabase:
             return jsonify({"error": "database_not_configured"}), 501
 
-        res = SUPABASE.table("profiles").select("subscription_id, subscription_status").eq("user_id", user_id).single().execute()
+        res = supabase.table("profiles").select("subscription_id, subscription_status").eq("user_id", user_id).single().execute()
         data = getattr(res, "data", None) or (res.get("data") if isinstance(res, dict) else None)
         subscription_id = data.get("subscription_id") if data else None
         status = data.get("subscription_status") if data else None
@@ -583,8 +438,8 @@ def reactivate_subscription():
         if status != "cancelling":
             return jsonify({"error": "subscription_not_cancelling"}), 400
 
-        sub = stripe.Subscription.retrieve(subscription_id)
-        stripe_status = getattr(sub, "status", None)
+        sub = get_subscription_cache().get(subscription_id) or {}
+        stripe_status = sub.get("status")
 
         if stripe_status == "canceled":
             _update_subscription_status(user_id, None, "cancelled")
@@ -593,12 +448,14 @@ def reactivate_subscription():
         if stripe_status != "active":
             return jsonify({"error": "subscription_not_active", "message": f"Subscription status is {stripe_status}"}), 400
 
-        stripe.Subscription.modify(subscription_id, cancel_at_period_end=False)
+        sub = stripe.Subscription.modify(subscription_id, cancel_at_period_end=False)
+        get_subscription_cache().put(sub)
         _update_subscription_status(user_id, subscription_id, "active")
 
         return jsonify({"ok": True, "message": "Subscription reactivated"}), 200
     except stripe.error.InvalidRequestError as se:
         if "canceled" in str(se).lower():
+            get_subscription_cache().invalidate(subscription_id)
             _update_subscription_status(user_id, None, "cancelled")
             return jsonify({"error": "subscription_already_cancelled", "message": "This subscription has ended. Please subscribe again."}), 400
         current_app.logger.exception("Stripe error reactivating subscription")
@@ -0,0 +1,55 @@
+"""
+Multi-template resume export bundle (streamed zip).
+"""
+from flask import Blueprint, Response, request, jsonify
+
+from app.services.admission import admission
+from app.services.export_bundle import BUNDLE_FORMATS, stream_bundle
+
+bundle_export_bp = Blueprint("bundle_export", __name__, url_prefix="/api/export")
+
+VALID_TEMPLATES = ["classic", "modern", "compact"]
+
+
+@bundle_export_bp.route("/resume-bundle", methods=["POST"])
+@admission("export_styled")
+def export_resume_bundle():
+    """
+    Render several templates concurrently and stream them back as one zip.
+
+    Request body:
+        {
+            "resume": { ... },
+            "template_ids": ["classic", "modern", "compact"],  (optional, default all)
+            "format": "docx" | "pdf"                           (optional, default docx)
+        }
+
+    Returns:
+        application/zip stream, entries written as each render finishes.
+    """
+    data = request.get_json(silent=True) or {}
+    resume = data.get("resume")
+    template_ids = data.get("template_ids") or VALID_TEMPLATES
+    fmt = data.get("format", "docx")
+
+    if not resume:
+        return jsonify({"error": "missing_resume"}), 400
+
+    if not isinstance(template_ids, list) or any(t not in VALID_TEMPLATES for t in template_ids):
+        return jsonify({
+            "error": "invalid_template",
+            "message": f"Templates must be any of: {', '.join(VALID_TEMPLATES)}"
+        }), 400
+
+    if fmt not in BUNDLE_FORMATS:
+        return jsonify({
+            "error": "invalid_format",
+            "message": f"Format must be one of: {', '.join(BUNDLE_FORMATS)}"
+        }), 400
+
+    template_ids = list(dict.fromkeys(template_ids))
+
+    resp = Response(stream_bundle(resume, template_ids, fmt), mimetype="application/zip")
+    resp.headers["Content-Disposition"] = f"attachment; filename=resume_templates_{fmt}.zip"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
@@ -1,9 +1,12 @@
-from flask import Blueprint, request, send_file, jsonify
-from docx import Document
+from flask import Blueprint, request, jsonify
 from docx.shared import Pt
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 import io
 
+from app.services.docx_skeletons import new_document, BASIC_SKELETON
+from app.services.export_cache import export_key, get_export_cache
+from app.utils.http_cache import DOCX_MIMETYPE, client_has, not_modified, send_bytes
+
 export_bp = Blueprint("export", __name__, url_prefix="/api/export")
 
 
@@ -15,12 +18,17 @@ def export_resume_docx():
     if not resume:
         return jsonify({"error": "missing_resume"}), 400
 
-    doc = Document()
+    etag = export_key(resume, BASIC_SKELETON, "python-docx")
+    if client_has(etag):
+        return not_modified(etag)
+
+    docx_bytes = get_export_cache().get_or_render(etag, lambda: _render_resume_docx(resume))
+    return send_bytes(docx_bytes, "optimized_resume.docx", DOCX_MIMETYPE, etag)
+
 
-    # ----- Base font -----
-    style = doc.styles["Normal"]
-    style.font.name = "Calibri"
-    style.font.size = Pt(11)
+def _render_resume_docx(resume: dict) -> bytes:
+    # Base font (Calibri 11) comes preset on the cached skeleton
+    doc = new_document(BASIC_SKELETON)
 
     # ===== HEADER =====
     name = resume.get("name") or "Your Name"
@@ -63,17 +71,7 @@ def export_resume_docx():
 
         doc.add_paragraph("")  # spacer
 
-    # ===== Return as .docx =====
+    # ===== Return as .docx bytes =====
     buf = io.BytesIO()
     doc.save(buf)
-    buf.seek(0)
-
-    return send_file(
-        buf,
-        as_attachment=True,
-        download_name="optimized_resume.docx",
-        mimetype=(
-            "application/vnd.openxmlformats-officedocument."
-            "wordprocessingml.document"
-        ),
-    )
+    return buf.getvalue()
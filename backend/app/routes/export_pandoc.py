@@ -1,16 +1,18 @@
 """
 Pandoc-based resume export routes with template support.
 """
-from flask import Blueprint, request, send_file, jsonify
-import io
+from flask import Blueprint, request, jsonify
 
+from app.services.admission import admission
+from app.services.export_cache import export_key, get_export_cache
+from app.utils.http_cache import DOCX_MIMETYPE, client_has, not_modified, send_bytes
 from app.services.resume_converter import (
     get_available_templates,
-    generate_docx,
-    generate_docx_fallback,
-    PandocNotAvailableError,
+    generate_styled_docx,
+    styled_renderer,
     TemplateNotFoundError,
 )
+from app.services.pandoc_pool import PandocBusyError, PandocTimeoutError, PandocConversionError
 
 pandoc_export_bp = Blueprint("pandoc_export", __name__, url_prefix="/api/export")
 
@@ -28,6 +30,7 @@ def list_templates():
 
 
 @pandoc_export_bp.route("/resume-styled", methods=["POST"])
+@admission("export_styled")
 def export_styled_resume():
     """
     Generate a styled DOCX resume using the specified template.
@@ -39,7 +42,8 @@ def export_styled_resume():
         }
 
     Returns:
-        DOCX file download.
+        DOCX file download tagged with a content-hash ETag; 304 when the
+        request's If-None-Match already matches.
     """
     data = request.get_json(silent=True) or {}
     resume = data.get("resume")
@@ -56,29 +60,34 @@ def export_styled_resume():
             "message": f"Template must be one of: {', '.join(valid_templates)}"
         }), 400
 
-    try:
-        # Try Pandoc first, fall back to python-docx if unavailable
-        try:
-            docx_bytes = generate_docx(resume, template_id)
-        except PandocNotAvailableError:
-            # Fallback to python-docx direct generation
-            docx_bytes = generate_docx_fallback(resume, template_id)
+    etag = export_key(resume, template_id, styled_renderer())
+    if client_has(etag):
+        return not_modified(etag)
 
-        # Send file
-        buf = io.BytesIO(docx_bytes)
-        buf.seek(0)
+    try:
+        # Pandoc first, python-docx if Pandoc is unavailable
+        docx_bytes = get_export_cache().get_or_render(
+            etag, lambda: generate_styled_docx(resume, template_id)
+        )
 
         filename = f"resume_{template_id}.docx"
 
-        return send_file(
-            buf,
-            as_attachment=True,
-            download_name=filename,
-            mimetype="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        )
+        return send_bytes(docx_bytes, filename, DOCX_MIMETYPE, etag)
 
     except TemplateNotFoundError as e:
         return jsonify({"error": "template_not_found", "message": str(e)}), 404
 
+    except PandocBusyError as e:
+        resp = jsonify({"error": "export_busy", "message": str(e)})
+        resp.headers["Retry-After"] = "2"
+        return resp, 503
+
+    except PandocTimeoutError as e:
+        return jsonify({"error": "export_timeout", "message": str(e)}), 504
+
+    except PandocConversionError as e:
+        # pandoc rejected this document (message carries its stderr summary)
+        return jsonify({"error": "export_conversion_failed", "message": str(e)}), 422
+
     except Exception as e:
         return jsonify({"error": "export_failed", "message": str(e)}), 500
@@ -0,0 +1,54 @@
+"""
+PDF resume export routes (PyMuPDF Story, in-process).
+"""
+from flask import Blueprint, request, jsonify
+
+from app.services.admission import admission
+from app.services.export_cache import export_key, get_export_cache
+from app.services.pdf_renderer import generate_pdf
+from app.utils.http_cache import client_has, not_modified, send_bytes
+
+pdf_export_bp = Blueprint("pdf_export", __name__, url_prefix="/api/export")
+
+PDF_MIMETYPE = "application/pdf"
+
+
+@pdf_export_bp.route("/resume-pdf", methods=["POST"])
+@admission("export_styled")
+def export_pdf_resume():
+    """
+    Generate a styled PDF resume using the specified template.
+
+    Request body:
+        {
+            "resume": { ... },
+            "template_id": "classic" | "modern" | "compact"
+        }
+
+    Returns:
+        PDF file download tagged with a content-hash ETag; 304 when the
+        request's If-None-Match already matches.
+    """
+    data = request.get_json(silent=True) or {}
+    resume = data.get("resume")
+    template_id = data.get("template_id", "classic")
+
+    if not resume:
+        return jsonify({"error": "missing_resume"}), 400
+
+    valid_templates = ["classic", "modern", "compact"]
+    if template_id not in valid_templates:
+        return jsonify({
+            "error": "invalid_template",
+            "message": f"Template must be one of: {', '.join(valid_templates)}"
+        }), 400
+
+    etag = export_key(resume, template_id, "pymupdf")
+    if client_has(etag):
+        return not_modified(etag)
+
+    try:
+        pdf_bytes = get_export_cache().get_or_render(etag, lambda: generate_pdf(resume, template_id))
+        return send_bytes(pdf_bytes, f"resume_{template_id}.pdf", PDF_MIMETYPE, etag)
+    except Exception as e:
+        return jsonify({"error": "export_failed", "message": str(e)}), 500
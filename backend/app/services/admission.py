@@ -0,0 +1,279 @@
+"""
+Admission control for the expensive endpoints.
+
+Each guarded endpoint (analyze, styled/PDF exports, file extraction, the
+OpenAI-backed suggest/enrich routes) has a
+concurrency limit and a bounded wait queue per priority lane:
+
+    - a request runs at once if a slot is free and nobody is queued
+    - otherwise it waits in its lane; paid subscribers ("paid" lane) are
+      always admitted before everyone else ("standard" lane)
+    - if its lane's queue is full, or no slot frees up within the wait
+      timeout, it gets 429 with a Retry-After estimated from recent run times
+
+Waiting requests still hold a gunicorn thread, so all controllers together
+never occupy more than GUNICORN_THREADS - ADMISSION_RESERVED_THREADS threads
+(running or queued); the reserved threads stay free for health checks and
+the cheap endpoints.
+
+Per endpoint: ADMISSION_<NAME>_CONCURRENCY, ADMISSION_<NAME>_QUEUE and
+ADMISSION_<NAME>_WAIT (seconds), e.g. ADMISSION_ANALYZE_CONCURRENCY=4.
+"""
+import os
+import math
+import time
+import heapq
+import itertools
+import threading
+import logging
+from functools import wraps
+
+from flask import Response, request, jsonify
+
+from app.utils.auth_tokens import current_identity
+from app.services.profile_cache import get_profile_cache
+
+logger = logging.getLogger(__name__)
+
+LANES = ("paid", "standard")  # in priority order
+_PAID_STATUSES = ("active", "cancelling")
+
+
+class AdmissionRejected(Exception):
+    """The request was not admitted; retry_after is a hint in seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ThreadBudget:
+    """Process-wide cap on requests held (running or queued) by all controllers."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.held = 0
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            if self.held >= self.limit:
+                return False
+            self.held += 1
+            return True
+
+    def give_back(self) -> None:
+        with self._lock:
+            self.held -= 1
+
+
+class AdmissionController:
+    """
+    Args:
+        name: Endpoint name (metrics key)
+        limit: Requests running at once
+        max_queue: Waiting requests per lane
+        max_wait: Seconds a queued request waits for a slot
+        budget: Shared ThreadBudget (None for no process-wide cap)
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait: float,
+                 budget: ThreadBudget | None = None):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.budget = budget
+        self._cond = threading.Condition()
+        self._waiters: list = []  # heap of (lane rank, seq)
+        self._seq = itertools.count()
+        self._avg_run = 1.0  # EWMA of run time in seconds, for Retry-After
+        self.active = 0
+        self.queued = {lane: 0 for lane in LANES}
+        self.admitted = {lane: 0 for lane in LANES}
+        self.rejected = {lane: 0 for lane in LANES}
+        self.timeouts = 0
+        self.max_queued_seen = 0
+
+    def _retry_after(self) -> int:
+        waiting = len(self._waiters)
+        return max(1, math.ceil(self._avg_run * (waiting / max(1, self.limit) + 1)))
+
+    def _reject(self, lane: str, reason: str):
+        self.rejected[lane] += 1
+        return AdmissionRejected(reason, self._retry_after())
+
+    def acquire(self, lane: str = "standard") -> None:
+        """Wait for a slot in `lane`; raises AdmissionRejected when the request is shed."""
+        if self.budget is not None and not self.budget.take():
+            with self._cond:
+                raise self._reject(lane, "server_busy")
+        try:
+            self._acquire(lane)
+        except AdmissionRejected:
+            if self.budget is not None:
+                self.budget.give_back()
+            raise
+
+    def _acquire(self, lane: str) -> None:
+        with self._cond:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                self.admitted[lane] += 1
+                return
+            if self.queued[lane] >= self.max_queue:
+                raise self._reject(lane, "queue_full")
+
+            ticket = (LANES.index(lane), next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            self.queued[lane] += 1
+            self.max_queued_seen = max(self.max_queued_seen, len(self._waiters))
+            deadline = time.monotonic() + self.max_wait
+            try:
+                while not (self.active < self.limit and self._waiters[0] == ticket):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._waiters.remove(ticket)
+                        heapq.heapify(self._waiters)
+                        self._cond.notify_all()
+                        self.timeouts += 1
+                        raise self._reject(lane, "queue_timeout")
+                    self._cond.wait(remaining)
+                heapq.heappop(self._waiters)
+            finally:
+                self.queued[lane] -= 1
+            self.active += 1
+            self.admitted[lane] += 1
+            self._cond.notify_all()  # the next waiter may fit too
+
+    def release(self, run_seconds: float) -> None:
+        with self._cond:
+            self.active -= 1
+            self._avg_run = 0.8 * self._avg_run + 0.2 * run_seconds
+            self._cond.notify_all()
+        if self.budget is not None:
+            self.budget.give_back()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "active": self.active,
+                "queued": dict(self.queued),
+                "queue_limit": self.max_queue,
+                "max_queued": self.max_queued_seen,
+                "admitted": dict(self.admitted),
+                "rejected": dict(self.rejected),
+                "timeouts": self.timeouts,
+                "avg_run_s": round(self._avg_run, 3),
+            }
+
+
+_DEFAULTS = {
+    # name: (concurrency, queue per lane, max wait seconds)
+    "analyze": (max(2, int(os.getenv("ANALYSIS_WORKERS", "0"))), 2, 20.0),
+    "export_styled": (2, 2, 15.0),
+    "extract": (2, 2, 10.0),
+    # OpenAI routes: as many as the LLM gateway runs at once, the rest wait here
+    # (holding a thread) instead of inside the gateway
+    "llm": (int(os.getenv("LLM_MAX_CONCURRENCY", "4")), 2, float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))),
+}
+
+_CONTROLLERS: dict = {}
+_BUDGET = None
+_LOCK = threading.Lock()
+
+
+def get_thread_budget() -> ThreadBudget:
+    """Process-wide thread budget shared by all controllers (created once per process)."""
+    global _BUDGET
+    if _BUDGET is None:
+        with _LOCK:
+            if _BUDGET is None:
+                threads = int(os.getenv("GUNICORN_THREADS", "8"))
+                reserved = int(os.getenv("ADMISSION_RESERVED_THREADS", "2"))
+                _BUDGET = ThreadBudget(max(1, threads - reserved))
+    return _BUDGET
+
+
+def get_admission_controller(name: str) -> AdmissionController:
+    """Shared controller for an endpoint (created once per process)."""
+    controller = _CONTROLLERS.get(name)
+    if controller is None:
+        budget = get_thread_budget()
+        with _LOCK:
+            controller = _CONTROLLERS.get(name)
+            if controller is None:
+                limit, queue, wait = _DEFAULTS.get(name, (2, 2, 10.0))
+                env = f"ADMISSION_{name.upper()}"
+                controller = _CONTROLLERS[name] = AdmissionController(
+                    name,
+                    limit=int(os.getenv(f"{env}_CONCURRENCY", str(limit))),
+                    max_queue=int(os.getenv(f"{env}_QUEUE", str(queue))),
+                    max_wait=float(os.getenv(f"{env}_WAIT", str(wait))),
+                    budget=budget,
+                )
+    return controller
+
+
+def admission_stats() -> dict:
+    stats = {name: controller.stats() for name, controller in list(_CONTROLLERS.items())}
+    if _BUDGET is not None:
+        stats["threads"] = {"held": _BUDGET.held, "limit": _BUDGET.limit}
+    return stats
+
+
+def request_lane() -> str:
+    """"paid" for users with an active subscription, "standard" for everyone else."""
+    try:
+        uid = request.headers.get("X-User-Id")
+        if not uid:
+            identity = current_identity()
+            uid = identity.uid if identity else None
+        if not uid:
+            return "standard"
+        row = get_profile_cache().get(uid) or {}
+        return "paid" if row.get("subscription_status") in _PAID_STATUSES else "standard"
+    except Exception as e:
+        logger.debug("admission lane lookup failed: %s", e)
+        return "standard"
+
+
+def admission(name: str):
+    """
+    Route decorator: run the view only once the endpoint's controller admits it.
+
+    Rejected requests get 429 {"error": "too_busy"} with a Retry-After header.
+    OPTIONS preflights are never queued. A streamed response keeps its slot
+    until the stream is closed, since its body is produced while it is sent.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method == "OPTIONS":
+                return view(*args, **kwargs)
+            controller = get_admission_controller(name)
+            try:
+                controller.acquire(request_lane())
+            except AdmissionRejected as e:
+                resp = jsonify({
+                    "error": "too_busy",
+                    "reason": e.reason,
+                    "message": "The server is busy, please retry shortly.",
+                })
+                resp.headers["Retry-After"] = str(e.retry_after)
+                return resp, 429
+            started = time.monotonic()
+            handed_off = False
+            try:
+                rv = view(*args, **kwargs)
+                if isinstance(rv, Response) and rv.is_streamed:
+                    rv.call_on_close(lambda: controller.release(time.monotonic() - started))
+                    handed_off = True
+                return rv
+            finally:
+                if not handed_off:
+                    controller.release(time.monotonic() - started)
+        return wrapper
+    return decorator
@@ -0,0 +1,487 @@
+"""
+Asynchronous smart analysis jobs.
+
+POST /api/smart/analyze/jobs reserves the credit, enqueues the analysis and
+returns 202 with a job id right away; a small thread pool runs the analysis
+(in the analysis process pool when that is configured) and the client polls
+GET /api/smart/analyze/jobs/<id> for the status and, once done, the same body
+the synchronous /analyze returns.
+
+Job state lives in a SQLite file (ANALYSIS_JOB_DB_PATH, or under DATA_DIR;
+it holds reserved credits, so it must be on persistent storage) so any
+gunicorn worker on the host can answer the poll, not only the one running the
+job. Finished jobs are kept for ANALYSIS_JOB_TTL seconds. A failed job refunds
+its credit; jobs left queued or running by a worker that died are failed and
+refunded by the leader worker (app.utils.leader) at startup and every
+ANALYSIS_JOB_RECOVER_INTERVAL seconds.
+
+Each job records its owner's pid and the server's boot id (APP_BOOT_ID, set
+once per gunicorn master). A job from another boot is dead even if its pid
+is alive again: after a container restart the new workers often get the same
+low pids.
+
+Duplicate submissions (same user and request body, see
+app.services.singleflight.request_fingerprint) get the job that is already
+queued or running, or one that finished less than SINGLEFLIGHT_LINGER seconds
+ago, and are not charged again. A partial unique index on the request key
+makes this hold across processes. The synchronous /analyze records its run as
+a job row too (run_inline), so a duplicate of it on another worker waits for
+that row's result instead of paying for a second analysis.
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import concurrent.futures
+import logging
+
+from app.services.credit_ledger import Reservation, get_credit_ledger
+from app.utils.storage import state_path
+
+logger = logging.getLogger(__name__)
+
+_POLL_SECONDS = 0.25
+
+
+class JobQueueFull(Exception):
+    """No room for another job (globally or for this user)."""
+    pass
+
+
+def boot_id() -> str:
+    """Id of this server instance, shared by the gunicorn master and its workers."""
+    value = os.getenv("APP_BOOT_ID")
+    if not value:
+        # Not started through gunicorn.conf.py: this process is the server
+        value = os.environ.setdefault("APP_BOOT_ID", uuid.uuid4().hex)
+    return value
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class AnalysisJobStore:
+    """
+    Job rows shared by every process on the host.
+
+    Args:
+        path: SQLite file (":memory:" for tests)
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("pragma journal_mode=wal")
+            self._conn.executescript(
+                """
+                create table if not exists analysis_jobs (
+                    id text primary key,
+                    user_id text not null,
+                    status text not null default 'queued',
+                    credits integer not null default 0,
+                    owner_pid integer not null,
+                    result text,
+                    error text,
+                    created_at real not null,
+                    finished_at real
+                );
+                create index if not exists analysis_jobs_user on analysis_jobs (user_id, status);
+                create index if not exists analysis_jobs_finished on analysis_jobs (finished_at);
+                """
+            )
+            columns = {row[1] for row in self._conn.execute("pragma table_info(analysis_jobs)")}
+            if "request_key" not in columns:
+                self._conn.execute("alter table analysis_jobs add column request_key text")
+            if "owner_boot" not in columns:
+                self._conn.execute("alter table analysis_jobs add column owner_boot text")
+            self._conn.execute(
+                "create unique index if not exists analysis_jobs_active_key on analysis_jobs (request_key) "
+                "where request_key is not null and status in ('queued', 'running')"
+            )
+
+    def create(self, job_id: str, uid: str, credits: int, request_key: str | None = None) -> None:
+        """Insert a queued job; sqlite3.IntegrityError if `request_key` is already active."""
+        with self._lock:
+            self._conn.execute(
+                "insert into analysis_jobs (id, user_id, credits, owner_pid, owner_boot, created_at, request_key) "
+                "values (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, uid, credits, os.getpid(), boot_id(), time.time(), request_key),
+            )
+
+    def find_duplicate(self, request_key: str, window: float) -> str | None:
+        """Id of an active job for `request_key`, or one that finished within `window` seconds."""
+        with self._lock:
+            row = self._conn.execute(
+                "select id from analysis_jobs where request_key = ? "
+                "and (status in ('queued', 'running') or (status = 'done' and finished_at >= ?)) "
+                "order by created_at desc limit 1",
+                (request_key, time.time() - window),
+            ).fetchone()
+        return row[0] if row else None
+
+    def mark_running(self, job_id: str) -> bool:
+        """Start a queued job; False if it was failed (and refunded) before it started."""
+        with self._lock:
+            cur = self._conn.execute(
+                "update analysis_jobs set status = 'running' where id = ? and status = 'queued'", (job_id,)
+            )
+            return cur.rowcount == 1
+
+    def finish(self, job_id: str, result: dict) -> bool:
+        """Store the result of an active job; False if it was failed (and refunded) meanwhile."""
+        with self._lock:
+            cur = self._conn.execute(
+                "update analysis_jobs set status = 'done', result = ?, finished_at = ? "
+                "where id = ? and status in ('queued', 'running')",
+                (json.dumps(result, separators=(",", ":")), time.time(), job_id),
+            )
+            return cur.rowcount == 1
+
+    def fail(self, job_id: str, error: str) -> bool:
+        """Mark an active job failed; False if it had already finished (or failed)."""
+        with self._lock:
+            cur = self._conn.execute(
+                "update analysis_jobs set status = 'failed', error = ?, finished_at = ? "
+                "where id = ? and status in ('queued', 'running')",
+                (error, time.time(), job_id),
+            )
+            return cur.rowcount == 1
+
+    def get(self, job_id: str, uid: str) -> dict | None:
+        """The job as the client sees it; None if unknown or owned by someone else."""
+        with self._lock:
+            row = self._conn.execute(
+                "select status, result, error, created_at, finished_at from analysis_jobs "
+                "where id = ? and user_id = ?",
+                (job_id, uid),
+            ).fetchone()
+        if row is None:
+            return None
+        job = {"job_id": job_id, "status": row[0], "created_at": row[3]}
+        if row[0] == "done":
+            job["result"] = json.loads(row[1])
+        elif row[0] == "failed":
+            job["error"] = row[2]
+        if row[4] is not None:
+            job["finished_at"] = row[4]
+        return job
+
+    def active_count(self, uid: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "select count(*) from analysis_jobs where user_id = ? and status in ('queued', 'running')",
+                (uid,),
+            ).fetchone()
+        return row[0]
+
+    def purge(self, ttl: float) -> int:
+        """Delete finished jobs older than `ttl` seconds."""
+        with self._lock:
+            cur = self._conn.execute(
+                "delete from analysis_jobs where finished_at is not null and finished_at < ?",
+                (time.time() - ttl,),
+            )
+            return cur.rowcount
+
+    def orphans(self) -> list:
+        """(id, user_id, credits) of active jobs whose owning process is gone."""
+        with self._lock:
+            rows = self._conn.execute(
+                "select id, user_id, credits, owner_pid, owner_boot from analysis_jobs "
+                "where status in ('queued', 'running')"
+            ).fetchall()
+        current = boot_id()
+        return [
+            (r[0], r[1], r[2]) for r in rows
+            if r[4] != current or (r[3] != os.getpid() and not _pid_alive(r[3]))
+        ]
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("select status, count(*) from analysis_jobs group by status").fetchall()
+        return {status: n for status, n in rows}
+
+
+class AnalysisJobRunner:
+    """
+    Args:
+        store: AnalysisJobStore
+        workers: Jobs this process runs at once
+        max_pending: Jobs this process accepts (queued + running)
+        per_user: Active jobs per user across all processes
+        ttl: Seconds finished jobs are kept for polling
+        dedupe_window: Seconds a finished job still answers duplicate submissions
+        wait_timeout: Seconds a duplicate synchronous request waits for the
+            job it duplicates
+    """
+
+    def __init__(self, store: AnalysisJobStore, workers: int = 2, max_pending: int = 50,
+                 per_user: int = 3, ttl: float = 600.0, dedupe_window: float = 2.0,
+                 wait_timeout: float = 120.0):
+        self.store = store
+        self.wait_timeout = wait_timeout
+        self.max_pending = max_pending
+        self.per_user = per_user
+        self.ttl = ttl
+        self.dedupe_window = dedupe_window
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="analysis-job"
+        )
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.deduplicated = 0
+
+    def duplicate_of(self, request_key: str | None) -> str | None:
+        """Job already answering this exact request, if any (nothing is charged for it)."""
+        if not request_key:
+            return None
+        job_id = self.store.find_duplicate(request_key, self.dedupe_window)
+        if job_id is not None:
+            with self._lock:
+                self.deduplicated += 1
+        return job_id
+
+    def check_capacity(self, uid: str) -> None:
+        """Raise JobQueueFull before any credit is reserved for a job that cannot be taken."""
+        with self._lock:
+            full = self.pending >= self.max_pending
+        if full or self.store.active_count(uid) >= self.per_user:
+            with self._lock:
+                self.rejected += 1
+            raise JobQueueFull("user_limit" if not full else "queue_full")
+
+    def submit(self, uid: str, reservation: Reservation, fn, request_key: str | None = None) -> str:
+        """
+        Enqueue `fn` for `uid`, paid for by `reservation`.
+
+        Args:
+            fn: Zero-arg callable returning (response body, HTTP status) like
+                the synchronous endpoint; status 200 means success
+            request_key: Fingerprint of the request, for duplicate detection
+
+        Returns:
+            The job id. If an identical request won a race from another
+            process, the reservation is refunded and that job's id returned.
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise JobQueueFull("queue_full")
+            self.pending += 1
+            self.submitted += 1
+        try:
+            job_id, duplicate = self._register(uid, reservation, request_key)
+        except Exception:
+            with self._lock:
+                self.pending -= 1
+            raise
+        if duplicate:
+            with self._lock:
+                self.pending -= 1
+            return job_id
+        try:
+            self._executor.submit(self._run, job_id, reservation, fn)
+        except Exception:
+            self.store.fail(job_id, "not_started")
+            with self._lock:
+                self.pending -= 1
+            raise
+        return job_id
+
+    def _register(self, uid: str, reservation: Reservation, request_key: str | None) -> tuple:
+        """
+        Insert the job row.
+
+        Returns:
+            (job_id, False), or (id of the identical job, True) when one won
+            a race from another process; the reservation is refunded then.
+        """
+        self.store.purge(self.ttl)
+        job_id = uuid.uuid4().hex
+        try:
+            self.store.create(job_id, uid, reservation.amount, request_key)
+        except sqlite3.IntegrityError:
+            existing = self.duplicate_of(request_key)
+            if existing is None:
+                raise
+            get_credit_ledger().refund(reservation)
+            return existing, True
+        return job_id, False
+
+    def _execute(self, job_id: str, reservation: Reservation, fn) -> tuple:
+        """
+        Run `fn` for a registered job, record the outcome and settle its
+        reservation.
+
+        Whoever moves the row out of queued/running settles the credits: this
+        thread commits or refunds them only if its own finish()/fail() did,
+        otherwise recover_orphans() already failed the job and refunded them.
+        If the store itself errors, the row stays active and the reservation
+        unsettled until recovery refunds it.
+        """
+        ledger = get_credit_ledger()
+        body, status = None, None
+        owned = self.store.mark_running(job_id)
+        if owned:
+            try:
+                body, status = fn()
+            except Exception:
+                logger.exception("analysis job %s failed", job_id)
+                body, status = {"error": "internal_server_error"}, 500
+            if status == 200:
+                owned = self.store.finish(job_id, body)
+            else:
+                owned = self.store.fail(job_id, (body or {}).get("error") or "analysis_failed")
+
+        ok = owned and status == 200
+        if not owned:
+            # Lost the race to recovery: the row is failed and already refunded
+            logger.warning("analysis job %s was failed by recovery; result dropped", job_id)
+            ledger.mark_refunded(reservation)
+            body, status = {"error": "interrupted", "message": "Analysis was interrupted, please retry."}, 500
+        elif ok:
+            ledger.commit(reservation)
+        else:
+            ledger.refund(reservation)
+        with self._lock:
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+        return body, status
+
+    def _run(self, job_id: str, reservation: Reservation, fn) -> None:
+        try:
+            self._execute(job_id, reservation, fn)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def run_inline(self, uid: str, reservation: Reservation, fn, request_key: str | None = None) -> tuple:
+        """
+        Run `fn` in the calling thread, recorded as a job row so identical
+        requests on other workers find it (see outcome()).
+
+        Returns:
+            (response body, HTTP status); the outcome of the identical job
+            instead if one won the race (the reservation is refunded then)
+        """
+        job_id, duplicate = self._register(uid, reservation, request_key)
+        if duplicate:
+            return self.outcome(job_id, uid)
+        return self._execute(job_id, reservation, fn)
+
+    def outcome(self, job_id: str, uid: str, timeout: float | None = None) -> tuple:
+        """
+        Wait for a job (e.g. the one an identical request started) and return
+        its (response body, HTTP status), waiting at most `timeout` seconds.
+        """
+        deadline = time.monotonic() + (self.wait_timeout if timeout is None else timeout)
+        while True:
+            job = self.store.get(job_id, uid)
+            if job is None:
+                return {"error": "internal_server_error"}, 500
+            if job["status"] == "done":
+                return job["result"], 200
+            if job["status"] == "failed":
+                error = job.get("error") or "analysis_failed"
+                return {"error": error}, 504 if error == "analysis_timeout" else 500
+            if time.monotonic() >= deadline:
+                return {"error": "analysis_timeout", "message": "Analysis took too long, please retry."}, 504
+            time.sleep(_POLL_SECONDS)
+
+    def status(self, job_id: str, uid: str) -> dict | None:
+        return self.store.get(job_id, uid)
+
+    def recover_orphans(self) -> int:
+        """Fail and refund jobs whose process died before finishing them."""
+        ledger = get_credit_ledger()
+        orphans = self.store.orphans()
+        recovered = 0
+        for job_id, uid, credits in orphans:
+            # fail() is conditional, so only one process refunds each orphan
+            if not self.store.fail(job_id, "interrupted"):
+                continue
+            if credits:
+                ledger.refund(Reservation(user_id=uid, amount=credits, balance=0))
+            logger.warning("analysis job %s interrupted by a worker restart; refunded", job_id)
+            recovered += 1
+        return recovered
+
+    def stats(self) -> dict:
+        with self._lock:
+            local = {
+                "pending": self.pending,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "deduplicated": self.deduplicated,
+            }
+        return {**local, "jobs": self.store.counts()}
+
+
+_RUNNER = None
+_RUNNER_LOCK = threading.Lock()
+
+
+def get_analysis_jobs() -> AnalysisJobRunner:
+    """Shared job runner + store (created once per process from env config)."""
+    global _RUNNER
+    if _RUNNER is None:
+        with _RUNNER_LOCK:
+            if _RUNNER is None:
+                _RUNNER = AnalysisJobRunner(
+                    AnalysisJobStore(state_path("ANALYSIS_JOB_DB_PATH", "analysis_jobs.sqlite3")),
+                    workers=int(os.getenv("ANALYSIS_JOB_WORKERS", "2")),
+                    max_pending=int(os.getenv("ANALYSIS_JOB_MAX_PENDING", "50")),
+                    per_user=int(os.getenv("ANALYSIS_JOB_PER_USER", "3")),
+                    ttl=float(os.getenv("ANALYSIS_JOB_TTL", "600")),
+                    dedupe_window=float(os.getenv("SINGLEFLIGHT_LINGER", "2")),
+                    wait_timeout=float(os.getenv("ANALYSIS_TIMEOUT", "120")),
+                )
+    return _RUNNER
+
+
+def recover_analysis_jobs(interval: float | None = None) -> None:
+    """
+    Refund jobs a previous server (or a crashed sibling worker) left
+    unfinished, now and then every `interval` seconds on a daemon thread.
+
+    Reads ANALYSIS_JOB_RECOVER_INTERVAL when interval is None; 0 runs once.
+    """
+    if interval is None:
+        interval = float(os.getenv("ANALYSIS_JOB_RECOVER_INTERVAL", "60"))
+
+    def recover():
+        try:
+            get_analysis_jobs().recover_orphans()
+        except Exception:
+            logger.exception("analysis job recovery failed")
+
+    recover()
+    if interval <= 0:
+        return
+
+    def loop():
+        stop = threading.Event()
+        while not stop.wait(interval):
+            recover()
+
+    threading.Thread(target=loop, name="analysis-job-recovery", daemon=True).start()
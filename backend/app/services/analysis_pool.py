@@ -0,0 +1,232 @@
+"""
+Process pool for the smart analysis.
+
+smart_predict_resume_improvements is mostly GIL-bound Python plus sklearn and
+torch work, so inside one gunicorn worker it never uses much more than a
+single core however many request threads are busy. With ANALYSIS_WORKERS > 0
+the advisor runs in that many worker processes instead:
+
+    - workers are spawned (not forked, torch does not survive fork with live
+      threads) and each loads the embedder and KeyBERT once at startup
+    - each worker is recycled after ANALYSIS_MAX_TASKS_PER_WORKER jobs,
+      which bounds slow memory growth in long-lived processes
+    - torch runs single-threaded per worker (ANALYSIS_WORKER_THREADS), so
+      N workers use N cores instead of oversubscribing them
+    - request threads submit a job and wait up to ANALYSIS_TIMEOUT seconds
+
+The on_skills callback of the advisor still fires early: workers post the
+skill lists on a queue that a listener thread in this process dispatches.
+
+ANALYSIS_WORKERS=0 (the default) runs the advisor in the request thread.
+"""
+import os
+import uuid
+import threading
+import multiprocessing
+import concurrent.futures
+import logging
+from concurrent.futures.process import BrokenProcessPool
+
+from app.services.smart_resume_advisor import SmartAdvice, smart_predict_resume_improvements
+
+logger = logging.getLogger(__name__)
+
+_WORKER_EVENTS = None  # set in each worker process by _init_worker
+
+
+class AnalysisTimeoutError(Exception):
+    """The analysis did not finish within the timeout."""
+    pass
+
+
+def _init_worker(events, torch_threads: int) -> None:
+    global _WORKER_EVENTS
+    _WORKER_EVENTS = events
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+    # Load the models once per worker, not per job
+    from app.services.smart_resume_advisor import get_emb, get_kw
+    get_emb()
+    get_kw()
+
+
+def _warm() -> int:
+    return os.getpid()
+
+
+def _analyze_in_worker(job_id: str, resume_text: str, job_text: str, job_title: str,
+                       notify: bool) -> SmartAdvice:
+    def on_skills(present, missing, critical):
+        _WORKER_EVENTS.put((job_id, (present, missing, critical)))
+
+    return smart_predict_resume_improvements(
+        resume_text=resume_text,
+        job_text=job_text,
+        job_title=job_title,
+        on_skills=on_skills if notify else None,
+    )
+
+
+class AnalysisPool:
+    """
+    Args:
+        workers: Number of worker processes
+        max_tasks_per_worker: Jobs a worker runs before it is replaced
+        timeout: Default seconds a caller waits for a result
+        torch_threads: torch intra-op threads per worker
+    """
+
+    def __init__(self, workers: int, max_tasks_per_worker: int = 200, timeout: float = 120.0,
+                 torch_threads: int = 1):
+        self.workers = workers
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.timeout = timeout
+        self.torch_threads = torch_threads
+        self._ctx = multiprocessing.get_context("spawn")
+        self._events = self._ctx.SimpleQueue()
+        self._callbacks: dict = {}  # job_id -> on_skills
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.in_flight = 0
+
+        self._executor = self._new_executor()
+        threading.Thread(target=self._listen, name="analysis-events", daemon=True).start()
+
+    def _new_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=self._ctx,
+            initializer=_init_worker,
+            initargs=(self._events, self.torch_threads),
+            max_tasks_per_child=self.max_tasks_per_worker,
+        )
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                job_id, args = self._events.get()
+            except (EOFError, OSError):
+                return
+            with self._lock:
+                callback = self._callbacks.pop(job_id, None)
+            if callback is None:
+                continue
+            try:
+                callback(*args)
+            except Exception:
+                logger.exception("analysis on_skills callback failed")
+
+    def warm(self) -> None:
+        """Start all workers now so the first requests do not pay for model loading."""
+        for _ in range(self.workers):
+            self._executor.submit(_warm)
+
+    def analyze(self, resume_text: str, job_text: str, job_title: str = "",
+                on_skills=None, timeout: float | None = None) -> SmartAdvice:
+        """
+        Run smart_predict_resume_improvements in a worker process and wait for it.
+
+        Raises:
+            AnalysisTimeoutError: No result within `timeout` seconds (the
+                worker finishes the job in the background)
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            if on_skills is not None:
+                self._callbacks[job_id] = on_skills
+            executor = self._executor
+            self.submitted += 1
+            self.in_flight += 1
+        future = None
+        try:
+            future = executor.submit(
+                _analyze_in_worker, job_id, resume_text, job_text, job_title, on_skills is not None
+            )
+            result = future.result(timeout=self.timeout if timeout is None else timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            with self._lock:
+                self.timeouts += 1
+            raise AnalysisTimeoutError("analysis_timeout")
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            if isinstance(e, BrokenProcessPool):
+                self._replace_executor(executor)
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self._callbacks.pop(job_id, None)
+
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def _replace_executor(self, broken) -> None:
+        # A worker died (e.g. OOM-killed); the executor is unusable afterwards
+        with self._lock:
+            if self._executor is not broken:
+                return
+            logger.error("analysis pool broken, starting a new one")
+            self._executor = self._new_executor()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_tasks_per_worker": self.max_tasks_per_worker,
+                "in_flight": self.in_flight,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timeouts": self.timeouts,
+            }
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_analysis_pool() -> AnalysisPool | None:
+    """Shared analysis pool, or None when ANALYSIS_WORKERS is 0 (analysis runs inline)."""
+    global _POOL
+    if _POOL is None:
+        workers = int(os.getenv("ANALYSIS_WORKERS", "0"))
+        if workers <= 0:
+            return None
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = AnalysisPool(
+                    workers,
+                    max_tasks_per_worker=int(os.getenv("ANALYSIS_MAX_TASKS_PER_WORKER", "200")),
+                    timeout=float(os.getenv("ANALYSIS_TIMEOUT", "120")),
+                    torch_threads=int(os.getenv("ANALYSIS_WORKER_THREADS", "1")),
+                )
+    return _POOL
+
+
+def run_analysis(resume_text: str, job_text: str, job_title: str = "", on_skills=None) -> SmartAdvice:
+    """Smart analysis in the process pool when configured, otherwise in this thread."""
+    pool = get_analysis_pool()
+    if pool is None:
+        return smart_predict_resume_improvements(
+            resume_text=resume_text,
+            job_text=job_text,
+            job_title=job_title,
+            on_skills=on_skills,
+        )
+    return pool.analyze(resume_text, job_text, job_title, on_skills=on_skills)
+
+
+def warm_analysis_pool() -> None:
+    pool = get_analysis_pool()
+    if pool is not None:
+        pool.warm()
@@ -0,0 +1,181 @@
+"""
+Avatar ingest pipeline.
+
+Uploads are read from the request stream (with a size cap), decoded and
+downscaled to fixed square sizes in a worker thread, and re-encoded as WebP
+(JPEG if WebP is unavailable). Object paths are derived from a hash of the
+encoded image, so re-uploading the same picture skips storage entirely, and
+bucket creation is attempted once per process instead of on every upload.
+"""
+import io
+import os
+import hashlib
+import tempfile
+import threading
+import logging
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+logger = logging.getLogger(__name__)
+
+AVATAR_SIZES = (256, 64)  # first entry is the one stored on the profile
+MAX_UPLOAD_BYTES = int(os.getenv("AVATAR_MAX_BYTES", str(10 * 1024 * 1024)))
+
+_WEBP = features.check("webp")
+_FORMAT, _EXT, _MIME = ("WEBP", "webp", "image/webp") if _WEBP else ("JPEG", "jpg", "image/jpeg")
+
+_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("AVATAR_WORKERS", "2")),
+    thread_name_prefix="avatar",
+)
+
+_KNOWN_BUCKETS: set = set()
+_BUCKET_LOCK = threading.Lock()
+
+
+class AvatarError(Exception):
+    """Raised when an upload is not a usable image."""
+    pass
+
+
+class AvatarBusyError(Exception):
+    """Raised when the avatar workers do not finish an upload within the timeout."""
+    pass
+
+
+@dataclass
+class AvatarRendition:
+    size: int
+    data: bytes
+    path: str
+
+
+@dataclass
+class ProcessedAvatar:
+    digest: str
+    renditions: list
+    content_type: str = _MIME
+
+    @property
+    def primary(self) -> AvatarRendition:
+        return self.renditions[0]
+
+
+def _spool_upload(stream, limit: int = MAX_UPLOAD_BYTES):
+    """Copy the upload stream into a spooled temp file, enforcing the size cap."""
+    spool = tempfile.SpooledTemporaryFile(max_size=2 * 1024 * 1024)
+    copied = 0
+    while True:
+        chunk = stream.read(64 * 1024)
+        if not chunk:
+            break
+        copied += len(chunk)
+        if copied > limit:
+            spool.close()
+            raise AvatarError("file_too_large")
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def _encode(img: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    if _FORMAT == "WEBP":
+        img.save(buf, format="WEBP", quality=82, method=4)
+    else:
+        img.save(buf, format="JPEG", quality=85, optimize=True, progressive=True)
+    return buf.getvalue()
+
+
+def _process(fileobj, uid: str) -> ProcessedAvatar:
+    # Owns fileobj: the caller may have stopped waiting while this still reads it
+    with fileobj:
+        return _downscale(fileobj, uid)
+
+
+def _downscale(fileobj, uid: str) -> ProcessedAvatar:
+    try:
+        with Image.open(fileobj) as img:
+            # JPEG can decode at reduced scale directly, far cheaper for big photos
+            img.draft("RGB", (AVATAR_SIZES[0] * 2, AVATAR_SIZES[0] * 2))
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("RGB")
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise AvatarError("invalid_image") from e
+
+    encoded = []
+    for size in AVATAR_SIZES:
+        square = ImageOps.fit(img, (size, size), method=Image.Resampling.LANCZOS)
+        encoded.append((size, _encode(square)))
+
+    digest = hashlib.sha256(encoded[0][1]).hexdigest()[:24]
+    renditions = [
+        AvatarRendition(size=size, data=data, path=f"{uid}/{digest}_{size}.{_EXT}")
+        for size, data in encoded
+    ]
+    return ProcessedAvatar(digest=digest, renditions=renditions)
+
+
+def process_avatar(stream, uid: str, timeout: float = 15.0) -> ProcessedAvatar:
+    """
+    Spool, decode, downscale and re-encode an uploaded avatar.
+
+    Args:
+        stream: File-like upload stream
+        uid: Owner user id (used as the storage path prefix)
+        timeout: Seconds to wait for the worker thread
+
+    Returns:
+        ProcessedAvatar with one rendition per AVATAR_SIZES entry
+
+    Raises:
+        AvatarError: Too large or not an image
+        AvatarBusyError: Not processed within `timeout` seconds
+    """
+    spool = _spool_upload(stream)
+    try:
+        future = _EXECUTOR.submit(_process, spool, uid)
+    except Exception:
+        spool.close()
+        raise
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        if future.cancel():
+            spool.close()  # never started, so _process will not close it
+        raise AvatarBusyError("avatar_busy")
+
+
+def ensure_bucket(supabase, bucket: str) -> None:
+    """Create the public bucket once per process (no-op afterwards)."""
+    if bucket in _KNOWN_BUCKETS:
+        return
+    with _BUCKET_LOCK:
+        if bucket in _KNOWN_BUCKETS:
+            return
+        try:
+            supabase.storage.create_bucket(bucket, {"public": True})
+        except Exception:
+            # Already exists (or creation is not permitted); uploads will tell
+            pass
+        _KNOWN_BUCKETS.add(bucket)
+
+
+def upload_avatar(supabase, bucket: str, avatar: ProcessedAvatar) -> None:
+    """Upload every rendition; objects that already exist are left as they are."""
+    ensure_bucket(supabase, bucket)
+    store = supabase.storage.from_(bucket)
+    for r in avatar.renditions:
+        try:
+            store.upload(r.path, r.data, {
+                "content-type": avatar.content_type,
+                "cache-control": "31536000",
+            })
+        except Exception as e:
+            msg = str(e).lower()
+            if "duplicate" in msg or "already exists" in msg or "409" in msg:
+                continue
+            raise
@@ -0,0 +1,325 @@
+"""
+Atomic credit ledger.
+
+Credits are taken with a single conditional decrement (reserve), which either
+returns the new balance or reports that the user has too few credits, so
+concurrent requests cannot double-spend. A reservation is then committed once
+the paid work succeeds, or refunded if it fails. Grants record the purchase and
+add the credits in one call, keyed by the purchase reference.
+
+Backends:
+    SupabaseCreditBackend  - RPCs from migrations/001_credit_ledger.sql, with a
+                             compare-and-set fallback if they are not deployed
+    SqliteCreditBackend    - local SQL stand-in with the same semantics, for
+                             tests and local development
+"""
+import os
+import sqlite3
+import threading
+import logging
+from dataclasses import dataclass
+
+from app.utils.supabase_client import get_supabase
+from app.services.profile_cache import get_profile_cache
+
+logger = logging.getLogger(__name__)
+
+_CAS_RETRIES = 5
+
+
+@dataclass
+class Reservation:
+    user_id: str
+    amount: int
+    balance: int
+    state: str = "reserved"  # reserved | committed | refunded
+
+
+def _rows(res):
+    data = getattr(res, "data", None)
+    if data is None and isinstance(res, dict):
+        data = res.get("data")
+    return data
+
+
+def _is_missing_rpc(err: Exception) -> bool:
+    code = getattr(err, "code", None) or ""
+    msg = str(err).lower()
+    return code in ("PGRST202", "42883") or "could not find the function" in msg
+
+
+def _is_duplicate(err: Exception) -> bool:
+    msg = str(err).lower()
+    return getattr(err, "code", None) == "23505" or "duplicate" in msg or "unique" in msg
+
+
+class SupabaseCreditBackend:
+    """Credit operations against Supabase (one RPC round trip each)."""
+
+    def __init__(self, client=None):
+        self._client = client
+        self._rpc_missing: set = set()  # RPC names found not deployed
+
+    @property
+    def client(self):
+        return self._client or get_supabase()
+
+    def _rpc(self, name: str, params: dict):
+        if name in self._rpc_missing:
+            raise LookupError(name)
+        try:
+            return _rows(self.client.rpc(name, params).execute())
+        except Exception as e:
+            if _is_missing_rpc(e):
+                logger.warning("credit RPC %s not deployed; using compare-and-set fallback", name)
+                self._rpc_missing.add(name)
+                raise LookupError(name)
+            raise
+
+    def _balance(self, uid: str) -> int | None:
+        res = self.client.table("profiles").select("credits").eq("user_id", uid).limit(1).execute()
+        rows = _rows(res)
+        row = rows[0] if isinstance(rows, list) and rows else (rows if isinstance(rows, dict) else None)
+        if row is None:
+            return None
+        return int(row.get("credits") or 0)
+
+    def _cas_add(self, uid: str, delta: int, floor: int | None = None) -> int | None:
+        """Add delta with an optimistic compare-and-set on the current balance."""
+        for _ in range(_CAS_RETRIES):
+            current = self._balance(uid)
+            if current is None:
+                return None
+            if floor is not None and current + delta < floor:
+                return None
+            res = (
+                self.client.table("profiles")
+                .update({"credits": current + delta})
+                .eq("user_id", uid)
+                .eq("credits", current)
+                .execute()
+            )
+            if _rows(res):
+                return current + delta
+        raise RuntimeError("credit update kept conflicting")
+
+    def reserve(self, uid: str, amount: int) -> int | None:
+        try:
+            balance = self._rpc("reserve_credits", {"p_user_id": uid, "p_amount": amount})
+            return None if balance is None else int(balance)
+        except LookupError:
+            return self._cas_add(uid, -amount, floor=0)
+
+    def refund(self, uid: str, amount: int) -> int | None:
+        try:
+            balance = self._rpc("refund_credits", {"p_user_id": uid, "p_amount": amount})
+            return None if balance is None else int(balance)
+        except LookupError:
+            return self._cas_add(uid, amount)
+
+    def _purchase_exists(self, ref: str) -> bool:
+        res = self.client.table("purchases").select("stripe_session_id").eq("stripe_session_id", ref).limit(1).execute()
+        return bool(_rows(res))
+
+    def grant(self, uid: str, amount: int, ref: str, amount_cents: int, status: str) -> int | None:
+        try:
+            balance = self._rpc("grant_credits", {
+                "p_user_id": uid,
+                "p_amount": amount,
+                "p_ref": ref,
+                "p_amount_cents": amount_cents,
+                "p_status": status,
+            })
+            return None if balance is None else int(balance)
+        except LookupError:
+            pass
+
+        # Without the RPC there is no transaction: add the credits first and
+        # record the purchase last, so a failure in between leaves no purchase
+        # row and the retry grants again instead of finding a "duplicate"
+        if self._purchase_exists(ref):
+            return None
+        if self._balance(uid) is None:
+            try:
+                self.client.table("profiles").insert({"user_id": uid, "credits": 0}).execute()
+            except Exception as e:
+                if not _is_duplicate(e):
+                    raise
+        balance = self._cas_add(uid, amount)
+        if balance is None:
+            raise RuntimeError(f"no profile row for {uid}")
+        try:
+            self.client.table("purchases").insert({
+                "user_id": uid,
+                "amount_cents": amount_cents,
+                "credits_granted": amount,
+                "status": status,
+                "stripe_session_id": ref,
+            }).execute()
+        except Exception as e:
+            # Take the credits back: either a concurrent grant recorded this
+            # purchase first (and added its own), or the retry will grant again
+            self._cas_add(uid, -amount)
+            if _is_duplicate(e):
+                return None
+            raise
+        return balance
+
+
+class SqliteCreditBackend:
+    """Local SQL stand-in mirroring the Supabase RPC semantics."""
+
+    def __init__(self, path: str = ":memory:"):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.executescript(
+                """
+                create table if not exists profiles (
+                    user_id text primary key,
+                    credits integer not null default 0
+                );
+                create table if not exists purchases (
+                    id integer primary key autoincrement,
+                    user_id text not null,
+                    amount_cents integer not null default 0,
+                    credits_granted integer not null,
+                    status text,
+                    stripe_session_id text unique
+                );
+                """
+            )
+
+    def set_balance(self, uid: str, credits: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "insert into profiles (user_id, credits) values (?, ?) "
+                "on conflict(user_id) do update set credits = excluded.credits",
+                (uid, credits),
+            )
+
+    def balance(self, uid: str) -> int | None:
+        with self._lock:
+            row = self._conn.execute("select credits from profiles where user_id = ?", (uid,)).fetchone()
+        return row[0] if row else None
+
+    def reserve(self, uid: str, amount: int) -> int | None:
+        with self._lock:
+            row = self._conn.execute(
+                "update profiles set credits = credits - ? where user_id = ? and credits >= ? returning credits",
+                (amount, uid, amount),
+            ).fetchone()
+        return row[0] if row else None
+
+    def refund(self, uid: str, amount: int) -> int | None:
+        with self._lock:
+            row = self._conn.execute(
+                "update profiles set credits = credits + ? where user_id = ? returning credits",
+                (amount, uid),
+            ).fetchone()
+        return row[0] if row else None
+
+    def grant(self, uid: str, amount: int, ref: str, amount_cents: int, status: str) -> int | None:
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("begin immediate")
+            try:
+                cur.execute("insert into profiles (user_id, credits) values (?, 0) on conflict(user_id) do nothing", (uid,))
+                cur.execute(
+                    "insert into purchases (user_id, amount_cents, credits_granted, status, stripe_session_id) "
+                    "values (?, ?, ?, ?, ?) on conflict(stripe_session_id) do nothing",
+                    (uid, amount_cents, amount, status, ref),
+                )
+                if cur.rowcount == 0:
+                    cur.execute("rollback")
+                    return None
+                row = cur.execute(
+                    "update profiles set credits = credits + ? where user_id = ? returning credits",
+                    (amount, uid),
+                ).fetchone()
+                cur.execute("commit")
+                return row[0]
+            except Exception:
+                cur.execute("rollback")
+                raise
+
+
+class CreditLedger:
+    """
+    Reserve / commit / refund credits on top of a backend.
+
+    Usage:
+        reservation = ledger.reserve(uid)
+        if reservation is None:
+            ...  # not enough credits
+        try:
+            do_paid_work()
+        except Exception:
+            ledger.refund(reservation)
+            raise
+        ledger.commit(reservation)
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def reserve(self, uid: str, amount: int = 1) -> Reservation | None:
+        """Atomically take credits; None if the balance is too low."""
+        balance = self.backend.reserve(uid, amount)
+        if balance is None:
+            return None
+        get_profile_cache().update(uid, {"credits": balance})
+        return Reservation(user_id=uid, amount=amount, balance=balance)
+
+    def commit(self, reservation: Reservation) -> None:
+        """Mark a reservation as spent (the credits already left the balance)."""
+        if reservation.state == "reserved":
+            reservation.state = "committed"
+
+    def mark_refunded(self, reservation: Reservation) -> None:
+        """Record that a reservation's credits were already returned elsewhere (e.g. by job recovery)."""
+        if reservation.state == "reserved":
+            reservation.state = "refunded"
+
+    def refund(self, reservation: Reservation) -> None:
+        """Return a reservation's credits. Safe to call more than once."""
+        if reservation.state != "reserved":
+            return
+        try:
+            balance = self.backend.refund(reservation.user_id, reservation.amount)
+            reservation.state = "refunded"
+            if balance is not None:
+                reservation.balance = balance
+                get_profile_cache().update(reservation.user_id, {"credits": balance})
+        except Exception:
+            logger.exception("Failed to refund credits for %s", reservation.user_id)
+
+    def grant(self, uid: str, credits: int, ref: str, amount_cents: int = 0, status: str = "COMPLETED") -> int | None:
+        """
+        Record a purchase and add its credits in one step.
+
+        Returns the new balance, or None if `ref` was already granted.
+        """
+        balance = self.backend.grant(uid, credits, ref, amount_cents, status)
+        if balance is not None:
+            get_profile_cache().update(uid, {"credits": balance})
+        return balance
+
+
+_LEDGER = None
+_LEDGER_LOCK = threading.Lock()
+
+
+def get_credit_ledger() -> CreditLedger:
+    """Get the shared ledger; CREDIT_LEDGER_BACKEND selects supabase or sqlite."""
+    global _LEDGER
+    if _LEDGER is None:
+        with _LEDGER_LOCK:
+            if _LEDGER is None:
+                kind = os.getenv("CREDIT_LEDGER_BACKEND", "supabase").lower()
+                if kind == "sqlite":
+                    backend = SqliteCreditBackend(os.getenv("CREDIT_LEDGER_SQLITE_PATH", ":memory:"))
+                else:
+                    backend = SupabaseCreditBackend()
+                _LEDGER = CreditLedger(backend)
+    return _LEDGER
@@ -0,0 +1,158 @@
+"""
+Preloaded, fully-styled DOCX skeletons for the python-docx export paths.
+
+Each template's base document (margins, fonts, heading and list styles) is
+built once and kept as serialized bytes. Requests open a fresh copy from those
+bytes and only append content, instead of restyling a blank Document().
+"""
+import io
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from docx import Document
+from docx.shared import Pt, Inches
+from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+
+
+TEMPLATE_STYLES = {
+    "classic": {
+        "font_name": "Times New Roman",
+        "body_size": 11,
+        "heading1_size": 18,
+        "heading2_size": 14,
+        "margins": 1.0,  # inches
+        "center_name": True,
+    },
+    "modern": {
+        "font_name": "Calibri",
+        "body_size": 11,
+        "heading1_size": 16,
+        "heading2_size": 12,
+        "margins": 0.75,
+        "center_name": False,
+    },
+    "compact": {
+        "font_name": "Arial",
+        "body_size": 10,
+        "heading1_size": 14,
+        "heading2_size": 11,
+        "margins": 0.5,
+        "center_name": False,
+    },
+}
+
+# Plain export used by /api/export/resume-docx (default margins, Calibri 11)
+BASIC_SKELETON = "basic"
+
+_SKELETONS: dict = {}
+_LOCK = threading.Lock()
+_REFERENCE_DIR = Path(tempfile.gettempdir()) / "resume-reference-docx"
+
+
+def get_template_style(template_id: str) -> dict:
+    """Return the styling table for a template (compact is the catch-all)."""
+    return TEMPLATE_STYLES.get(template_id, TEMPLATE_STYLES["compact"])
+
+
+def _build_basic() -> Document:
+    doc = Document()
+    style = doc.styles["Normal"]
+    style.font.name = "Calibri"
+    style.font.size = Pt(11)
+    return doc
+
+
+def _build_styled(template_id: str) -> Document:
+    s = get_template_style(template_id)
+    font_name = s["font_name"]
+    doc = Document()
+
+    # Set margins
+    for section in doc.sections:
+        section.top_margin = Inches(s["margins"])
+        section.bottom_margin = Inches(s["margins"])
+        section.left_margin = Inches(s["margins"])
+        section.right_margin = Inches(s["margins"])
+
+    # Configure Normal style
+    normal_style = doc.styles["Normal"]
+    normal_style.font.name = font_name
+    normal_style.font.size = Pt(s["body_size"])
+
+    # Configure Heading 1
+    h1_style = doc.styles["Heading 1"]
+    h1_style.font.name = font_name
+    h1_style.font.size = Pt(s["heading1_size"])
+    h1_style.font.bold = True
+    if template_id == "classic":
+        h1_style.paragraph_format.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+
+    # Configure Heading 2
+    h2_style = doc.styles["Heading 2"]
+    h2_style.font.name = font_name
+    h2_style.font.size = Pt(s["heading2_size"])
+    h2_style.font.bold = True
+    if template_id == "compact":
+        h2_style.font.all_caps = True
+
+    # Configure List Bullet style
+    try:
+        list_style = doc.styles["List Bullet"]
+        list_style.font.name = font_name
+        list_style.font.size = Pt(s["body_size"])
+    except KeyError:
+        pass
+
+    return doc
+
+
+def _serialize(doc: Document) -> bytes:
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def get_skeleton_bytes(key: str) -> bytes:
+    """
+    Get the serialized skeleton for a template id (or BASIC_SKELETON).
+
+    Built on first use and cached for the life of the process.
+    """
+    data = _SKELETONS.get(key)
+    if data is None:
+        with _LOCK:
+            data = _SKELETONS.get(key)
+            if data is None:
+                doc = _build_basic() if key == BASIC_SKELETON else _build_styled(key)
+                data = _serialize(doc)
+                _SKELETONS[key] = data
+    return data
+
+
+def new_document(key: str) -> Document:
+    """Open a fresh, already-styled Document copied from the cached skeleton."""
+    return Document(io.BytesIO(get_skeleton_bytes(key)))
+
+
+def reference_docx_path(template_id: str) -> Path:
+    """
+    Path to a generated reference DOCX for pandoc, written once per process
+    to a temp directory (never into the source tree).
+    """
+    path = _REFERENCE_DIR / f"{template_id}.docx"
+    if not path.exists():
+        _REFERENCE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(get_skeleton_bytes(template_id))
+        os.replace(tmp, path)
+    return path
+
+
+def warm_skeletons() -> None:
+    """Build every skeleton up front so the first export pays nothing."""
+    get_skeleton_bytes(BASIC_SKELETON)
+    for template_id in TEMPLATE_STYLES:
+        get_skeleton_bytes(template_id)
+
@@ -0,0 +1,108 @@
+"""
+Multi-template export bundle, rendered concurrently and streamed as a zip.
+
+All requested templates are submitted to a shared thread pool at once; each
+finished render is written to the zip stream as soon as it completes, so the
+last byte arrives roughly when the slowest render finishes.
+"""
+import io
+import os
+import zipfile
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from app.services.export_cache import export_key, get_export_cache
+from app.services.pdf_renderer import generate_pdf
+from app.services.resume_converter import generate_styled_docx, styled_renderer
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_FORMATS = ("docx", "pdf")
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("EXPORT_BUNDLE_WORKERS", "3")),
+                    thread_name_prefix="export-bundle",
+                )
+    return _EXECUTOR
+
+
+class _ChunkStream(io.RawIOBase):
+    """Write-only, unseekable sink that hands written bytes back in chunks."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _render_one(resume: dict, template_id: str, fmt: str) -> bytes:
+    cache = get_export_cache()
+    if fmt == "pdf":
+        key = export_key(resume, template_id, "pymupdf")
+        return cache.get_or_render(key, lambda: generate_pdf(resume, template_id))
+    key = export_key(resume, template_id, styled_renderer())
+    return cache.get_or_render(key, lambda: generate_styled_docx(resume, template_id))
+
+
+def stream_bundle(resume: dict, template_ids: list, fmt: str = "docx"):
+    """
+    Render every template concurrently and yield a zip archive in chunks.
+
+    Entries are written in completion order. A template that fails to render
+    is recorded as a short "<template>.error.txt" entry instead of aborting
+    the stream.
+
+    Args:
+        resume: The resume dictionary from frontend
+        template_ids: Template IDs to include
+        fmt: "docx" or "pdf"
+
+    Yields:
+        Zip archive bytes
+    """
+    executor = _get_executor()
+    futures = {
+        executor.submit(_render_one, resume, template_id, fmt): template_id
+        for template_id in template_ids
+    }
+
+    sink = _ChunkStream()
+    try:
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for fut in as_completed(futures):
+                template_id = futures[fut]
+                try:
+                    data = fut.result()
+                    zf.writestr(f"resume_{template_id}.{fmt}", data)
+                except Exception as e:
+                    logger.warning("bundle render failed for %s: %s", template_id, e)
+                    zf.writestr(f"resume_{template_id}.error.txt", f"Export failed: {e}\n")
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+    finally:
+        for fut in futures:
+            fut.cancel()
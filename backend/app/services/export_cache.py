@@ -0,0 +1,178 @@
+"""
+Content-addressed cache for rendered resume exports.
+
+Exports are keyed by a hash of the canonicalized resume JSON, the template id
+and the renderer version, so the key doubles as a strong ETag. Rendered bytes
+live in a bounded in-memory LRU backed by an optional on-disk cache.
+"""
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import logging
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Bump when a renderer's output changes so stale cached files are not served.
+RENDERER_VERSIONS = {
+    "python-docx": "docx-1",
+    "pandoc": "pandoc-1",
+    "styled-fallback": "docx-styled-1",
+    "pymupdf": "pdf-story-1",
+}
+
+
+def canonical_json(data) -> str:
+    """Stable JSON serialization (sorted keys, no whitespace)."""
+    return json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def export_key(resume: dict, template_id: str, renderer: str) -> str:
+    """
+    Compute the content hash for an export.
+
+    Args:
+        resume: The resume dictionary from frontend
+        template_id: The template ID (or a fixed label for untemplated exports)
+        renderer: Renderer name from RENDERER_VERSIONS
+
+    Returns:
+        Hex digest usable as cache key and ETag
+    """
+    h = hashlib.sha256()
+    h.update(RENDERER_VERSIONS.get(renderer, renderer).encode("utf-8"))
+    h.update(b"\0")
+    h.update((template_id or "").encode("utf-8"))
+    h.update(b"\0")
+    h.update(canonical_json(resume).encode("utf-8"))
+    return h.hexdigest()
+
+
+class ExportCache:
+    """
+    Two-tier (memory LRU + disk) cache of export bytes keyed by content hash.
+
+    Args:
+        max_items: Maximum number of entries kept in memory
+        max_bytes: Maximum total size of entries kept in memory
+        disk_dir: Directory for the disk tier, or None to disable it
+        disk_max_files: Maximum number of files kept on disk
+    """
+
+    def __init__(self, max_items: int = 128, max_bytes: int = 64 * 1024 * 1024,
+                 disk_dir: str | None = None, disk_max_files: int = 1000):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_files = disk_max_files
+        self._mem: OrderedDict = OrderedDict()
+        self._mem_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.bin"
+
+    def _remember(self, key: str, data: bytes) -> None:
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._mem_bytes -= len(old)
+            self._mem[key] = data
+            self._mem_bytes += len(data)
+            while self._mem and (len(self._mem) > self.max_items or self._mem_bytes > self.max_bytes):
+                _, evicted = self._mem.popitem(last=False)
+                self._mem_bytes -= len(evicted)
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            data = self._mem.get(key)
+            if data is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return data
+
+        if self.disk_dir is not None:
+            path = self._disk_path(key)
+            try:
+                data = path.read_bytes()
+            except OSError:
+                data = None
+            if data is not None:
+                self._remember(key, data)
+                with self._lock:
+                    self.hits += 1
+                return data
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes) -> None:
+        self._remember(key, data)
+        if self.disk_dir is None:
+            return
+        try:
+            path = self._disk_path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            self._prune_disk()
+        except OSError:
+            logger.warning("export cache disk write failed", exc_info=True)
+
+    def _prune_disk(self) -> None:
+        files = list(self.disk_dir.glob("*/*.bin"))
+        if len(files) <= self.disk_max_files:
+            return
+        files.sort(key=lambda p: p.stat().st_mtime)
+        for p in files[: len(files) - self.disk_max_files]:
+            try:
+                p.unlink()
+            except OSError:
+                pass
+
+    def get_or_render(self, key: str, render) -> bytes:
+        """Return cached bytes for key, calling render() and caching on a miss."""
+        data = self.get(key)
+        if data is None:
+            data = render()
+            self.put(key, data)
+        return data
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "items": len(self._mem),
+                "bytes": self._mem_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_export_cache() -> ExportCache:
+    """Get the shared export cache (created once per process)."""
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                disk_dir = os.getenv(
+                    "EXPORT_CACHE_DIR",
+                    str(Path(tempfile.gettempdir()) / "resume-export-cache"),
+                )
+                _CACHE = ExportCache(
+                    max_items=int(os.getenv("EXPORT_CACHE_MAX_ITEMS", "128")),
+                    max_bytes=int(os.getenv("EXPORT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+                    disk_dir=disk_dir or None,
+                    disk_max_files=int(os.getenv("EXPORT_CACHE_DISK_MAX_FILES", "1000")),
+                )
+    return _CACHE
@@ -0,0 +1,176 @@
+"""
+LLM result cache for /api/smart/suggest and /api/smart/enrich.
+
+Exact tier: results are keyed by a hash of the canonical prompt inputs (kind,
+model, resume text, job text, skill lists, ...), so re-running the same resume
+against the same job returns the stored result without calling OpenAI.
+
+Semantic tier (optional): per user, the normalized embeddings of the resume
+and the job text are kept next to each entry. A lookup that misses the exact
+key reuses an entry of the same scope for the same user when both the resume
+and the job are within LLM_CACHE_SEMANTIC_THRESHOLD cosine similarity (e.g. a
+typo fix or a reordered bullet). The scope (semantic_scope) pins the inputs
+that must match exactly, such as the skill gaps for /enrich: adding a missing
+skill barely moves the resume embedding but must not return advice to add
+it. Set the threshold to 0 to disable the tier.
+
+Entries expire after LLM_CACHE_TTL seconds and the cache is LRU-bounded by
+LLM_CACHE_SIZE.
+"""
+import os
+import time
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+from app.utils.embeddings import get_embedder
+from app.services.export_cache import canonical_json
+
+logger = logging.getLogger(__name__)
+
+_EMBED_CHARS = 4000
+
+
+def llm_cache_key(kind: str, model: str, **inputs) -> str:
+    """Hash of the canonical prompt inputs for one kind of LLM call."""
+    payload = canonical_json({"kind": kind, "model": model, "inputs": inputs})
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def semantic_scope(kind: str, model: str, **pinned) -> str:
+    """
+    Scope for semantic matches: kind, model and a hash of the inputs that
+    must be identical for a near-duplicate resume/job to reuse an entry.
+    """
+    digest = hashlib.sha256(canonical_json(pinned).encode("utf-8")).hexdigest()[:16] if pinned else ""
+    return f"{kind}:{model}:{digest}"
+
+
+def _embed_pair(resume_text: str, job_text: str) -> np.ndarray:
+    vecs = get_embedder().encode(
+        [resume_text[:_EMBED_CHARS], job_text[:_EMBED_CHARS]], normalize_embeddings=True
+    )
+    return np.asarray(vecs, dtype=np.float32)
+
+
+class LLMResultCache:
+    """
+    Args:
+        ttl: Seconds an entry stays valid
+        max_entries: LRU bound on stored results
+        semantic_threshold: Min cosine similarity (resume and job) for the
+            semantic tier; 0 disables it
+        embed: Callable(resume_text, job_text) -> (2, dim) normalized vectors
+    """
+
+    def __init__(self, ttl: float = 3600.0, max_entries: int = 1000,
+                 semantic_threshold: float = 0.97, embed=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.semantic_threshold = semantic_threshold
+        self.embed = embed or _embed_pair
+        # key -> (value, expires_at, uid, scope, vectors)
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _vectors(self, resume_text: str, job_text: str):
+        if self.semantic_threshold <= 0:
+            return None
+        try:
+            return self.embed(resume_text, job_text)
+        except Exception as e:
+            logger.warning("llm cache embedding failed: %s", e)
+            return None
+
+    def _semantic_match(self, uid: str, scope: str, vectors, now: float):
+        best_key, best_score = None, self.semantic_threshold
+        for key, (_, expires_at, owner, entry_scope, entry_vecs) in self._entries.items():
+            if owner != uid or entry_scope != scope or entry_vecs is None or expires_at <= now:
+                continue
+            # Both the resume and the job must be near-identical
+            score = float(np.min(np.sum(entry_vecs * vectors, axis=1)))
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def get(self, key: str, uid: str | None = None, scope: str = "",
+            resume_text: str = "", job_text: str = ""):
+        """
+        Cached result for `key`, falling back to the semantic tier.
+
+        Args:
+            key: llm_cache_key(...) of the request
+            uid: User id (semantic matches never cross users)
+            scope: semantic_scope(...); semantic matches never cross scopes
+            resume_text / job_text: Texts compared by the semantic tier
+
+        Returns:
+            (value, vectors). value is None on a miss; pass vectors to put()
+            so the new entry can be matched semantically without re-embedding.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.exact_hits += 1
+                    return entry[0], entry[4]
+                del self._entries[key]
+
+        vectors = self._vectors(resume_text, job_text) if uid and (resume_text or job_text) else None
+        if vectors is not None:
+            with self._lock:
+                match = self._semantic_match(uid, scope, vectors, now)
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self.semantic_hits += 1
+                    return self._entries[match][0], vectors
+
+        with self._lock:
+            self.misses += 1
+        return None, vectors
+
+    def put(self, key: str, value, uid: str | None = None, scope: str = "", vectors=None) -> None:
+        if value is None:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl, uid, scope, vectors)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.exact_hits + self.semantic_hits) / total, 4) if total else 0.0,
+            }
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_llm_cache() -> LLMResultCache:
+    """Get the shared LLM result cache (created once per process)."""
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = LLMResultCache(
+                    ttl=float(os.getenv("LLM_CACHE_TTL", "3600")),
+                    max_entries=int(os.getenv("LLM_CACHE_SIZE", "1000")),
+                    semantic_threshold=float(os.getenv("LLM_CACHE_SEMANTIC_THRESHOLD", "0.97")),
+                )
+    return _CACHE
@@ -0,0 +1,297 @@
+"""
+LLM gateway.
+
+All OpenAI calls run as tasks on one asyncio loop in a background thread
+(AsyncOpenAI). The request thread still blocks in run()/stream() until its
+call ends; what the gateway adds is shared limits, deadlines and cancellation
+across every call of the process. Each call:
+
+    - waits for a global slot (LLM_MAX_CONCURRENCY) and a per-user slot
+      (LLM_PER_USER_CONCURRENCY); if none frees up within LLM_QUEUE_TIMEOUT
+      the call fails fast with LLMBusyError
+    - runs under a deadline (LLM_TIMEOUT seconds, LLMTimeoutError)
+    - is cancelled (HTTP request aborted) if the waiting client disconnects
+
+Set OPENAI_BASE_URL to point the client at a local fake OpenAI server
+(tests/test_llm_gateway.py does).
+"""
+import os
+import time
+import socket
+import queue
+import asyncio
+import threading
+import concurrent.futures
+import logging
+from collections import deque
+
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+_POLL_SECONDS = 0.25
+
+
+class LLMError(Exception):
+    """Base class for gateway failures."""
+    pass
+
+
+class LLMBusyError(LLMError):
+    """No concurrency slot became free within the queue timeout."""
+    pass
+
+
+class LLMTimeoutError(LLMError):
+    """The call did not finish before its deadline."""
+    pass
+
+
+class LLMCancelledError(LLMError):
+    """The caller went away and the call was cancelled."""
+    pass
+
+
+def client_disconnected(environ) -> bool:
+    """
+    True if the HTTP client behind a WSGI request has closed its connection.
+
+    Uses the raw socket gunicorn exposes in the environ; other servers are
+    treated as always connected.
+    """
+    sock = environ.get("gunicorn.socket") if environ else None
+    if sock is None:
+        return False
+    try:
+        return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b""
+    except (BlockingIOError, InterruptedError):
+        return False
+    except OSError:
+        return True
+
+
+class LLMGateway:
+    """
+    Args:
+        client: AsyncOpenAI client
+        max_concurrency: Calls in flight across all users
+        per_user_concurrency: Calls in flight per user
+        timeout: Default deadline in seconds for one call
+        queue_timeout: Max seconds to wait for a concurrency slot
+    """
+
+    def __init__(self, client: AsyncOpenAI, max_concurrency: int = 4, per_user_concurrency: int = 2,
+                 timeout: float = 45.0, queue_timeout: float = 10.0):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.per_user_concurrency = per_user_concurrency
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-gateway", daemon=True)
+        self._thread.start()
+        self._global = None
+        self._users: dict = {}  # uid -> [semaphore, holders]
+        asyncio.run_coroutine_threadsafe(self._init_semaphores(), self._loop).result()
+
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=200)
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.cancelled = 0
+
+    async def _init_semaphores(self):
+        self._global = asyncio.Semaphore(self.max_concurrency)
+
+    def _user_slot(self, uid: str) -> asyncio.Semaphore:
+        entry = self._users.get(uid)
+        if entry is None:
+            entry = self._users[uid] = [asyncio.Semaphore(self.per_user_concurrency), 0]
+        entry[1] += 1
+        return entry[0]
+
+    def _release_user(self, uid: str) -> None:
+        entry = self._users.get(uid)
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self._users[uid]
+
+    def _count(self, name: str, delta: int = 1) -> None:
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + delta)
+
+    async def _guarded(self, uid: str, factory, deadline: float):
+        key = uid or "anonymous"
+        user_sem = self._user_slot(key)
+        self._count("waiting")
+        queued = True
+        try:
+            try:
+                await asyncio.wait_for(user_sem.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise LLMBusyError("per_user_limit")
+            try:
+                try:
+                    await asyncio.wait_for(self._global.acquire(), self.queue_timeout)
+                except asyncio.TimeoutError:
+                    raise LLMBusyError("global_limit")
+                self._count("waiting", -1)
+                queued = False
+                self._count("in_flight")
+                try:
+                    remaining = max(0.01, deadline - time.monotonic())
+                    return await asyncio.wait_for(factory(), remaining)
+                except asyncio.TimeoutError:
+                    raise LLMTimeoutError("deadline_exceeded")
+                finally:
+                    self._count("in_flight", -1)
+                    self._global.release()
+            finally:
+                user_sem.release()
+        finally:
+            if queued:
+                self._count("waiting", -1)
+            self._release_user(key)
+
+    def run(self, uid: str, factory, timeout: float | None = None, disconnected=None):
+        """
+        Run `factory()` (a coroutine factory) on the gateway loop and wait for it.
+
+        Args:
+            uid: User the call is made for (per-user limit key)
+            factory: Zero-arg callable returning the coroutine to run
+            timeout: Deadline in seconds (defaults to the gateway timeout)
+            disconnected: Optional zero-arg callable; when it returns True the
+                call is cancelled
+
+        Returns:
+            Whatever the coroutine returns
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        future = asyncio.run_coroutine_threadsafe(self._guarded(uid, factory, deadline), self._loop)
+        while not future.done():
+            concurrent.futures.wait([future], timeout=_POLL_SECONDS)
+            if future.done():
+                break
+            if disconnected is not None and disconnected():
+                future.cancel()
+                self._count("cancelled")
+                raise LLMCancelledError("client_disconnected")
+
+        return self._result(future, started)
+
+    def _result(self, future, started: float):
+        try:
+            result = future.result()
+        except LLMBusyError:
+            self._count("rejected")
+            raise
+        except LLMTimeoutError:
+            self._count("timeouts")
+            raise
+        except concurrent.futures.CancelledError:
+            self._count("cancelled")
+            raise LLMCancelledError("cancelled")
+        except Exception:
+            self._count("failed")
+            raise
+
+        with self._stats_lock:
+            self.completed += 1
+            self._latencies.append(time.monotonic() - started)
+        return result
+
+    def stream(self, uid: str, factory, timeout: float | None = None, disconnected=None):
+        """
+        Like run(), but `factory()` returns an async iterable (e.g. an OpenAI
+        stream); its items are yielded to the calling thread as they arrive.
+
+        Closing the generator early (client went away) cancels the call.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        items: queue.Queue = queue.Queue()
+        done = object()
+
+        async def pump():
+            source = await factory()
+            try:
+                async for item in source:
+                    items.put(item)
+            finally:
+                close = getattr(source, "close", None)
+                if close is not None:
+                    await close()
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._guarded(uid, pump, started + timeout), self._loop
+        )
+        future.add_done_callback(lambda _: items.put(done))
+        try:
+            while True:
+                try:
+                    item = items.get(timeout=_POLL_SECONDS)
+                except queue.Empty:
+                    if disconnected is not None and disconnected():
+                        future.cancel()
+                        self._count("cancelled")
+                        raise LLMCancelledError("client_disconnected")
+                    continue
+                if item is done:
+                    break
+                yield item
+            self._result(future, started)
+        finally:
+            if not future.done():
+                future.cancel()
+                self._count("cancelled")
+
+    def responses(self, uid: str, timeout: float | None = None, disconnected=None, **kwargs):
+        """client.responses.create(**kwargs) through the gateway."""
+        return self.run(uid, lambda: self.client.responses.create(**kwargs), timeout, disconnected)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            lat = sorted(self._latencies)
+            return {
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "cancelled": self.cancelled,
+                "latency_avg_s": round(sum(lat) / len(lat), 3) if lat else None,
+                "latency_p95_s": round(lat[min(len(lat) - 1, int(len(lat) * 0.95))], 3) if lat else None,
+            }
+
+
+_GATEWAY = None
+_GATEWAY_LOCK = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway | None:
+    """Shared gateway, or None when OPENAI_API_KEY is not set."""
+    global _GATEWAY
+    if _GATEWAY is None:
+        if not os.getenv("OPENAI_API_KEY"):
+            return None
+        with _GATEWAY_LOCK:
+            if _GATEWAY is None:
+                timeout = float(os.getenv("LLM_TIMEOUT", "45"))
+                _GATEWAY = LLMGateway(
+                    AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=timeout, max_retries=1),
+                    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+                    per_user_concurrency=int(os.getenv("LLM_PER_USER_CONCURRENCY", "2")),
+                    timeout=timeout,
+                    queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "10")),
+                )
+    return _GATEWAY
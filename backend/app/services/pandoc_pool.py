@@ -0,0 +1,140 @@
+"""
+Bounded Pandoc conversion pool for styled resume export.
+
+Pandoc is invoked directly with the markdown on stdin and the DOCX written to
+stdout, so no temp files touch the disk. A semaphore caps how many pandoc
+processes run at once and every job has a hard timeout.
+"""
+import os
+import shutil
+import subprocess
+import threading
+import logging
+
+try:
+    import pypandoc
+except ImportError:
+    pypandoc = None
+
+logger = logging.getLogger(__name__)
+
+
+class PandocBusyError(Exception):
+    """Raised when no conversion slot frees up within the queue timeout."""
+    pass
+
+
+class PandocTimeoutError(Exception):
+    """Raised when a single pandoc job exceeds its timeout."""
+    pass
+
+
+class PandocConversionError(Exception):
+    """Raised when pandoc exits with a non-zero status."""
+    pass
+
+
+def _find_pandoc() -> str | None:
+    """Locate the pandoc binary, preferring the one pypandoc knows about."""
+    if pypandoc is not None:
+        try:
+            return pypandoc.get_pandoc_path()
+        except OSError:
+            pass
+    return shutil.which("pandoc")
+
+
+class PandocPool:
+    """
+    Runs pandoc conversions with a concurrency limit and per-job timeout.
+
+    Args:
+        max_workers: Maximum number of pandoc processes running at once
+        job_timeout: Seconds a single conversion may run before it is killed
+        queue_timeout: Seconds a caller waits for a free slot before giving up
+    """
+
+    def __init__(self, max_workers: int = 2, job_timeout: float = 20.0, queue_timeout: float = 10.0):
+        self.max_workers = max(1, int(max_workers))
+        self.job_timeout = job_timeout
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+        self._pandoc_path = None
+        self._path_lock = threading.Lock()
+
+    @property
+    def pandoc_path(self) -> str | None:
+        if self._pandoc_path is None:
+            with self._path_lock:
+                if self._pandoc_path is None:
+                    self._pandoc_path = _find_pandoc() or ""
+        return self._pandoc_path or None
+
+    def available(self) -> bool:
+        return self.pandoc_path is not None
+
+    def convert(self, markdown: str, reference_path, fmt_from: str = "markdown", fmt_to: str = "docx") -> bytes:
+        """
+        Convert markdown to DOCX bytes using a pooled pandoc slot.
+
+        Args:
+            markdown: Markdown source
+            reference_path: Path to the reference DOCX for styling
+            fmt_from: Pandoc input format
+            fmt_to: Pandoc output format
+
+        Returns:
+            Converted document as bytes
+        """
+        pandoc = self.pandoc_path
+        if pandoc is None:
+            raise FileNotFoundError("pandoc binary not found")
+
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise PandocBusyError("All pandoc workers are busy")
+
+        try:
+            args = [
+                pandoc,
+                "-f", fmt_from,
+                "-t", fmt_to,
+                f"--reference-doc={reference_path}",
+                "-o", "-",
+            ]
+            try:
+                proc = subprocess.run(
+                    args,
+                    input=markdown.encode("utf-8"),
+                    capture_output=True,
+                    timeout=self.job_timeout,
+                    check=False,
+                )
+            except subprocess.TimeoutExpired:
+                logger.warning("pandoc job exceeded %.1fs timeout", self.job_timeout)
+                raise PandocTimeoutError(f"Pandoc timed out after {self.job_timeout}s")
+
+            if proc.returncode != 0:
+                err = proc.stderr.decode("utf-8", errors="ignore").strip()
+                raise PandocConversionError(f"Pandoc failed ({proc.returncode}): {err[:500]}")
+
+            return proc.stdout
+        finally:
+            self._slots.release()
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pandoc_pool() -> PandocPool:
+    """Get the shared pandoc pool (created once per process)."""
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = PandocPool(
+                    max_workers=int(os.getenv("PANDOC_MAX_WORKERS", "2")),
+                    job_timeout=float(os.getenv("PANDOC_JOB_TIMEOUT", "20")),
+                    queue_timeout=float(os.getenv("PANDOC_QUEUE_TIMEOUT", "10")),
+                )
+    return _POOL
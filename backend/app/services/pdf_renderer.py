@@ -0,0 +1,117 @@
+"""
+In-process PDF export using PyMuPDF's Story (HTML/CSS layout) API.
+
+Each template's HTML (a compiled Jinja2 template) and CSS are built once and
+reused; rendering a resume is a single Story layout pass with no subprocess.
+"""
+import io
+from functools import lru_cache
+
+import pymupdf
+from jinja2 import Environment, select_autoescape
+
+from app.services.docx_skeletons import TEMPLATE_STYLES, get_template_style
+
+PAGE_SIZE = "letter"
+
+# Story only ships the Base-14 fonts; map template fonts onto those families.
+_FONT_FAMILIES = {
+    "Times New Roman": "serif",
+    "Calibri": "sans-serif",
+    "Arial": "sans-serif",
+}
+
+_HTML_TEMPLATE = """
+<div class="header">
+  <p class="name">{{ name }}</p>
+  {% if title %}<p class="title">{{ title }}</p>{% endif %}
+  {% if contact %}<p class="contact">{{ contact | join(' | ') }}</p>{% endif %}
+</div>
+{% for section in sections %}
+{% set items = section.get('items') or [] %}
+{% if section.get('title') and items %}
+<h2>{{ section.title | upper if upper_headings else section.title }}</h2>
+{% if section.get('id') == 'professional-summary' %}
+<p>{{ items | selectattr('text') | map(attribute='text') | join(' ') }}</p>
+{% else %}
+<ul>
+{% for item in items %}{% if item.get('text') %}<li>{{ item.text }}</li>{% endif %}{% endfor %}
+</ul>
+{% endif %}
+{% endif %}
+{% endfor %}
+"""
+
+_env = Environment(autoescape=select_autoescape(default=True), trim_blocks=True, lstrip_blocks=True)
+
+
+@lru_cache(maxsize=1)
+def _html_template():
+    return _env.from_string(_HTML_TEMPLATE)
+
+
+@lru_cache(maxsize=None)
+def _template_css(template_id: str) -> str:
+    s = get_template_style(template_id)
+    family = _FONT_FAMILIES.get(s["font_name"], "sans-serif")
+    align = "center" if s["center_name"] else "left"
+    return f"""
+* {{ font-family: {family}; }}
+body {{ font-size: {s["body_size"]}pt; }}
+p {{ margin: 0 0 4pt 0; }}
+.header {{ text-align: {align}; margin-bottom: 8pt; }}
+.name {{ font-size: {s["heading1_size"]}pt; font-weight: bold; margin: 0; }}
+.title {{ margin: 0; }}
+.contact {{ margin: 2pt 0 0 0; }}
+h2 {{ font-size: {s["heading2_size"]}pt; font-weight: bold; margin: 8pt 0 3pt 0; }}
+ul {{ margin: 0 0 0 14pt; padding: 0; }}
+li {{ margin: 0 0 2pt 0; }}
+"""
+
+
+def resume_to_html(resume_data: dict, template_id: str) -> str:
+    """Render resume JSON to the HTML fed to the Story layout."""
+    return _html_template().render(
+        upper_headings=template_id == "compact",
+        name=resume_data.get("name") or "Your Name",
+        title=resume_data.get("title", ""),
+        contact=resume_data.get("contact") or [],
+        sections=resume_data.get("sections") or [],
+    )
+
+
+def generate_pdf(resume_data: dict, template_id: str) -> bytes:
+    """
+    Generate a styled PDF from resume data.
+
+    Args:
+        resume_data: The resume dictionary from frontend
+        template_id: The template ID to use
+
+    Returns:
+        PDF file as bytes
+    """
+    style = get_template_style(template_id)
+    margin = style["margins"] * 72  # inches -> points
+
+    story = pymupdf.Story(html=resume_to_html(resume_data, template_id), user_css=_template_css(template_id))
+    mediabox = pymupdf.paper_rect(PAGE_SIZE)
+    where = mediabox + (margin, margin, -margin, -margin)
+
+    buf = io.BytesIO()
+    writer = pymupdf.DocumentWriter(buf)
+    more = 1
+    while more:
+        device = writer.begin_page(mediabox)
+        more, _ = story.place(where)
+        story.draw(device)
+        writer.end_page()
+    writer.close()
+    return buf.getvalue()
+
+
+def warm_pdf_templates() -> None:
+    """Compile the HTML template and every template's CSS up front."""
+    _html_template()
+    for template_id in TEMPLATE_STYLES:
+        _template_css(template_id)
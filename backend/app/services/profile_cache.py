@@ -0,0 +1,121 @@
+"""
+Short-TTL per-user cache of `profiles` rows.
+
+Reads (/api/me, subscription lookups) go through get_profile(); every write
+path updates the cached row right after the database write (write-through), so
+the cache never serves a value older than what this process last wrote.
+Entries expire after PROFILE_CACHE_TTL seconds to pick up writes made by other
+processes.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from app.utils.supabase_client import get_supabase
+
+PROFILE_COLUMNS = (
+    "user_id, email, credits, avatar_url, "
+    "subscription_id, subscription_status, subscription_period_end"
+)
+
+
+class ProfileCache:
+    """
+    Args:
+        ttl: Seconds an entry is served before it is re-read
+        max_entries: LRU bound on the number of cached users
+        loader: Callable(uid) -> row dict or None (defaults to Supabase)
+    """
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 5000, loader=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.loader = loader or _load_profile
+        self._rows: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def get(self, uid: str) -> dict | None:
+        """Cached profile row for uid (a copy), loading it on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._rows.get(uid)
+            if entry is not None and entry[1] > now:
+                self._rows.move_to_end(uid)
+                self.hits += 1
+                return dict(entry[0])
+            self.misses += 1
+
+        row = self.loader(uid)
+        if row is not None:
+            self._store(uid, row)
+            return dict(row)
+        return None
+
+    def _store(self, uid: str, row: dict) -> None:
+        with self._lock:
+            self._rows[uid] = (dict(row), time.monotonic() + self.ttl)
+            self._rows.move_to_end(uid)
+            while len(self._rows) > self.max_entries:
+                self._rows.popitem(last=False)
+
+    def update(self, uid: str, fields: dict) -> None:
+        """Write-through: merge freshly written fields into the cached row."""
+        with self._lock:
+            self.writes += 1
+            entry = self._rows.get(uid)
+            if entry is None:
+                return
+            row = dict(entry[0])
+            row.update(fields)
+            self._rows[uid] = (row, time.monotonic() + self.ttl)
+
+    def put(self, uid: str, row: dict) -> None:
+        """Write-through for a full row (e.g. just created)."""
+        with self._lock:
+            self.writes += 1
+        self._store(uid, row)
+
+    def invalidate(self, uid: str) -> None:
+        with self._lock:
+            self._rows.pop(uid, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._rows),
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+def _load_profile(uid: str) -> dict | None:
+    supabase = get_supabase()
+    if not supabase:
+        return None
+    res = supabase.table("profiles").select(PROFILE_COLUMNS).eq("user_id", uid).limit(1).execute()
+    raw = res.get("data") if isinstance(res, dict) else getattr(res, "data", None)
+    return raw[0] if isinstance(raw, list) and raw else None
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_profile_cache() -> ProfileCache:
+    """Get the shared profile cache (created once per process)."""
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = ProfileCache(
+                    ttl=float(os.getenv("PROFILE_CACHE_TTL", "30")),
+                    max_entries=int(os.getenv("PROFILE_CACHE_SIZE", "5000")),
+                )
+    return _CACHE
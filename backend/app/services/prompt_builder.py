@@ -0,0 +1,172 @@
+"""
+Token-budgeted prompt context for the LLM endpoints.
+
+Instead of slicing the first N characters of the resume and job description,
+resume sentences and JD paragraphs are ranked by embedding relevance and the
+best ones are packed into a token budget, then emitted in their original order
+so the excerpt still reads naturally.
+
+    - resume sentences are scored against the job description (and the
+      missing / critical skills, when known)
+    - JD paragraphs are scored against the resume and those skills
+
+Sentence vectors come from encode_cached(), a per-process LRU, so repeated
+prompts for the same resume (retries, /suggest after /enrich) do not encode
+the same sentences again. They are not shared with /analyze: the advisor
+segments the resume differently, and with ANALYSIS_WORKERS > 0 it runs in
+spawned processes with caches of their own. Token counts are estimated at
+~4 characters per token.
+"""
+import os
+import re
+import json
+
+import numpy as np
+
+from app.utils.embeddings import encode_cached
+from app.utils.text_norm import normalize
+
+RESUME_TOKEN_BUDGET = int(os.getenv("LLM_PROMPT_RESUME_TOKENS", "900"))
+JOB_TOKEN_BUDGET = int(os.getenv("LLM_PROMPT_JOB_TOKENS", "700"))
+
+_CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text or "") + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+
+def resume_sentences(resume_text: str) -> list:
+    """
+    Split raw resume text into (original, normalized) sentences.
+
+    Splitting happens before normalize() so line breaks still separate
+    bullets; normalize() would otherwise fold them into spaces.
+    """
+    out = []
+    for s in re.split(r"[.\n\r;]+", resume_text or ""):
+        s = s.strip()
+        n = normalize(s)
+        if len(n) > 8:
+            out.append((s, n))
+    return out
+
+
+def _job_paragraphs(job_text: str) -> list:
+    parts = [p.strip() for p in re.split(r"\n\s*\n|\n(?=\s*[-•*]\s)", job_text or "")]
+    out = []
+    for p in parts:
+        n = normalize(p)
+        if len(n) > 8:
+            out.append((p, n))
+    return out
+
+
+def _query_vectors(texts: list) -> np.ndarray | None:
+    texts = [t for t in texts if t]
+    if not texts:
+        return None
+    return encode_cached(texts)
+
+
+def _score(unit_vecs: np.ndarray, queries: np.ndarray | None) -> np.ndarray:
+    if queries is None or not len(unit_vecs):
+        return np.zeros(len(unit_vecs))
+    # Best match against any query (the whole text or a single skill)
+    return (unit_vecs @ queries.T).max(axis=1)
+
+
+def pack(units: list, scores, budget: int, keep_first: bool = False) -> str:
+    """
+    Pick the highest-scoring units that fit in `budget` tokens.
+
+    Args:
+        units: Original texts, in document order
+        scores: Relevance per unit
+        budget: Token budget for the joined result
+        keep_first: Always include the first unit (e.g. name / headline)
+
+    Returns:
+        Chosen units joined by newlines, in document order
+    """
+    order = sorted(range(len(units)), key=lambda i: -float(scores[i]))
+    if keep_first and units:
+        order = [0] + [i for i in order if i != 0]
+    chosen, used = set(), 0
+    for i in order:
+        cost = estimate_tokens(units[i]) + 1
+        if used + cost > budget:
+            continue
+        chosen.add(i)
+        used += cost
+    return "\n".join(units[i] for i in sorted(chosen))
+
+
+def relevant_resume_text(resume_text: str, job_text: str, skills=None,
+                         budget: int = RESUME_TOKEN_BUDGET) -> str:
+    """Resume sentences most relevant to the job (and skills) within `budget` tokens."""
+    if estimate_tokens(resume_text) <= budget:
+        return resume_text
+    sentences = resume_sentences(resume_text)
+    if not sentences:
+        return resume_text[:budget * _CHARS_PER_TOKEN]
+    vecs = encode_cached([n for _, n in sentences])
+    queries = _query_vectors([normalize(job_text)] + [normalize(s) for s in skills or [] if s])
+    return pack([s for s, _ in sentences], _score(vecs, queries), budget, keep_first=True)
+
+
+def relevant_job_text(job_text: str, resume_text: str = "", skills=None,
+                      budget: int = JOB_TOKEN_BUDGET) -> str:
+    """JD paragraphs most relevant to the resume (and skills) within `budget` tokens."""
+    if estimate_tokens(job_text) <= budget:
+        return job_text
+    paragraphs = _job_paragraphs(job_text)
+    if not paragraphs:
+        return job_text[:budget * _CHARS_PER_TOKEN]
+    vecs = encode_cached([n for _, n in paragraphs])
+    queries = _query_vectors([normalize(resume_text)] + [normalize(s) for s in skills or [] if s])
+    return pack([p for p, _ in paragraphs], _score(vecs, queries), budget)
+
+
+def compact_resume(resume: dict, job_text: str = "", budget: int = RESUME_TOKEN_BUDGET) -> str:
+    """
+    Compact JSON of a structured resume ({sections: [{id, title, items: [{id, text}]}]}).
+
+    Keeps only ids, titles and item text; if that is over budget, the least
+    job-relevant items are dropped (section and item ids are preserved for
+    the ones kept, so rewrite suggestions can still target them).
+    """
+    if not isinstance(resume, dict):
+        return "{}"
+    sections = []
+    items = []  # (section index, item dict)
+    for sec in resume.get("sections") or []:
+        if not isinstance(sec, dict):
+            continue
+        sections.append({"id": sec.get("id"), "title": sec.get("title"), "items": []})
+        for it in sec.get("items") or []:
+            if isinstance(it, dict) and it.get("text"):
+                items.append((len(sections) - 1, {"id": it.get("id"), "text": str(it["text"])}))
+
+    def dump(keep):
+        out = [dict(s, items=[]) for s in sections]
+        for idx in sorted(keep):
+            sec_idx, item = items[idx]
+            out[sec_idx]["items"].append(item)
+        return json.dumps({"sections": out}, separators=(",", ":"), ensure_ascii=False)
+
+    everything = set(range(len(items)))
+    full = dump(everything)
+    if estimate_tokens(full) <= budget or not items:
+        return full
+
+    vecs = encode_cached([normalize(it["text"]) or "-" for _, it in items])
+    scores = _score(vecs, _query_vectors([normalize(job_text)]))
+    keep, used = set(), estimate_tokens(dump(set()))
+    for i in sorted(everything, key=lambda i: -float(scores[i])):
+        cost = estimate_tokens(json.dumps(items[i][1], separators=(",", ":"), ensure_ascii=False)) + 1
+        if used + cost > budget:
+            continue
+        keep.add(i)
+        used += cost
+    return dump(keep)
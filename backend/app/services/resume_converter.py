@@ -1,20 +1,18 @@
 """
 Resume converter service for generating styled DOCX files using Pandoc.
 """
-import os
 import json
-import tempfile
 from pathlib import Path
 from jinja2 import Template
-from docx import Document
-from docx.shared import Pt, Inches
+from docx.shared import Pt
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from docx.enum.style import WD_STYLE_TYPE
 
-try:
-    import pypandoc
-except ImportError:
-    pypandoc = None
+from app.services.pandoc_pool import get_pandoc_pool
+from app.services.docx_skeletons import (
+    get_template_style,
+    new_document,
+    reference_docx_path,
+)
 
 
 TEMPLATES_DIR = Path(__file__).parent.parent / "templates" / "resume"
@@ -94,78 +92,13 @@ def resume_to_markdown(resume_data: dict, template_id: str) -> str:
     return template.render(**context)
 
 
-def _create_reference_docx(template_id: str, output_path: Path) -> None:
-    """
-    Create a reference DOCX file with proper styling for a template.
-
-    Args:
-        template_id: The template ID
-        output_path: Path to save the reference document
-    """
-    doc = Document()
-
-    # Template-specific styling
-    if template_id == "classic":
-        font_name = "Times New Roman"
-        body_size = 11
-        heading1_size = 18
-        heading2_size = 14
-        margins = 1.0  # inches
-    elif template_id == "modern":
-        font_name = "Calibri"
-        body_size = 11
-        heading1_size = 16
-        heading2_size = 12
-        margins = 0.75
-    else:  # compact
-        font_name = "Arial"
-        body_size = 10
-        heading1_size = 14
-        heading2_size = 11
-        margins = 0.5
-
-    # Set margins
-    for section in doc.sections:
-        section.top_margin = Inches(margins)
-        section.bottom_margin = Inches(margins)
-        section.left_margin = Inches(margins)
-        section.right_margin = Inches(margins)
-
-    # Configure Normal style
-    normal_style = doc.styles["Normal"]
-    normal_style.font.name = font_name
-    normal_style.font.size = Pt(body_size)
-
-    # Configure Heading 1
-    h1_style = doc.styles["Heading 1"]
-    h1_style.font.name = font_name
-    h1_style.font.size = Pt(heading1_size)
-    h1_style.font.bold = True
-    if template_id == "classic":
-        h1_style.paragraph_format.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-
-    # Configure Heading 2
-    h2_style = doc.styles["Heading 2"]
-    h2_style.font.name = font_name
-    h2_style.font.size = Pt(heading2_size)
-    h2_style.font.bold = True
-    if template_id == "compact":
-        h2_style.font.all_caps = True
-
-    # Configure List Bullet style
-    try:
-        list_style = doc.styles["List Bullet"]
-        list_style.font.name = font_name
-        list_style.font.size = Pt(body_size)
-    except KeyError:
-        pass
-
-    doc.save(output_path)
-
-
 def _ensure_reference_docx(template_id: str) -> Path:
     """
-    Ensure the reference DOCX exists for a template, creating it if needed.
+    Get the reference DOCX for a template.
+
+    Uses the reference.docx shipped with the template; if it is missing, a
+    copy of the cached skeleton is written to a temp directory instead of the
+    source tree.
 
     Args:
         template_id: The template ID
@@ -176,16 +109,24 @@ def _ensure_reference_docx(template_id: str) -> Path:
     template_path = get_template_path(template_id)
     reference_path = template_path / "reference.docx"
 
-    if not reference_path.exists():
-        _create_reference_docx(template_id, reference_path)
+    if reference_path.exists():
+        return reference_path
 
-    return reference_path
+    return reference_docx_path(template_id)
+
+
+def styled_renderer() -> str:
+    """Name of the renderer styled exports will use in this process."""
+    return "pandoc" if get_pandoc_pool().available() else "styled-fallback"
 
 
 def generate_docx(resume_data: dict, template_id: str) -> bytes:
     """
     Generate a styled DOCX file from resume data.
 
+    The conversion runs through the shared pandoc pool, which pipes the
+    document through stdout and enforces a concurrency limit and timeout.
+
     Args:
         resume_data: The resume dictionary from frontend
         template_id: The template ID to use
@@ -193,8 +134,9 @@ def generate_docx(resume_data: dict, template_id: str) -> bytes:
     Returns:
         DOCX file as bytes
     """
-    if pypandoc is None:
-        raise PandocNotAvailableError("pypandoc is not installed")
+    pool = get_pandoc_pool()
+    if not pool.available():
+        raise PandocNotAvailableError("pandoc is not installed")
 
     # Ensure reference document exists
     reference_path = _ensure_reference_docx(template_id)
@@ -202,35 +144,36 @@ def generate_docx(resume_data: dict, template_id: str) -> bytes:
     # Convert resume to markdown
     markdown_content = resume_to_markdown(resume_data, template_id)
 
-    # Create temp file for output
-    with tempfile.NamedTemporaryFile(suffix=".docx", delete=False) as tmp:
-        tmp_path = tmp.name
+    try:
+        return pool.convert(markdown_content, reference_path)
+    except FileNotFoundError:
+        raise PandocNotAvailableError("pandoc is not installed")
+
+
+def generate_styled_docx(resume_data: dict, template_id: str) -> bytes:
+    """
+    Generate a styled DOCX, preferring Pandoc and falling back to python-docx.
 
+    Args:
+        resume_data: The resume dictionary from frontend
+        template_id: The template ID to use
+
+    Returns:
+        DOCX file as bytes
+    """
     try:
-        # Convert markdown to DOCX using Pandoc
-        pypandoc.convert_text(
-            markdown_content,
-            "docx",
-            format="md",
-            outputfile=tmp_path,
-            extra_args=[f"--reference-doc={reference_path}"]
-        )
-
-        # Read the generated file
-        with open(tmp_path, "rb") as f:
-            content = f.read()
-
-        return content
-    finally:
-        # Clean up temp file
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+        return generate_docx(resume_data, template_id)
+    except PandocNotAvailableError:
+        return generate_docx_fallback(resume_data, template_id)
 
 
 def generate_docx_fallback(resume_data: dict, template_id: str) -> bytes:
     """
     Generate a styled DOCX file using python-docx directly (fallback if Pandoc unavailable).
 
+    Starts from the cached template skeleton, so margins and base fonts are
+    already in place and only content is appended here.
+
     Args:
         resume_data: The resume dictionary from frontend
         template_id: The template ID to use
@@ -240,42 +183,14 @@ def generate_docx_fallback(resume_data: dict, template_id: str) -> bytes:
     """
     import io
 
-    # Template-specific styling
-    if template_id == "classic":
-        font_name = "Times New Roman"
-        body_size = 11
-        heading1_size = 18
-        heading2_size = 14
-        margins = 1.0
-        center_name = True
-    elif template_id == "modern":
-        font_name = "Calibri"
-        body_size = 11
-        heading1_size = 16
-        heading2_size = 12
-        margins = 0.75
-        center_name = False
-    else:  # compact
-        font_name = "Arial"
-        body_size = 10
-        heading1_size = 14
-        heading2_size = 11
-        margins = 0.5
-        center_name = False
-
-    doc = Document()
-
-    # Set margins
-    for section in doc.sections:
-        section.top_margin = Inches(margins)
-        section.bottom_margin = Inches(margins)
-        section.left_margin = Inches(margins)
-        section.right_margin = Inches(margins)
-
-    # Configure Normal style
-    normal_style = doc.styles["Normal"]
-    normal_style.font.name = font_name
-    normal_style.font.size = Pt(body_size)
+    style = get_template_style(template_id)
+    font_name = style["font_name"]
+    body_size = style["body_size"]
+    heading1_size = style["heading1_size"]
+    heading2_size = style["heading2_size"]
+    center_name = style["center_name"]
+
+    doc = new_document(template_id)
 
     # Add name
     name = resume_data.get("name", "Your Name")
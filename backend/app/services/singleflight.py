@@ -0,0 +1,244 @@
+"""
+Request coalescing (singleflight).
+
+Double-clicks, retries and React re-renders send the same POST body twice
+within a second. Requests with the same key (endpoint, user id, hash of the
+raw body) that arrive while one is in flight wait for it and get a copy of
+its response instead of computing (and, for /analyze, charging) again. A
+successful response is also kept for SINGLEFLIGHT_LINGER seconds so late
+duplicates get it too.
+
+A waiting duplicate holds a gunicorn thread, so it takes a unit of the
+admission thread budget (app.services.admission) while it waits and gives up
+after SINGLEFLIGHT_WAIT seconds; it gets 429 when the budget is spent and 504
+when the wait runs out.
+
+This works within one process. /analyze and the analysis job API also dedupe
+across gunicorn workers through the shared job store
+(app.services.analysis_jobs), so a duplicate that reaches another worker is
+not charged either.
+"""
+import os
+import time
+import hashlib
+import threading
+import logging
+from functools import wraps
+
+from flask import Response, current_app, request, jsonify
+
+from app.utils.auth_tokens import current_identity
+from app.services.admission import ThreadBudget, get_thread_budget
+
+logger = logging.getLogger(__name__)
+
+
+class FollowerRejected(Exception):
+    """A duplicate could not wait for the call in flight: "server_busy" or "wait_timeout"."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "finished_at", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished_at = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Args:
+        linger: Seconds a successful result is still handed to late duplicates
+        max_entries: Bound on remembered results
+        keep: Callable(result) -> bool; results it rejects are shared with
+            concurrent duplicates but not kept for late ones
+        max_wait: Seconds a duplicate waits for the call in flight
+        budget: ThreadBudget a waiting duplicate takes a unit of (None for no cap)
+    """
+
+    def __init__(self, linger: float = 2.0, max_entries: int = 1000, keep=None,
+                 max_wait: float = 120.0, budget: ThreadBudget | None = None):
+        self.linger = linger
+        self.max_entries = max_entries
+        self.keep = keep or (lambda result: True)
+        self.max_wait = max_wait
+        self.budget = budget
+        self._calls: dict = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.late_hits = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def _expire(self, now: float) -> None:
+        stale = [k for k, c in self._calls.items()
+                 if c.finished_at is not None and c.finished_at + self.linger <= now]
+        for key in stale:
+            del self._calls[key]
+        while len(self._calls) > self.max_entries:
+            oldest = min(
+                (k for k, c in self._calls.items() if c.finished_at is not None),
+                key=lambda k: self._calls[k].finished_at,
+                default=None,
+            )
+            if oldest is None:
+                break
+            del self._calls[oldest]
+
+    def do(self, key: str, fn):
+        """
+        Run `fn()` once per key at a time.
+
+        Returns:
+            (result, shared); shared is True when the result came from another
+            caller's run. If that run raised, the exception is raised here too.
+
+        Raises:
+            FollowerRejected: a duplicate found no thread budget to wait with,
+                or the call in flight did not finish within max_wait
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+            else:
+                leader = False
+                if call.done.is_set():
+                    self.late_hits += 1
+                else:
+                    call.followers += 1
+                    self.coalesced += 1
+
+        if not leader:
+            if not call.done.is_set():
+                self._wait(call)
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                keep = call.error is None and self.keep(call.result)
+                if keep:
+                    call.finished_at = time.monotonic()
+                elif self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def _wait(self, call: _Call) -> None:
+        if self.budget is not None and not self.budget.take():
+            with self._lock:
+                self.rejected += 1
+            raise FollowerRejected("server_busy")
+        try:
+            finished = call.done.wait(self.max_wait)
+        finally:
+            if self.budget is not None:
+                self.budget.give_back()
+        if not finished:
+            with self._lock:
+                self.timeouts += 1
+            raise FollowerRejected("wait_timeout")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": sum(1 for c in self._calls.values() if not c.done.is_set()),
+                "remembered": sum(1 for c in self._calls.values() if c.done.is_set()),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "late_hits": self.late_hits,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+            }
+
+
+def request_fingerprint(name: str, uid: str | None, body: bytes) -> str:
+    """Key for one endpoint + user + exact request body."""
+    digest = hashlib.sha256(body or b"").hexdigest()
+    return f"{name}:{uid or 'anonymous'}:{digest}"
+
+
+def _request_uid() -> str | None:
+    uid = request.headers.get("X-User-Id")
+    if uid:
+        return uid
+    identity = current_identity()
+    return identity.uid if identity else None
+
+
+_GROUPS: dict = {}
+_GROUPS_LOCK = threading.Lock()
+
+
+def get_singleflight(name: str) -> SingleFlight:
+    """Shared group for an endpoint (created once per process)."""
+    group = _GROUPS.get(name)
+    if group is None:
+        with _GROUPS_LOCK:
+            group = _GROUPS.get(name)
+            if group is None:
+                group = _GROUPS[name] = SingleFlight(
+                    linger=float(os.getenv("SINGLEFLIGHT_LINGER", "2")),
+                    keep=lambda snapshot: snapshot[1] < 400,
+                    max_wait=float(os.getenv("SINGLEFLIGHT_WAIT", "120")),
+                    budget=get_thread_budget(),
+                )
+    return group
+
+
+def singleflight_stats() -> dict:
+    return {name: group.stats() for name, group in list(_GROUPS.items())}
+
+
+def singleflight(name: str):
+    """
+    Route decorator: identical concurrent POSTs from the same user run the
+    view once; every caller gets its own copy of the response. A duplicate
+    that cannot wait gets 429 (no thread budget) or 504 (wait timed out).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != "POST":
+                return view(*args, **kwargs)
+            key = request_fingerprint(name, _request_uid(), request.get_data(cache=True))
+
+            def run():
+                # Snapshot, so each request gets a fresh Response object that
+                # its own after_request handlers (CORS, ...) can modify
+                rv = current_app.make_response(view(*args, **kwargs))
+                return rv.get_data(), rv.status_code, list(rv.headers.items())
+
+            try:
+                data, status, headers = get_singleflight(name).do(key, run)[0]
+            except FollowerRejected as e:
+                busy = e.reason == "server_busy"
+                resp = jsonify({
+                    "error": "too_busy" if busy else "duplicate_timeout",
+                    "reason": e.reason,
+                    "message": "An identical request is still running, please retry shortly.",
+                })
+                resp.headers["Retry-After"] = "5"
+                return resp, 429 if busy else 504
+            return Response(data, status=status, headers=headers)
+        return wrapper
+    return decorator
@@ -408,7 +408,14 @@ def _compose_auto_suggestions(job_text: str, resume_text: str,
 
     return {"Summary": summ, "Experience": exp, "Projects": prj}, bullets
 
-def smart_predict_resume_improvements(resume_text: str, job_text: str, job_title: str = "") -> SmartAdvice:
+def smart_predict_resume_improvements(resume_text: str, job_text: str, job_title: str = "",
+                                      on_skills=None) -> SmartAdvice:
+    """
+    Args:
+        on_skills: Optional callable(present_skills, missing_skills, critical_gaps),
+            called as soon as the skill buckets are known (before the section
+            suggestions are composed) with the same lists the result carries
+    """
     r = normalize(resume_text); j = normalize(job_text); t = normalize(job_title or "")
 
     model = get_emb()
@@ -446,6 +453,9 @@ def smart_predict_resume_improvements(resume_text: str, job_text: str, job_title
         crit = []
     critical_gaps = [s for s, _ in crit[:6]]
 
+    if on_skills is not None:
+        on_skills(sorted(present)[:30], sorted(missing)[:30], critical_gaps)
+
     coverage = len(present) / max(1, (len(present) + len(missing)))
     fit = int(round(max(0, min(1.0, sim_rj*0.6 + sim_rt*0.2 + coverage*0.2)) * 100))
 
@@ -0,0 +1,273 @@
+"""
+Speculative enrichment for /api/smart/analyze.
+
+/analyze knows the present / missing / critical skills before it has finished
+composing its own suggestions, so it starts the OpenAI enrichment right away
+and returns an analysis id. /enrich (or /enrich/stream) called with that id
+gets the finished payload, or waits on the in-flight call, instead of starting
+a second one. End-to-end latency becomes roughly max(ML, LLM) rather than
+ML + LLM.
+
+Speculations are recorded in a SQLite table next to the analysis jobs
+(ANALYSIS_JOB_DB_PATH), so /enrich finds them whichever gunicorn worker it
+lands on: the worker that started the call writes the payload there when it
+arrives, and a claim from another worker polls the row. A speculation can be
+claimed any number of times until it expires (coalesced duplicate /analyze
+requests share one analysis id).
+
+Each speculation is bound to the user and to the cache key of its prompt
+inputs; a request whose inputs differ (e.g. the user edited the resume in
+between) does not reuse it. At most LLM_SPECULATIVE_PER_USER speculations run
+per user; beyond that /analyze simply returns no id and the client enriches
+the normal way. Results are dropped after LLM_SPECULATIVE_TTL seconds.
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import concurrent.futures
+import logging
+
+from app.utils.storage import state_path
+
+logger = logging.getLogger(__name__)
+
+_POLL_SECONDS = 0.25
+
+
+class SpeculationStore:
+    """
+    Speculation rows shared by every process on the host.
+
+    Args:
+        path: SQLite file (":memory:" for tests)
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("pragma journal_mode=wal")
+            self._conn.executescript(
+                """
+                create table if not exists enrich_speculations (
+                    id text primary key,
+                    user_id text not null,
+                    request_key text not null,
+                    status text not null default 'running',
+                    payload text,
+                    deadline real not null,
+                    expires_at real not null
+                );
+                create index if not exists enrich_speculations_user on enrich_speculations (user_id, status);
+                """
+            )
+
+    def create(self, analysis_id: str, uid: str, key: str, run_timeout: float, ttl: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "insert into enrich_speculations (id, user_id, request_key, deadline, expires_at) "
+                "values (?, ?, ?, ?, ?)",
+                (analysis_id, uid, key, now + run_timeout, now + ttl),
+            )
+
+    def finish(self, analysis_id: str, payload) -> None:
+        with self._lock:
+            self._conn.execute(
+                "update enrich_speculations set status = 'done', payload = ? where id = ? and status = 'running'",
+                (json.dumps(payload, separators=(",", ":")), analysis_id),
+            )
+
+    def fail(self, analysis_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "update enrich_speculations set status = 'failed' where id = ? and status = 'running'",
+                (analysis_id,),
+            )
+
+    def get(self, analysis_id: str) -> tuple | None:
+        """
+        (user_id, request_key, status, payload) of a live speculation.
+
+        A row still "running" past its deadline (its process died) reads as
+        "failed".
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "select user_id, request_key, status, payload, deadline from enrich_speculations "
+                "where id = ? and expires_at > ?",
+                (analysis_id, now),
+            ).fetchone()
+        if row is None:
+            return None
+        status = "failed" if row[2] == "running" and row[4] <= now else row[2]
+        return row[0], row[1], status, json.loads(row[3]) if status == "done" else None
+
+    def running_count(self, uid: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "select count(*) from enrich_speculations where user_id = ? and status = 'running' and deadline > ?",
+                (uid, time.time()),
+            ).fetchone()
+        return row[0]
+
+    def purge(self) -> int:
+        with self._lock:
+            cur = self._conn.execute("delete from enrich_speculations where expires_at <= ?", (time.time(),))
+            return cur.rowcount
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute(
+                "select status, count(*) from enrich_speculations group by status"
+            ).fetchall()
+        return {status: n for status, n in rows}
+
+
+class SpeculativeEnrichment:
+    """
+    Args:
+        store: SpeculationStore shared with the other workers
+        max_per_user: Speculations in flight per user
+        ttl: Seconds a speculation (running or finished) is kept for claims
+        run_timeout: Seconds after which a still-running speculation is
+            given up (its process may have died)
+        workers: Threads running speculative calls in this process
+    """
+
+    def __init__(self, store: SpeculationStore, max_per_user: int = 2, ttl: float = 600.0,
+                 run_timeout: float = 60.0, workers: int = 4):
+        self.store = store
+        self.max_per_user = max_per_user
+        self.ttl = ttl
+        self.run_timeout = run_timeout
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="llm-speculative"
+        )
+        self._futures: dict = {}  # analysis_id -> future, for calls running in this process
+        self._lock = threading.Lock()
+        self.started = 0
+        self.skipped = 0
+        self.claimed = 0
+        self.waited = 0
+
+    def _run(self, analysis_id: str, fn) -> None:
+        try:
+            payload = fn()
+        except Exception as e:
+            logger.info("speculative enrichment %s failed: %s", analysis_id, e)
+            self.store.fail(analysis_id)
+        else:
+            self.store.finish(analysis_id, payload)
+        finally:
+            with self._lock:
+                self._futures.pop(analysis_id, None)
+
+    def start(self, uid: str, key: str, fn) -> str | None:
+        """
+        Run `fn()` in the background for `uid`.
+
+        Args:
+            uid: Owner of the speculation
+            key: llm_cache_key(...) of the prompt inputs
+            fn: Zero-arg callable returning the (JSON-serializable) model payload
+
+        Returns:
+            The analysis id, or None when the user's speculation cap is reached
+        """
+        self.store.purge()
+        if self.store.running_count(uid) >= self.max_per_user:
+            with self._lock:
+                self.skipped += 1
+            return None
+        analysis_id = uuid.uuid4().hex
+        self.store.create(analysis_id, uid, key, self.run_timeout, self.ttl)
+        with self._lock:
+            self._futures[analysis_id] = self._executor.submit(self._run, analysis_id, fn)
+            self.started += 1
+        return analysis_id
+
+    def cancel(self, analysis_id: str | None) -> None:
+        """Give up a speculation (e.g. the analysis that started it failed)."""
+        if not analysis_id:
+            return
+        with self._lock:
+            future = self._futures.pop(analysis_id, None)
+        if future is not None:
+            future.cancel()
+        self.store.fail(analysis_id)
+
+    def claim(self, analysis_id: str | None, uid: str, key: str,
+              timeout: float = 60.0, disconnected=None):
+        """
+        Payload of a speculation started for the same user and inputs.
+
+        Waits for it while still running (up to `timeout`, or until
+        `disconnected()` returns True), whichever process runs it.
+
+        Returns:
+            The model payload, or None when there is no usable speculation
+            (unknown id, other user or inputs, failed or timed out); the caller
+            then enriches as usual.
+        """
+        if not analysis_id:
+            return None
+        deadline = time.monotonic() + timeout
+        waited = False
+        while True:
+            row = self.store.get(analysis_id)
+            if row is None or row[0] != uid or row[1] != key or row[2] == "failed":
+                return None
+            if row[2] == "done":
+                with self._lock:
+                    self.claimed += 1
+                    self.waited += int(waited)
+                return row[3]
+
+            waited = True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (disconnected is not None and disconnected()):
+                return None
+            with self._lock:
+                future = self._futures.get(analysis_id)
+            if future is not None:
+                concurrent.futures.wait([future], timeout=min(_POLL_SECONDS, remaining))
+            else:
+                time.sleep(min(_POLL_SECONDS, remaining))
+
+    def stats(self) -> dict:
+        with self._lock:
+            local = {
+                "running_here": len(self._futures),
+                "started": self.started,
+                "skipped": self.skipped,
+                "claimed": self.claimed,
+                "waited": self.waited,
+            }
+        return {**local, "speculations": self.store.counts()}
+
+
+_SPECULATION = None
+_SPECULATION_LOCK = threading.Lock()
+
+
+def get_speculative_enrichment() -> SpeculativeEnrichment:
+    """Get the shared speculative enrichment runner (created once per process)."""
+    global _SPECULATION
+    if _SPECULATION is None:
+        with _SPECULATION_LOCK:
+            if _SPECULATION is None:
+                _SPECULATION = SpeculativeEnrichment(
+                    SpeculationStore(state_path("ANALYSIS_JOB_DB_PATH", "analysis_jobs.sqlite3")),
+                    max_per_user=int(os.getenv("LLM_SPECULATIVE_PER_USER", "2")),
+                    ttl=float(os.getenv("LLM_SPECULATIVE_TTL", "600")),
+                    run_timeout=float(os.getenv("LLM_TIMEOUT", "45")) + float(os.getenv("LLM_QUEUE_TIMEOUT", "10")),
+                    workers=int(os.getenv("LLM_SPECULATIVE_WORKERS", "4")),
+                )
+    return _SPECULATION
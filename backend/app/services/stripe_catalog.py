@@ -0,0 +1,149 @@
+"""
+Stripe product/price catalog.
+
+Checkout used to send inline price_data, which makes Stripe create a new
+ad-hoc product for every session. Instead, each sellable item gets one Product
+and one Price, found by the price's lookup_key (or created on first sync).
+Their ids are cached in-process and in a small JSON file, so checkout only
+sends price ids and a restart does not need to ask Stripe again.
+
+A cached entry is reused only while its item spec (amount, currency,
+interval, name) is unchanged. Changing the spec bumps the lookup key and so
+produces a new Price.
+"""
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import logging
+from dataclasses import dataclass, asdict
+
+import stripe
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CatalogItem:
+    key: str
+    name: str
+    unit_amount: int  # cents
+    currency: str = "usd"
+    interval: str | None = None  # recurring interval, None for one-time
+
+    @property
+    def fingerprint(self) -> str:
+        raw = json.dumps(asdict(self), sort_keys=True).encode("utf-8")
+        return hashlib.sha256(raw).hexdigest()[:12]
+
+    @property
+    def lookup_key(self) -> str:
+        return f"resume_checker_{self.key}_{self.fingerprint}"
+
+
+class StripeCatalog:
+    """
+    Args:
+        items: CatalogItem list
+        path: JSON file for the on-disk id cache (None disables it)
+    """
+
+    def __init__(self, items, path: str | None = None):
+        self.items = {item.key: item for item in items}
+        self.path = path
+        self._prices: dict = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _mode(self) -> str:
+        key = stripe.api_key or ""
+        return "live" if key.startswith(("sk_live", "rk_live")) else "test"
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._prices.update(json.load(f))
+        except Exception as e:
+            logger.warning("Ignoring unreadable catalog cache %s: %s", self.path, e)
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"  # several workers may save at once
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._prices, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logger.warning("Could not write catalog cache %s: %s", self.path, e)
+
+    def _cached(self, item: CatalogItem) -> str | None:
+        return self._prices.get(f"{self._mode()}:{item.lookup_key}")
+
+    def _find_or_create(self, item: CatalogItem) -> str:
+        found = stripe.Price.list(lookup_keys=[item.lookup_key], active=True, limit=1)
+        if found.data:
+            return found.data[0].id
+
+        # Idempotency keys make concurrent first syncs (several workers, or
+        # several hosts) get the same Product and Price instead of duplicates
+        idempotency = f"catalog-{self._mode()}-{item.lookup_key}"
+        product = stripe.Product.create(
+            name=item.name,
+            metadata={"catalog_key": item.key},
+            idempotency_key=f"{idempotency}-product",
+        )
+        params = {
+            "product": product.id,
+            "unit_amount": item.unit_amount,
+            "currency": item.currency,
+            "lookup_key": item.lookup_key,
+            "metadata": {"catalog_key": item.key},
+        }
+        if item.interval:
+            params["recurring"] = {"interval": item.interval}
+        price = stripe.Price.create(**params, idempotency_key=f"{idempotency}-price")
+        logger.info("Created Stripe price %s for %s", price.id, item.key)
+        return price.id
+
+    def price_id(self, key: str) -> str:
+        """Price id for a catalog item, syncing with Stripe on first use."""
+        item = self.items[key]
+        price_id = self._cached(item)
+        if price_id:
+            return price_id
+        with self._lock:
+            self._load()  # another worker may have synced it since we started
+            price_id = self._cached(item)
+            if price_id:
+                return price_id
+            price_id = self._find_or_create(item)
+            self._prices[f"{self._mode()}:{item.lookup_key}"] = price_id
+            self._save()
+            return price_id
+
+    def sync(self) -> dict:
+        """Resolve every item now. Returns {key: price_id} for the ones that worked."""
+        resolved = {}
+        for key in self.items:
+            try:
+                resolved[key] = self.price_id(key)
+            except Exception as e:
+                logger.warning("Stripe catalog sync failed for %s: %s", key, e)
+        return resolved
+
+    def sync_in_background(self) -> None:
+        """Warm the catalog at startup without blocking the app on Stripe."""
+        if not stripe.api_key:
+            return
+        threading.Thread(target=self.sync, name="stripe-catalog", daemon=True).start()
+
+
+def default_catalog_path() -> str:
+    return os.getenv("STRIPE_CATALOG_PATH") or os.path.join(
+        tempfile.gettempdir(), "resume-checker", "stripe_catalog.json"
+    )
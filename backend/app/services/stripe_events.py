@@ -0,0 +1,406 @@
+"""
+Durable Stripe webhook ingestion.
+
+The webhook endpoint only verifies the signature, appends the event to a local
+SQLite log keyed by the Stripe event id (a redelivered event is a no-op insert)
+and returns 200 straight away. A background worker then drains the log:
+
+    - pending events are grouped per subscription, so a burst of events for
+      one subscription costs a single subscription lookup (served by the
+      subscription cache) and a single profile status write (the latest
+      event decides the status)
+    - credit grants go through the credit ledger, whose purchases reference is
+      a unique key, so replays never double-grant and no SELECT is needed
+    - failures are retried with backoff; events that keep failing are parked
+      as "dead" for inspection
+    - every gunicorn worker may run a worker thread against the same log, so
+      a pass first claims its rows with a lease (STRIPE_EVENT_LEASE seconds)
+      and only processes what it claimed; rows of a process that died are
+      claimed again once the lease runs out
+
+STRIPE_EVENT_LOG_PATH (or DATA_DIR) must point at persistent storage so events
+received right before a restart are processed when the process comes back;
+the production server does not start without it (app.utils.storage).
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import logging
+
+from app.utils.supabase_client import get_supabase
+from app.services.credit_ledger import get_credit_ledger
+from app.services.profile_cache import get_profile_cache
+from app.services.subscription_cache import get_subscription_cache, period_end as _period_end
+from app.utils.storage import state_path
+
+logger = logging.getLogger(__name__)
+
+HANDLED_EVENTS = (
+    "checkout.session.completed",
+    "invoice.paid",
+    "customer.subscription.deleted",
+)
+
+DEFAULT_SUBSCRIPTION_CREDITS = 10
+
+
+class StripeEventLog:
+    """
+    Append-only event log with per-event processing state.
+
+    Args:
+        path: SQLite file (":memory:" for tests)
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("pragma journal_mode=wal")
+            self._conn.executescript(
+                """
+                create table if not exists stripe_events (
+                    id text primary key,
+                    type text not null,
+                    created integer not null default 0,
+                    payload text not null,
+                    status text not null default 'pending',
+                    attempts integer not null default 0,
+                    next_attempt_at real not null default 0,
+                    last_error text,
+                    received_at real not null,
+                    processed_at real
+                );
+                create index if not exists stripe_events_pending
+                    on stripe_events (status, next_attempt_at);
+                """
+            )
+            columns = {row[1] for row in self._conn.execute("pragma table_info(stripe_events)")}
+            if "claimed_by" not in columns:
+                self._conn.execute("alter table stripe_events add column claimed_by text")
+            if "lease_until" not in columns:
+                self._conn.execute("alter table stripe_events add column lease_until real")
+
+    def record(self, event: dict) -> bool:
+        """Store a verified event. Returns False if the id was already logged."""
+        with self._lock:
+            cur = self._conn.execute(
+                "insert into stripe_events (id, type, created, payload, received_at) "
+                "values (?, ?, ?, ?, ?) on conflict(id) do nothing",
+                (
+                    event["id"],
+                    event.get("type") or "",
+                    int(event.get("created") or 0),
+                    json.dumps(event, separators=(",", ":")),
+                    time.time(),
+                ),
+            )
+            return cur.rowcount == 1
+
+    def claim(self, limit: int = 100, lease: float = 300.0) -> list:
+        """
+        Lease due pending events to the caller, oldest first.
+
+        The claim is one UPDATE, so two processes never get the same row;
+        an unfinished claim expires after `lease` seconds.
+
+        Returns:
+            [(event_id, event, attempts)] claimed by this call
+        """
+        token = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "update stripe_events set claimed_by = ?, lease_until = ? where id in ("
+                "select id from stripe_events where status = 'pending' and next_attempt_at <= ? "
+                "and (lease_until is null or lease_until < ?) "
+                "order by created, received_at limit ?)",
+                (token, now + lease, now, now, limit),
+            )
+            rows = self._conn.execute(
+                "select id, payload, attempts from stripe_events where claimed_by = ? "
+                "order by created, received_at",
+                (token,),
+            ).fetchall()
+        return [(row[0], json.loads(row[1]), row[2]) for row in rows]
+
+    def mark_done(self, event_ids: list) -> None:
+        if not event_ids:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "update stripe_events set status = 'done', processed_at = ?, last_error = null, "
+                "claimed_by = null, lease_until = null where id = ?",
+                [(now, event_id) for event_id in event_ids],
+            )
+
+    def mark_failed(self, event_ids: list, error: str, backoff: float, max_attempts: int) -> None:
+        now = time.time()
+        with self._lock:
+            for event_id in event_ids:
+                row = self._conn.execute("select attempts from stripe_events where id = ?", (event_id,)).fetchone()
+                attempts = (row[0] if row else 0) + 1
+                status = "dead" if attempts >= max_attempts else "pending"
+                self._conn.execute(
+                    "update stripe_events set status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, "
+                    "claimed_by = null, lease_until = null where id = ?",
+                    (status, attempts, now + backoff * (2 ** (attempts - 1)), error[:500], event_id),
+                )
+
+    def has_pending(self) -> bool:
+        with self._lock:
+            row = self._conn.execute("select 1 from stripe_events where status = 'pending' limit 1").fetchone()
+        return row is not None
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("select status, count(*) from stripe_events group by status").fetchall()
+        return {status: n for status, n in rows}
+
+
+def _meta(obj) -> dict:
+    meta = obj.get("metadata") if isinstance(obj, dict) else getattr(obj, "metadata", None)
+    if not meta:
+        return {}
+    return dict(meta) if not isinstance(meta, dict) else meta
+
+
+def _subscription_key(event: dict) -> str | None:
+    """Subscription an event belongs to (None for one-time payments)."""
+    obj = event["data"]["object"]
+    event_type = event.get("type")
+    if event_type == "checkout.session.completed":
+        return obj.get("subscription")
+    if event_type == "invoice.paid":
+        return obj.get("subscription")
+    if event_type == "customer.subscription.deleted":
+        return obj.get("id")
+    return None
+
+
+def save_subscription_status(uid: str, subscription_id, status: str, period_end=None) -> None:
+    """Write a user's subscription fields to profiles (raises on failure)."""
+    supabase = get_supabase()
+    if not supabase or not uid:
+        logger.warning("Cannot update subscription: supabase or uid missing")
+        return
+    update_data = {
+        "subscription_id": subscription_id,
+        "subscription_status": status,
+    }
+    if period_end:
+        update_data["subscription_period_end"] = period_end
+    supabase.table("profiles").update(update_data).eq("user_id", uid).execute()
+    get_profile_cache().update(uid, update_data)
+
+
+def retrieve_subscription(subscription_id: str, fresh: bool = False) -> dict | None:
+    """
+    Subscription state from the subscription cache.
+
+    Args:
+        fresh: Fetch from Stripe (and refresh the cache) even if an entry is
+            cached; a cached entry may predate a renewal
+    """
+    return get_subscription_cache().get(subscription_id, max_age=0 if fresh else None)
+
+
+def _process_payment(event: dict) -> None:
+    session = event["data"]["object"]
+    uid = _meta(session).get("user_id")
+    if session.get("mode") != "payment" or not uid:
+        return
+    try:
+        credits = int(_meta(session).get("credits", "0") or 0)
+    except Exception:
+        credits = 0
+    if credits > 0:
+        get_credit_ledger().grant(
+            uid, credits, session.get("id"), int(session.get("amount_total") or 0), "ONE_TIME_PURCHASE"
+        )
+
+
+def _process_subscription(subscription_id: str, events: list) -> None:
+    """Apply every event for one subscription with at most one Stripe call."""
+    latest = events[-1]
+    needs_stripe = any(e["type"] != "customer.subscription.deleted" for e in events)
+    # A renewal moves current_period_end, which any cached copy predates
+    renewed = any(e["type"] == "invoice.paid" for e in events)
+
+    sub = None
+    if needs_stripe:
+        sub = retrieve_subscription(subscription_id, fresh=renewed)
+
+    sub_meta = _meta(sub) if sub is not None else {}
+    uid = sub_meta.get("user_id")
+    for e in events:
+        uid = uid or _meta(e["data"]["object"]).get("user_id")
+    if not uid:
+        logger.warning("No user for subscription %s; skipping %d events", subscription_id, len(events))
+        return
+
+    credits = DEFAULT_SUBSCRIPTION_CREDITS
+    if sub_meta.get("credits"):
+        credits = int(sub_meta["credits"])
+
+    for e in events:
+        if e["type"] != "invoice.paid":
+            continue
+        invoice = e["data"]["object"]
+        # The first invoice is paid for by the checkout (granted on sync)
+        if invoice.get("billing_reason") == "subscription_create" or credits <= 0:
+            continue
+        get_credit_ledger().grant(
+            uid, credits, invoice.get("id"), int(invoice.get("amount_paid") or 0), "SUBSCRIPTION_RENEWAL"
+        )
+
+    if latest["type"] == "customer.subscription.deleted":
+        save_subscription_status(uid, subscription_id, "cancelled")
+    else:
+        save_subscription_status(uid, subscription_id, "active", _period_end(sub))
+
+
+class StripeEventWorker:
+    """
+    Background processor for the event log.
+
+    Args:
+        log: StripeEventLog to drain
+        poll_interval: Seconds between scans when nothing signalled new work
+        coalesce_window: Seconds to wait after a signal so bursts share a batch
+        batch_size: Max events claimed per pass
+        lease: Seconds a claimed batch stays reserved for this worker
+        backoff: Base retry delay in seconds (doubled per attempt)
+        max_attempts: Attempts before an event is parked as "dead"
+    """
+
+    def __init__(self, log: StripeEventLog, poll_interval: float = 5.0, coalesce_window: float = 0.5,
+                 batch_size: int = 100, backoff: float = 2.0, max_attempts: int = 8, lease: float = 300.0):
+        self.log = log
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.coalesce_window = coalesce_window
+        self.batch_size = batch_size
+        self.backoff = backoff
+        self.max_attempts = max_attempts
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.stripe_calls_saved = 0
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="stripe-events", daemon=True)
+                self._thread.start()
+
+    def notify(self) -> None:
+        """Signal that new events were logged."""
+        self._ensure_started()
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if self._wake.wait(self.poll_interval):
+                self._stop.wait(self.coalesce_window)
+            self._wake.clear()
+            try:
+                while self.process_pending():
+                    pass
+            except Exception:
+                logger.exception("stripe event worker pass failed")
+
+    def process_pending(self) -> int:
+        """Process one batch of due events. Returns how many were claimed."""
+        batch = self.log.claim(self.batch_size, self.lease)
+        if not batch:
+            return 0
+
+        groups: dict = {}
+        singles = []
+        ignored = []
+        for event_id, event, _attempts in batch:
+            if event.get("type") not in HANDLED_EVENTS:
+                ignored.append(event_id)
+                continue
+            key = _subscription_key(event)
+            if key:
+                groups.setdefault(key, []).append((event_id, event))
+            else:
+                singles.append((event_id, event))
+        self.log.mark_done(ignored)
+
+        for event_id, event in singles:
+            self._apply([event_id], lambda: _process_payment(event))
+
+        for subscription_id, items in groups.items():
+            self.stripe_calls_saved += max(0, len(items) - 1)
+            events = [event for _, event in items]
+            self._apply([event_id for event_id, _ in items],
+                        lambda: _process_subscription(subscription_id, events))
+        return len(batch)
+
+    def _apply(self, event_ids: list, fn) -> None:
+        try:
+            fn()
+        except Exception as e:
+            logger.warning("stripe events %s failed: %s", ",".join(event_ids), e)
+            self.log.mark_failed(event_ids, str(e), self.backoff, self.max_attempts)
+            return
+        self.log.mark_done(event_ids)
+
+    def close(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {"events": self.log.counts(), "stripe_calls_saved": self.stripe_calls_saved}
+
+
+_WORKER = None
+_WORKER_LOCK = threading.Lock()
+
+
+def get_stripe_event_worker() -> StripeEventWorker:
+    """Shared event log + worker (created once per process from env config)."""
+    global _WORKER
+    if _WORKER is None:
+        with _WORKER_LOCK:
+            if _WORKER is None:
+                _WORKER = StripeEventWorker(
+                    StripeEventLog(state_path("STRIPE_EVENT_LOG_PATH", "stripe_events.sqlite3")),
+                    poll_interval=float(os.getenv("STRIPE_EVENT_POLL_INTERVAL", "5")),
+                    coalesce_window=float(os.getenv("STRIPE_EVENT_COALESCE", "0.5")),
+                    max_attempts=int(os.getenv("STRIPE_EVENT_MAX_ATTEMPTS", "8")),
+                    lease=float(os.getenv("STRIPE_EVENT_LEASE", "300")),
+                )
+    return _WORKER
+
+
+def ingest_event(event: dict) -> bool:
+    """Log a verified event and wake the worker. Returns False for duplicates."""
+    worker = get_stripe_event_worker()
+    created = worker.log.record(event)
+    if created:
+        get_subscription_cache().apply_event(event)
+        worker.notify()
+    return created
+
+
+def resume_pending_events() -> None:
+    """Start the worker if events were left pending by a previous process."""
+    worker = get_stripe_event_worker()
+    if worker.log.has_pending():
+        worker.notify()
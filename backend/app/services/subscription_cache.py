@@ -0,0 +1,163 @@
+"""
+Stripe subscription state cache.
+
+Subscription state is kept per subscription id. Webhook events
+(customer.subscription.*) and our own Stripe writes (modify) refresh entries
+as they happen, so reads normally never leave the process; Stripe is only
+called on a miss or when an entry is older than SUBSCRIPTION_CACHE_TTL.
+
+The fetcher is injectable, and STRIPE_API_BASE can point the stripe library at
+a local stand-in such as stripe-mock.
+"""
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+import stripe
+
+logger = logging.getLogger(__name__)
+
+if os.getenv("STRIPE_API_BASE"):
+    stripe.api_base = os.getenv("STRIPE_API_BASE")
+
+_FIELDS = ("id", "status", "current_period_end", "cancel_at", "cancel_at_period_end", "customer")
+
+
+def subscription_state(obj) -> dict:
+    """Plain-dict snapshot of a Stripe subscription object (or event payload)."""
+    def get(name):
+        if isinstance(obj, dict):
+            return obj.get(name)
+        return getattr(obj, name, None)
+
+    state = {name: get(name) for name in _FIELDS}
+    meta = get("metadata") or {}
+    state["metadata"] = dict(meta)
+    return state
+
+
+def period_end(state: dict | None):
+    if not state:
+        return None
+    return state.get("current_period_end") or state.get("cancel_at")
+
+
+def _retrieve(subscription_id: str) -> dict:
+    return subscription_state(stripe.Subscription.retrieve(subscription_id))
+
+
+class SubscriptionCache:
+    """
+    Args:
+        ttl: Seconds before an entry is re-fetched from Stripe on read
+        max_entries: LRU bound on cached subscriptions
+        fetcher: Callable(subscription_id) -> state dict (defaults to Stripe)
+    """
+
+    def __init__(self, ttl: float = 900.0, max_entries: int = 5000, fetcher=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.fetcher = fetcher or _retrieve
+        self._entries: OrderedDict = OrderedDict()  # id -> (state, fetched_at, event_created)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.event_updates = 0
+
+    def get(self, subscription_id: str, max_age: float | None = None) -> dict | None:
+        """
+        Current state for a subscription, fetching it on a miss or when stale.
+
+        Args:
+            subscription_id: Stripe subscription id
+            max_age: Override the TTL for this read (0 forces a fetch)
+        """
+        if not subscription_id:
+            return None
+        limit = self.ttl if max_age is None else max_age
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(subscription_id)
+            if entry is not None and now - entry[1] < limit:
+                self._entries.move_to_end(subscription_id)
+                self.hits += 1
+                return dict(entry[0])
+            self.misses += 1
+
+        state = self.fetcher(subscription_id)
+        if state is not None:
+            self._store(subscription_id, state)
+        return dict(state) if state is not None else None
+
+    def _store(self, subscription_id: str, state: dict, event_created: int | None = None) -> None:
+        if event_created is None:
+            # Fetched just now, so events created before this moment are older
+            event_created = int(time.time())
+        with self._lock:
+            self._entries[subscription_id] = (dict(state), time.monotonic(), event_created)
+            self._entries.move_to_end(subscription_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, obj) -> dict:
+        """Store a subscription we just received from Stripe (e.g. after modify)."""
+        state = subscription_state(obj)
+        if state.get("id"):
+            self._store(state["id"], state)
+        return state
+
+    def apply_event(self, event: dict) -> bool:
+        """
+        Update from a customer.subscription.* webhook event.
+
+        Events older than the one that last set the entry are ignored, since
+        Stripe does not guarantee delivery order.
+        """
+        if not (event.get("type") or "").startswith("customer.subscription."):
+            return False
+        state = subscription_state(event["data"]["object"])
+        subscription_id = state.get("id")
+        if not subscription_id:
+            return False
+        created = int(event.get("created") or 0)
+        with self._lock:
+            entry = self._entries.get(subscription_id)
+            if entry is not None and entry[2] > created:
+                return False
+            self.event_updates += 1
+        self._store(subscription_id, state, created)
+        return True
+
+    def invalidate(self, subscription_id: str) -> None:
+        with self._lock:
+            self._entries.pop(subscription_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "event_updates": self.event_updates,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_subscription_cache() -> SubscriptionCache:
+    """Get the shared subscription cache (created once per process)."""
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = SubscriptionCache(
+                    ttl=float(os.getenv("SUBSCRIPTION_CACHE_TTL", "900")),
+                    max_entries=int(os.getenv("SUBSCRIPTION_CACHE_SIZE", "5000")),
+                )
+    return _CACHE
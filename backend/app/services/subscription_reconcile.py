@@ -0,0 +1,244 @@
+"""
+Bulk subscription reconciliation.
+
+Pages through every Stripe subscription with the list API (100 per call),
+pages through the profiles that reference a subscription, and writes back only
+the rows whose subscription_* columns disagree with Stripe, in batched upserts.
+Each run returns a report of the corrections it made.
+
+Runs inside the app every SUBSCRIPTION_RECONCILE_INTERVAL seconds (default
+3600; this is what repairs profiles that drifted from Stripe, e.g. after a
+missed webhook), in the one worker per host elected by app.utils.leader. It
+can also run on demand (e.g. from cron):
+
+    python -m app.services.subscription_reconcile [--dry-run]
+"""
+import os
+import sys
+import json
+import time
+import threading
+import logging
+
+import stripe
+
+from app.utils.supabase_client import get_supabase
+from app.services.profile_cache import get_profile_cache
+from app.services.subscription_cache import get_subscription_cache, period_end
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 100
+WRITE_BATCH = 200
+
+_ENDED = ("canceled", "incomplete_expired")
+_LIVE = ("active", "trialing")
+
+
+def expected_columns(sub: dict | None, current: dict) -> dict:
+    """
+    The profile subscription columns implied by a Stripe subscription state.
+
+    Statuses outside the app's active / cancelling / cancelled vocabulary
+    (past_due, unpaid, ...) keep the stored status and only sync period_end.
+    """
+    if sub is None or sub.get("status") in _ENDED:
+        if current.get("subscription_status") in ("active", "cancelling"):
+            return {"subscription_id": None, "subscription_status": "cancelled"}
+        return {}
+
+    expected = {}
+    if sub.get("status") in _LIVE:
+        expected["subscription_status"] = "cancelling" if sub.get("cancel_at_period_end") else "active"
+    end = period_end(sub)
+    if end:
+        expected["subscription_period_end"] = end
+    return expected
+
+
+def _diff(row: dict, expected: dict) -> dict:
+    changes = {}
+    for column, value in expected.items():
+        if row.get(column) != value:
+            changes[column] = value
+    return changes
+
+
+def _batches(rows: list):
+    """
+    Split rows into write batches that share one column set.
+
+    A bulk upsert fills columns missing from a row with null, so rows that
+    change different columns must not be mixed in one request.
+    """
+    groups: dict = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    for group in groups.values():
+        for i in range(0, len(group), WRITE_BATCH):
+            yield group[i:i + WRITE_BATCH]
+
+
+def list_subscriptions():
+    """All subscriptions in the account, fetched a page at a time."""
+    return stripe.Subscription.list(status="all", limit=PAGE_SIZE).auto_paging_iter()
+
+
+def _lookup(cache, subscription_id: str) -> dict | None:
+    try:
+        return cache.get(subscription_id, max_age=0)
+    except stripe.error.InvalidRequestError:
+        return None
+
+
+def _profile_pages(supabase):
+    start = 0
+    while True:
+        res = (
+            supabase.table("profiles")
+            .select("user_id, subscription_id, subscription_status, subscription_period_end")
+            .not_.is_("subscription_id", "null")
+            .order("user_id")
+            .range(start, start + PAGE_SIZE - 1)
+            .execute()
+        )
+        rows = getattr(res, "data", None) or []
+        if rows:
+            yield rows
+        if len(rows) < PAGE_SIZE:
+            return
+        start += PAGE_SIZE
+
+
+def reconcile(subscriptions=None, profile_pages=None, write=None, dry_run: bool = False) -> dict:
+    """
+    Diff Stripe subscriptions against profiles and fix the rows that drifted.
+
+    Args:
+        subscriptions: Iterable of Stripe subscription objects (defaults to the list API)
+        profile_pages: Iterable of profile row lists (defaults to paged Supabase selects)
+        write: Callable(list_of_rows) for one batched write (defaults to a profiles upsert)
+        dry_run: Compute the report without writing anything
+
+    Returns:
+        Report dict with counts and the list of corrections
+    """
+    started = time.monotonic()
+    supabase = None
+    if profile_pages is None or write is None:
+        supabase = get_supabase()
+        if not supabase:
+            raise RuntimeError("supabase not configured")
+    if subscriptions is None:
+        subscriptions = list_subscriptions()
+    if profile_pages is None:
+        profile_pages = _profile_pages(supabase)
+    if write is None:
+        def write(rows):
+            supabase.table("profiles").upsert(rows, on_conflict="user_id").execute()
+
+    cache = get_subscription_cache()
+    stripe_state = {}
+    listed = 0
+    for sub in subscriptions:
+        state = cache.put(sub)
+        if state.get("id"):
+            stripe_state[state["id"]] = state
+            listed += 1
+
+    checked = 0
+    corrections = []
+    pending = []
+    for page in profile_pages:
+        for row in page:
+            checked += 1
+            subscription_id = row.get("subscription_id")
+            if subscription_id not in stripe_state:
+                # Created after the listing passed it, or deleted from Stripe
+                stripe_state[subscription_id] = _lookup(cache, subscription_id)
+            changes = _diff(row, expected_columns(stripe_state[subscription_id], row))
+            if not changes:
+                continue
+            corrections.append({
+                "user_id": row["user_id"],
+                "subscription_id": row.get("subscription_id"),
+                "before": {column: row.get(column) for column in changes},
+                "after": changes,
+            })
+            pending.append({"user_id": row["user_id"], **changes})
+
+    written = 0
+    errors = 0
+    if not dry_run:
+        profiles = get_profile_cache()
+        for batch in _batches(pending):
+            try:
+                write(batch)
+            except Exception:
+                logger.exception("reconcile: batch of %d profile updates failed", len(batch))
+                errors += len(batch)
+                continue
+            written += len(batch)
+            for row in batch:
+                profiles.update(row["user_id"], {k: v for k, v in row.items() if k != "user_id"})
+
+    report = {
+        "stripe_subscriptions": listed,
+        "profiles_checked": checked,
+        "corrections": corrections,
+        "written": written,
+        "errors": errors,
+        "dry_run": dry_run,
+        "seconds": round(time.monotonic() - started, 3),
+    }
+    logger.info(
+        "reconcile: %d subscriptions, %d profiles, %d corrections (%d written, %d failed)",
+        report["stripe_subscriptions"], checked, len(corrections), written, errors,
+    )
+    return report
+
+
+_SCHEDULER = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def start_reconcile_schedule(interval: float | None = None) -> bool:
+    """
+    Run reconcile() every `interval` seconds on a daemon thread.
+
+    Reads SUBSCRIPTION_RECONCILE_INTERVAL when interval is None; 0 disables.
+    The first run comes SUBSCRIPTION_RECONCILE_DELAY seconds after start
+    (default 60), so redeploys do not postpone it by a whole interval.
+    Returns True if the scheduler is running.
+    """
+    global _SCHEDULER
+    if interval is None:
+        interval = float(os.getenv("SUBSCRIPTION_RECONCILE_INTERVAL", "3600"))
+    if interval <= 0 or not stripe.api_key:
+        return False
+    first = min(interval, float(os.getenv("SUBSCRIPTION_RECONCILE_DELAY", "60")))
+
+    def loop():
+        stop = threading.Event()
+        wait = first
+        while not stop.wait(wait):
+            wait = interval
+            try:
+                reconcile()
+            except Exception:
+                logger.exception("scheduled subscription reconcile failed")
+
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None or not _SCHEDULER.is_alive():
+            _SCHEDULER = threading.Thread(target=loop, name="subscription-reconcile", daemon=True)
+            _SCHEDULER.start()
+    return True
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+    print(json.dumps(reconcile(dry_run="--dry-run" in sys.argv[1:]), indent=2, default=str))
@@ -0,0 +1,156 @@
+"""
+Write-behind persistence queue.
+
+Rows are accepted without blocking the request, collected by a background
+thread and written as one bulk insert per batch (every `flush_interval`
+seconds or as soon as `batch_size` rows are waiting). Failed batches are
+retried with exponential backoff; anything still queued is flushed at process
+exit.
+"""
+import os
+import time
+import queue
+import atexit
+import threading
+import logging
+
+from app.utils.supabase_client import get_supabase
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """
+    Background batcher for bulk inserts.
+
+    Args:
+        sink: Callable(list_of_rows) that persists one batch
+        flush_interval: Max seconds a row waits before its batch is written
+        batch_size: Write immediately once this many rows are waiting
+        max_retries: Attempts per batch before it is dropped (and logged)
+        backoff: Initial retry delay in seconds, doubled per attempt
+        max_queue: Queue bound; when full, rows are written inline instead
+    """
+
+    def __init__(self, sink, flush_interval: float = 1.0, batch_size: int = 50,
+                 max_retries: int = 5, backoff: float = 0.5, max_queue: int = 10000,
+                 name: str = "write-behind"):
+        self.sink = sink
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.name = name
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, row: dict) -> None:
+        """Queue a row for the next batch (never blocks the caller on the DB)."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            logger.warning("%s queue full; writing row inline", self.name)
+            self._write([row])
+
+    def _drain(self, first=None) -> list:
+        batch = [] if first is None else [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: list) -> bool:
+        delay = self.backoff
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                self.sink(batch)
+                self.written += len(batch)
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error("%s dropping %d rows after %d attempts: %s", self.name, len(batch), attempt, e)
+                    self.dropped += len(batch)
+                    return False
+                logger.warning("%s batch failed (attempt %d): %s", self.name, attempt, e)
+                if self._stop.wait(delay):
+                    # Shutting down: keep retrying without sleeping through exit
+                    delay = 0
+                delay *= 2
+        return False
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            # Give the batch a moment to fill unless it is already full
+            deadline = time.monotonic() + self.flush_interval
+            while self._queue.qsize() + 1 < self.batch_size and time.monotonic() < deadline:
+                if self._stop.wait(0.05):
+                    break
+            self._write(self._drain(first))
+        self.flush()
+
+    def flush(self) -> None:
+        """Write everything currently queued (called on shutdown)."""
+        while True:
+            batch = self._drain()
+            if not batch:
+                return
+            self._write(batch)
+
+    def close(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self) -> dict:
+        return {"queued": self._queue.qsize(), "written": self.written, "dropped": self.dropped}
+
+
+def _supabase_insert(table: str):
+    def sink(rows: list) -> None:
+        supabase = get_supabase()
+        if not supabase:
+            raise RuntimeError("supabase not configured")
+        supabase.table(table).insert(rows).execute()
+    return sink
+
+
+_ANALYSIS_WRITER = None
+_WRITER_LOCK = threading.Lock()
+
+
+def get_analysis_writer() -> WriteBehindQueue:
+    """Shared write-behind queue for the `analyses` history table."""
+    global _ANALYSIS_WRITER
+    if _ANALYSIS_WRITER is None:
+        with _WRITER_LOCK:
+            if _ANALYSIS_WRITER is None:
+                _ANALYSIS_WRITER = WriteBehindQueue(
+                    _supabase_insert("analyses"),
+                    flush_interval=float(os.getenv("ANALYSIS_WRITE_INTERVAL", "1.0")),
+                    batch_size=int(os.getenv("ANALYSIS_WRITE_BATCH", "50")),
+                    max_retries=int(os.getenv("ANALYSIS_WRITE_RETRIES", "5")),
+                    name="analyses-writer",
+                )
+                atexit.register(_ANALYSIS_WRITER.close)
+    return _ANALYSIS_WRITER
@@ -0,0 +1,258 @@
+"""
+Local Supabase JWT verification with a token -> identity cache.
+
+Access tokens are verified in-process against the project's JWT secret (HS256)
+or its cached JWKS (asymmetric signing keys). Verified identities are cached
+until the token expires (capped by AUTH_CACHE_TTL). supabase.auth.get_user()
+is only called when no local key is available to check the token.
+
+Blueprints call current_identity(), which resolves the request's bearer token
+once and keeps the result on flask.g.
+"""
+import os
+import time
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import jwt
+from flask import g, request
+
+from app.utils.supabase_client import get_supabase
+
+logger = logging.getLogger(__name__)
+
+_HMAC_ALGS = ("HS256", "HS384", "HS512")
+_ASYM_ALGS = ("RS256", "RS384", "RS512", "ES256", "ES384", "ES512", "EdDSA")
+
+
+@dataclass
+class Identity:
+    uid: str
+    email: str | None = None
+    metadata: dict = field(default_factory=dict)
+    expires_at: float | None = None
+
+
+class TokenVerifier:
+    """
+    Verifies Supabase access tokens locally and caches the resulting identity.
+
+    Args:
+        jwt_secret: Legacy HS256 signing secret, if the project uses one
+        jwks_url: JWKS endpoint for asymmetric signing keys
+        audience: Expected "aud" claim
+        cache_size: Maximum number of cached tokens
+        cache_ttl: Upper bound in seconds on how long an identity is cached
+        remote_lookup: Callable(token) -> Identity | None used as fallback
+        jwks_client: Pre-built PyJWKClient (overrides jwks_url)
+    """
+
+    def __init__(self, jwt_secret: str | None = None, jwks_url: str | None = None,
+                 audience: str | None = "authenticated", cache_size: int = 10000,
+                 cache_ttl: float = 300.0, remote_lookup=None, jwks_client=None):
+        self.jwt_secret = jwt_secret
+        self.audience = audience
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.remote_lookup = remote_lookup
+        self._jwks = jwks_client
+        if self._jwks is None and jwks_url:
+            self._jwks = jwt.PyJWKClient(jwks_url, cache_keys=True, lifespan=3600, timeout=5)
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.cache_hits = 0
+        self.remote_calls = 0
+
+    @staticmethod
+    def _cache_key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def _cache_get(self, key: str) -> Identity | None:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            identity, valid_until = entry
+            if valid_until <= time.time():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return identity
+
+    def _cache_put(self, key: str, identity: Identity) -> None:
+        valid_until = time.time() + self.cache_ttl
+        if identity.expires_at:
+            valid_until = min(valid_until, identity.expires_at)
+        with self._lock:
+            self._cache[key] = (identity, valid_until)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _signing_key(self, token: str, alg: str):
+        """Return the key to verify with, or None if none is available locally."""
+        if alg in _HMAC_ALGS:
+            return self.jwt_secret
+        if alg in _ASYM_ALGS and self._jwks is not None:
+            try:
+                return self._jwks.get_signing_key_from_jwt(token).key
+            except jwt.PyJWKClientError as e:
+                logger.warning("JWKS lookup failed: %s", e)
+        return None
+
+    def _verify_local(self, token: str):
+        """
+        Returns (identity, decided). decided is False when the token could not
+        be checked locally and the caller should fall back to the remote call.
+        """
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.InvalidTokenError:
+            return None, True
+
+        alg = header.get("alg") or ""
+        key = self._signing_key(token, alg)
+        if key is None:
+            return None, False
+
+        try:
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=[alg],
+                audience=self.audience,
+                options={"require": ["exp", "sub"], "verify_aud": self.audience is not None},
+            )
+        except jwt.InvalidTokenError:
+            return None, True
+
+        self.local_hits += 1
+        return Identity(
+            uid=claims["sub"],
+            email=claims.get("email"),
+            metadata=claims.get("user_metadata") or {},
+            expires_at=float(claims["exp"]),
+        ), True
+
+    def verify(self, token: str) -> Identity | None:
+        """Resolve a bearer token to an Identity, or None if it is not valid."""
+        if not token:
+            return None
+
+        key = self._cache_key(token)
+        identity = self._cache_get(key)
+        if identity is not None:
+            return identity
+
+        identity, decided = self._verify_local(token)
+        if not decided and self.remote_lookup is not None:
+            self.remote_calls += 1
+            identity = self.remote_lookup(token)
+            if identity is not None and identity.expires_at is None:
+                identity.expires_at = _unverified_exp(token)
+
+        if identity is not None:
+            self._cache_put(key, identity)
+        return identity
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._cache)
+        return {
+            "cached": size,
+            "cache_hits": self.cache_hits,
+            "local_verifications": self.local_hits,
+            "remote_calls": self.remote_calls,
+        }
+
+
+def _unverified_exp(token: str) -> float | None:
+    try:
+        exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+        return float(exp) if exp else None
+    except Exception:
+        return None
+
+
+def remote_get_user(token: str) -> Identity | None:
+    """Fallback: ask Supabase Auth who the token belongs to."""
+    supabase = get_supabase()
+    if not supabase:
+        return None
+    user = None
+    try:
+        if hasattr(supabase.auth, "get_user"):
+            resp = supabase.auth.get_user(token)
+        elif hasattr(supabase.auth, "api") and hasattr(supabase.auth.api, "get_user"):
+            resp = supabase.auth.api.get_user(token)
+        else:
+            return None
+        if isinstance(resp, dict):
+            user = resp.get("user") or (resp.get("data") or {}).get("user")
+        else:
+            user = getattr(resp, "user", None)
+    except Exception as e:
+        logger.warning("supabase get_user failed: %s", type(e).__name__)
+        return None
+    if not user:
+        return None
+    if isinstance(user, dict):
+        uid, email, meta = user.get("id"), user.get("email"), user.get("user_metadata") or {}
+    else:
+        uid, email, meta = getattr(user, "id", None), getattr(user, "email", None), getattr(user, "user_metadata", {}) or {}
+    if not uid:
+        return None
+    return Identity(uid=uid, email=email, metadata=meta)
+
+
+_VERIFIER = None
+_VERIFIER_LOCK = threading.Lock()
+
+
+def get_token_verifier() -> TokenVerifier:
+    """Get the shared verifier (created once per process from env config)."""
+    global _VERIFIER
+    if _VERIFIER is None:
+        with _VERIFIER_LOCK:
+            if _VERIFIER is None:
+                supabase_url = (os.getenv("SUPABASE_URL") or "").rstrip("/")
+                jwks_url = os.getenv("SUPABASE_JWKS_URL") or (
+                    f"{supabase_url}/auth/v1/.well-known/jwks.json" if supabase_url else None
+                )
+                _VERIFIER = TokenVerifier(
+                    jwt_secret=os.getenv("SUPABASE_JWT_SECRET") or None,
+                    jwks_url=jwks_url,
+                    audience=os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated") or None,
+                    cache_size=int(os.getenv("AUTH_CACHE_SIZE", "10000")),
+                    cache_ttl=float(os.getenv("AUTH_CACHE_TTL", "300")),
+                    remote_lookup=remote_get_user,
+                )
+    return _VERIFIER
+
+
+def bearer_token() -> str | None:
+    auth = request.headers.get("Authorization") or ""
+    if not auth.lower().startswith("bearer "):
+        return None
+    return auth.split(" ", 1)[1].strip() or None
+
+
+def current_identity() -> Identity | None:
+    """
+    Identity for the current request's bearer token (resolved once per request).
+
+    Also exposes g.user_id, g.user_email and g.user_metadata.
+    """
+    if "identity" not in g:
+        token = bearer_token()
+        identity = get_token_verifier().verify(token) if token else None
+        g.identity = identity
+        g.user_id = identity.uid if identity else None
+        g.user_email = identity.email if identity else None
+        g.user_metadata = identity.metadata if identity else {}
+    return g.identity
@@ -1,12 +1,112 @@
 import os
+import re
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
 
+logger = logging.getLogger(__name__)
+
 _EMB = None
 
+# text -> normalized vector for encode_cached() (per process)
+_VEC_CACHE: OrderedDict = OrderedDict()
+_VEC_LOCK = threading.Lock()
+_VEC_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "20000"))
+
+def set_torch_threads(n: int) -> None:
+    """Intra-op threads for this process (call after fork, before the first encode)."""
+    torch.set_num_threads(max(1, n))
+
+
+def _weights_path(model_name: str) -> str:
+    # Not the temp dir: /tmp is often tmpfs, where the "mapped" file is RAM too
+    base = os.getenv("EMBED_WEIGHTS_DIR") or os.path.join(
+        os.getenv("HF_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "resume-checker-weights"
+    )
+    return os.path.join(base, re.sub(r"[^\w.-]", "_", model_name) + ".pt")
+
+
+def _on_tmpfs(path: str) -> bool:
+    """True if `path` lives on a RAM-backed filesystem (Linux only; False if unknown)."""
+    path = os.path.realpath(path)
+    best, fstype = "", None
+    try:
+        with open("/proc/mounts", "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 3:
+                    continue
+                mount = parts[1].replace("\\040", " ")
+                if (path == mount or path.startswith(mount.rstrip("/") + "/")) and len(mount) > len(best):
+                    best, fstype = mount, parts[2]
+    except OSError:
+        return False
+    return fstype in ("tmpfs", "ramfs")
+
+
+def _map_weights(model, model_name: str) -> None:
+    """
+    Back the model's tensors with a read-only mmap of its state dict.
+
+    The weights then live in the page cache instead of each process's heap,
+    so gunicorn workers forked from a preloaded master (and spawned analysis
+    workers) share one physical copy. The file is written on first use.
+    """
+    path = _weights_path(model_name)
+    if _on_tmpfs(os.path.dirname(path)):
+        logger.warning(
+            "EMBED_WEIGHTS_DIR %s is on tmpfs; mapped weights still use RAM (point it at a disk path)",
+            os.path.dirname(path),
+        )
+    try:
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            torch.save(model.state_dict(), tmp)
+            os.replace(tmp, path)
+        state = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+        model.load_state_dict(state, assign=True)
+    except Exception as e:
+        logger.warning("Embedding weights not memory-mapped (%s); keeping them in process memory", e)
+
+
 def get_embedder():
     global _EMB
     if _EMB is None:
         model_name = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
-        _EMB = SentenceTransformer(model_name)
-        _EMB.encode("warmup", convert_to_tensor=True, normalize_embeddings=True)
+        model = SentenceTransformer(model_name)
+        model.eval()
+        if os.getenv("EMBED_MMAP_WEIGHTS", "1") == "1":
+            _map_weights(model, model_name)
+        model.encode("warmup", convert_to_tensor=True, normalize_embeddings=True)
+        _EMB = model
     return _EMB
+
+def encode_cached(texts):
+    """
+    Normalized embeddings for `texts` (one row per text), encoding only the
+    texts not seen recently by this process (e.g. the same resume sentences
+    across prompt builds). The cache is per process: spawned analysis workers
+    (ANALYSIS_WORKERS > 0) and other gunicorn workers do not see it.
+    """
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    with _VEC_LOCK:
+        found = {t: _VEC_CACHE[t] for t in texts if t in _VEC_CACHE}
+        for t in found:
+            _VEC_CACHE.move_to_end(t)
+    todo = list(dict.fromkeys(t for t in texts if t not in found))
+    if todo:
+        vecs = np.asarray(get_embedder().encode(todo, normalize_embeddings=True), dtype=np.float32)
+        with _VEC_LOCK:
+            for t, v in zip(todo, vecs):
+                _VEC_CACHE[t] = v
+                found[t] = v
+            while len(_VEC_CACHE) > _VEC_CACHE_SIZE:
+                _VEC_CACHE.popitem(last=False)
+    return np.stack([found[t] for t in texts])
@@ -0,0 +1,31 @@
+import io
+from flask import Response, request, send_file
+
+DOCX_MIMETYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+def client_has(etag: str) -> bool:
+    """True if the request's If-None-Match already names this ETag."""
+    return request.if_none_match.contains(etag)
+
+
+def not_modified(etag: str) -> Response:
+    resp = Response(status=304)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+def send_bytes(data: bytes, download_name: str, mimetype: str, etag: str | None = None):
+    """send_file for in-memory bytes, tagged so repeat downloads can revalidate."""
+    resp = send_file(
+        io.BytesIO(data),
+        as_attachment=True,
+        download_name=download_name,
+        mimetype=mimetype,
+        etag=etag or False,
+        conditional=False,
+    )
+    if etag:
+        resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
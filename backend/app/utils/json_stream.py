@@ -0,0 +1,128 @@
+"""
+Incremental JSON scanner for streamed LLM output.
+
+Feed text chunks as they arrive; each call returns the values that became
+complete in that chunk, as (path, value) pairs:
+
+    - ("key",)        a member of the top-level object
+    - ("key", index)  an element of a top-level array member
+
+so callers can act on e.g. each suggestions[] object as soon as its closing
+brace arrives, without waiting for the whole document.
+"""
+import json
+
+
+class _Container:
+    __slots__ = ("kind", "key", "index", "expect", "scalar_start")
+
+    def __init__(self, kind: str):
+        self.kind = kind            # "obj" | "arr"
+        self.key = None
+        self.index = 0
+        self.expect = "key" if kind == "obj" else "value"
+        self.scalar_start = None
+
+
+class IncrementalJsonParser:
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._stack: list = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+        self._tracked: dict = {}  # stack depth -> (path, start)
+
+    def _path(self):
+        return tuple(c.key if c.kind == "obj" else c.index for c in self._stack)
+
+    def _wanted(self) -> bool:
+        depth = len(self._stack)
+        return depth == 1 or (depth == 2 and self._stack[1].kind == "arr")
+
+    def _begin_value(self, i: int) -> None:
+        if self._stack and self._wanted():
+            self._tracked[len(self._stack)] = (self._path(), i)
+        if self._stack and self._stack[-1].kind == "obj":
+            self._stack[-1].expect = "comma"
+
+    def _end_value(self, end: int, out: list) -> None:
+        tracked = self._tracked.pop(len(self._stack), None)
+        if tracked is None:
+            return
+        path, start = tracked
+        try:
+            out.append((path, json.loads(self._text[start:end])))
+        except ValueError:
+            pass
+
+    def _finish_scalar(self, i: int, out: list) -> None:
+        top = self._stack[-1] if self._stack else None
+        if top is not None and top.scalar_start is not None:
+            top.scalar_start = None
+            self._end_value(i, out)
+
+    def feed(self, chunk: str) -> list:
+        """Consume more text; returns the (path, value) pairs completed by it."""
+        out: list = []
+        self._text += chunk
+        text = self._text
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._string_is_key:
+                        self._stack[-1].key = json.loads(text[self._string_start:i + 1])
+                        self._stack[-1].expect = "colon"
+                    else:
+                        self._end_value(i + 1, out)
+                continue
+
+            if c.isspace():
+                continue
+            top = self._stack[-1] if self._stack else None
+
+            if c == '"' and top is not None and top.kind == "obj" and top.expect == "key":
+                self._in_string, self._string_is_key, self._string_start = True, True, i
+                continue
+            if c == ":" and top is not None:
+                top.expect = "value"
+                continue
+            if c == ",":
+                self._finish_scalar(i, out)
+                if top is not None:
+                    if top.kind == "obj":
+                        top.expect = "key"
+                    else:
+                        top.index += 1
+                continue
+            if c in "}]":
+                self._finish_scalar(i, out)
+                self._stack.pop()
+                self._end_value(i + 1, out)
+                continue
+            if top is not None and top.scalar_start is not None:
+                continue  # inside a number / literal
+
+            self._begin_value(i)
+            if c == "{":
+                self._stack.append(_Container("obj"))
+            elif c == "[":
+                self._stack.append(_Container("arr"))
+            elif c == '"':
+                self._in_string, self._string_is_key, self._string_start = True, False, i
+            elif top is not None:
+                top.scalar_start = i
+        self._pos = len(text)
+        return out
+
+    @property
+    def text(self) -> str:
+        return self._text
@@ -0,0 +1,112 @@
+"""
+One process per host for background singletons.
+
+Every gunicorn worker runs start_background_services(), but jobs such as the
+Stripe reconcile schedule or analysis job recovery must run once per host,
+not once per worker. The worker that takes an exclusive flock on
+LEADER_LOCK_PATH runs them; the others retry every LEADER_RETRY seconds and
+take over when the holder exits (the kernel drops the lock with the process).
+
+The lock file must be on a filesystem shared by all workers of the host
+(any local path is; it does not need to survive restarts).
+"""
+import os
+import tempfile
+import threading
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows dev server: a single process, always the leader
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLock:
+    """
+    Args:
+        path: Lock file (created if missing)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        self._lock = threading.Lock()
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """Take the lock without blocking. True if this process holds it now."""
+        with self._lock:
+            if self._fd is not None:
+                return True
+            if fcntl is None:
+                self._fd = -1
+                return True
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+            os.ftruncate(fd, 0)
+            os.write(fd, str(os.getpid()).encode("ascii"))
+            self._fd = fd  # kept open for the life of the process
+            return True
+
+
+_LEADER = None
+_LEADER_LOCK = threading.Lock()
+
+
+def get_leader_lock() -> LeaderLock:
+    """Shared host-wide leader lock (created once per process from env config)."""
+    global _LEADER
+    if _LEADER is None:
+        with _LEADER_LOCK:
+            if _LEADER is None:
+                path = os.getenv("LEADER_LOCK_PATH") or os.path.join(
+                    tempfile.gettempdir(), "resume-checker", "leader.lock"
+                )
+                _LEADER = LeaderLock(path)
+    return _LEADER
+
+
+def run_as_leader(on_elected, retry: float | None = None) -> bool:
+    """
+    Call `on_elected()` once, in whichever process on the host holds the lock.
+
+    Tries now; if another process is the leader, keeps trying on a daemon
+    thread so this process takes over when that one exits.
+
+    Returns:
+        True if this process was elected right away
+    """
+    lock = get_leader_lock()
+    if retry is None:
+        retry = float(os.getenv("LEADER_RETRY", "15"))
+
+    def elected():
+        logger.info("process %s runs the host-wide background jobs", os.getpid())
+        try:
+            on_elected()
+        except Exception:
+            logger.exception("leader startup failed")
+
+    if lock.try_acquire():
+        elected()
+        return True
+
+    def wait_for_turn():
+        stop = threading.Event()
+        while not stop.wait(retry):
+            if lock.try_acquire():
+                elected()
+                return
+
+    threading.Thread(target=wait_for_turn, name="leader-election", daemon=True).start()
+    return False
@@ -0,0 +1,81 @@
+"""
+Per-process memory breakdown from /proc (Linux).
+
+PSS (proportional set size) charges each shared page to the processes mapping
+it in equal parts, so with a preloaded gunicorn master the workers' PSS stays
+well below their RSS: the model weights and static tables are counted once
+across all of them instead of once per worker.
+
+    python -m app.utils.memory_report <gunicorn master pid>
+
+prints the master and every worker; GET /metrics includes the numbers for the
+worker that served it.
+"""
+import os
+import sys
+import json
+
+_FIELDS = {
+    "Rss": "rss_mb",
+    "Pss": "pss_mb",
+    "Shared_Clean": "shared_clean_mb",
+    "Shared_Dirty": "shared_dirty_mb",
+    "Private_Clean": "private_clean_mb",
+    "Private_Dirty": "private_dirty_mb",
+    "Swap": "swap_mb",
+}
+
+
+def process_memory(pid="self") -> dict:
+    """
+    Memory of one process in MB (empty dict where /proc is not available).
+
+    Returns:
+        {pid, rss_mb, pss_mb, shared_clean_mb, shared_dirty_mb,
+         private_clean_mb, private_dirty_mb, swap_mb}
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            lines = f.readlines()
+    except OSError:
+        return {}
+    out = {"pid": os.getpid() if pid == "self" else int(pid)}
+    for line in lines:
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].rstrip(":") in _FIELDS:
+            out[_FIELDS[parts[0].rstrip(":")]] = round(int(parts[1]) / 1024, 1)
+    return out
+
+
+def child_pids(pid: int) -> list:
+    children = []
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return children
+    for tid in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children", "r") as f:
+                children.extend(int(c) for c in f.read().split())
+        except OSError:
+            continue
+    return sorted(set(children))
+
+
+def report(master_pid: int) -> dict:
+    """Memory of a gunicorn master and its workers, with totals."""
+    workers = [m for m in (process_memory(pid) for pid in child_pids(master_pid)) if m]
+    master = process_memory(master_pid)
+    everyone = [master] + workers if master else workers
+    return {
+        "master": master,
+        "workers": workers,
+        "total_rss_mb": round(sum(m.get("rss_mb", 0) for m in everyone), 1),
+        "total_pss_mb": round(sum(m.get("pss_mb", 0) for m in everyone), 1),
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("usage: python -m app.utils.memory_report <gunicorn master pid>")
+    print(json.dumps(report(int(sys.argv[1])), indent=2))
@@ -0,0 +1,62 @@
+"""
+Where the app keeps its local state files.
+
+Each file has its own env var (e.g. STRIPE_EVENT_LOG_PATH); when that is unset
+it goes under DATA_DIR. Some files must survive a restart, e.g. webhook events
+already acknowledged to Stripe but not processed yet. If neither variable is
+set for one of those, the production server (gunicorn.conf.py) refuses to
+start instead of silently keeping it in the container's temp dir; the dev
+server falls back to the temp dir with a warning.
+"""
+import os
+import tempfile
+import logging
+
+logger = logging.getLogger(__name__)
+
+# env var -> file name under DATA_DIR, for state that must not be lost on restart
+DURABLE_FILES = {
+    "STRIPE_EVENT_LOG_PATH": "stripe_events.sqlite3",
+    "ANALYSIS_JOB_DB_PATH": "analysis_jobs.sqlite3",  # reserved credits of unfinished jobs
+}
+
+
+class StorageNotConfigured(Exception):
+    """A durable state file has no configured location."""
+    pass
+
+
+def state_path(env: str, filename: str) -> str:
+    """
+    Path of a state file: $`env`, else $DATA_DIR/`filename`, else the temp dir.
+
+    Args:
+        env: Env var naming this file
+        filename: File name under DATA_DIR / the temp dir
+    """
+    path = os.getenv(env)
+    if path:
+        return path
+    data_dir = os.getenv("DATA_DIR")
+    if data_dir:
+        return os.path.join(data_dir, filename)
+    return os.path.join(tempfile.gettempdir(), "resume-checker", filename)
+
+
+def check_durable_storage(strict: bool) -> None:
+    """
+    Make sure every durable state file has a configured location.
+
+    Raises:
+        StorageNotConfigured: `strict` and some file would land in the temp dir
+    """
+    missing = [env for env in DURABLE_FILES if not os.getenv(env) and not os.getenv("DATA_DIR")]
+    if not missing:
+        return
+    message = (
+        f"{', '.join(missing)} not set and no DATA_DIR: state that must survive restarts "
+        "would be kept in the temp dir"
+    )
+    if strict:
+        raise StorageNotConfigured(message + "; point DATA_DIR at persistent storage")
+    logger.warning(message)
@@ -0,0 +1,62 @@
+"""
+Process-wide Supabase client with pooled keep-alive HTTP connections.
+
+Every blueprint goes through get_supabase() so the service-role client, its
+httpx connection pool and TLS sessions are created once per process and shared
+by all request threads.
+"""
+import os
+import threading
+import logging
+
+import httpx
+from supabase import create_client, ClientOptions
+
+logger = logging.getLogger(__name__)
+
+_CLIENT = None
+_LOCK = threading.Lock()
+
+
+def _http_client() -> httpx.Client:
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("SUPABASE_HTTP_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv("SUPABASE_HTTP_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=float(os.getenv("SUPABASE_HTTP_KEEPALIVE_EXPIRY", "60")),
+    )
+    timeout = httpx.Timeout(
+        float(os.getenv("SUPABASE_HTTP_TIMEOUT", "10")),
+        connect=float(os.getenv("SUPABASE_HTTP_CONNECT_TIMEOUT", "5")),
+    )
+    return httpx.Client(limits=limits, timeout=timeout, http2=False)
+
+
+def _build_client(url: str, key: str):
+    # Service-role client never signs in, so skip session persistence/refresh
+    # and keep it stateless across threads.
+    base = dict(auto_refresh_token=False, persist_session=False)
+    try:
+        options = ClientOptions(httpx_client=_http_client(), **base)
+    except TypeError:
+        # Older supabase-py without httpx_client support: still share one client
+        logger.info("supabase-py has no httpx_client option; using default transport")
+        options = ClientOptions(**base)
+    return create_client(url, key, options=options)
+
+
+def get_supabase():
+    """
+    Get the shared service-role Supabase client.
+
+    Returns None when SUPABASE_URL / SUPABASE_SERVICE_ROLE_KEY are not set.
+    """
+    global _CLIENT
+    if _CLIENT is None:
+        url = os.getenv("SUPABASE_URL")
+        key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        if not url or not key:
+            return None
+        with _LOCK:
+            if _CLIENT is None:
+                _CLIENT = _build_client(url, key)
+    return _CLIENT
@@ -0,0 +1,59 @@
+"""
+Gunicorn settings: preload the app in the master, fork workers from it.
+
+The SentenceTransformer, KeyBERT and the export templates are loaded once in
+the master before fork; workers share those pages copy-on-write (the model
+weights are additionally mmap'd from disk, see app.utils.embeddings) instead
+of each loading its own copy. Threads and connections are started per worker
+in post_fork; jobs that must run once per host (Stripe event backlog,
+reconcile schedule, catalog sync, analysis job recovery) run only in the
+worker holding the leader lock (app.utils.leader).
+
+The mmap only saves memory if EMBED_WEIGHTS_DIR is on a disk-backed
+filesystem: on tmpfs the weights file itself is held in RAM.
+
+    WEB_CONCURRENCY   worker processes (default 2)
+    GUNICORN_THREADS  request threads per worker (default 8; also sizes the
+                      admission budget in app.services.admission)
+    TORCH_THREADS     torch intra-op threads per worker (default: cores / workers)
+    GUNICORN_TIMEOUT  seconds before a worker that stopped heartbeating is killed
+
+Check the sharing with: python -m app.utils.memory_report <master pid>
+"""
+import os
+import gc
+import uuid
+import logging
+
+os.environ.setdefault("APP_PRELOAD", "1")
+# One id per master (kept across config reloads), inherited by every worker;
+# see app.services.analysis_jobs
+os.environ.setdefault("APP_BOOT_ID", uuid.uuid4().hex)
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# Long analyses run as jobs or in request threads; gthread workers keep
+# heartbeating while their threads are busy, so this only catches a hung worker
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_app = True
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the GC's reach, so collections in
+    # the workers do not write to (and un-share) the master's object pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from app import start_background_services
+    from app.utils.embeddings import set_torch_threads
+
+    set_torch_threads(int(os.getenv("TORCH_THREADS") or max(1, (os.cpu_count() or 1) // server.cfg.workers)))
+    start_background_services()
+
+
+def post_worker_init(worker):
+    from app.utils.memory_report import process_memory
+
+    logging.getLogger("gunicorn.error").info("worker %s memory: %s", worker.pid, process_memory())
@@ -0,0 +1,92 @@
+-- Atomic credit ledger RPCs used by app/services/credit_ledger.py.
+-- Run once in the Supabase SQL editor (or via `supabase db push`).
+
+-- Purchases are keyed by their Stripe/promo reference so a grant can only land once.
+-- Older rows may already repeat a reference (webhook replays granted twice);
+-- keep the first and tag the others so the index can be built without
+-- losing the purchase history.
+update public.purchases p
+   set stripe_session_id = p.stripe_session_id || ':dup:' || p.ctid::text
+  from public.purchases q
+ where p.stripe_session_id = q.stripe_session_id
+   and p.ctid > q.ctid;
+
+create unique index if not exists purchases_stripe_session_id_key
+    on public.purchases (stripe_session_id);
+
+-- Take `p_amount` credits if the balance allows it. Returns the new balance,
+-- or null when the user has too few credits (nothing is changed then).
+create or replace function public.reserve_credits(p_user_id uuid, p_amount int default 1)
+returns int
+language sql
+security definer
+set search_path = public
+as $$
+    update public.profiles
+       set credits = credits - p_amount
+     where user_id = p_user_id
+       and credits >= p_amount
+    returning credits;
+$$;
+
+-- Give back credits taken by reserve_credits (e.g. the analysis failed).
+create or replace function public.refund_credits(p_user_id uuid, p_amount int default 1)
+returns int
+language sql
+security definer
+set search_path = public
+as $$
+    update public.profiles
+       set credits = credits + p_amount
+     where user_id = p_user_id
+    returning credits;
+$$;
+
+-- Record a purchase and add its credits in one transaction. Returns the new
+-- balance, or null if a purchase with this reference was already recorded.
+create or replace function public.grant_credits(
+    p_user_id uuid,
+    p_amount int,
+    p_ref text,
+    p_amount_cents int default 0,
+    p_status text default 'COMPLETED'
+)
+returns int
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    new_balance int;
+begin
+    insert into public.profiles (user_id, credits)
+    values (p_user_id, 0)
+    on conflict (user_id) do nothing;
+
+    insert into public.purchases (user_id, amount_cents, credits_granted, status, stripe_session_id)
+    values (p_user_id, p_amount_cents, p_amount, p_status, p_ref)
+    on conflict (stripe_session_id) do nothing;
+
+    if not found then
+        return null;
+    end if;
+
+    update public.profiles
+       set credits = credits + p_amount
+     where user_id = p_user_id
+    returning credits into new_balance;
+
+    return new_balance;
+end;
+$$;
+
+-- Supabase exposes every function in public as an RPC to anon/authenticated
+-- callers; these run as their owner, so only the backend (service role) may
+-- call them.
+revoke execute on function public.reserve_credits(uuid, int) from public, anon, authenticated;
+revoke execute on function public.refund_credits(uuid, int) from public, anon, authenticated;
+revoke execute on function public.grant_credits(uuid, int, text, int, text) from public, anon, authenticated;
+
+grant execute on function public.reserve_credits(uuid, int) to service_role;
+grant execute on function public.refund_credits(uuid, int) to service_role;
+grant execute on function public.grant_credits(uuid, int, text, int, text) to service_role;
@@ -0,0 +1,29 @@
+"""
+Compare restyling a blank Document() with copying the cached DOCX skeleton.
+
+    cd backend && python -m scripts.bench_docx_skeletons [iterations]
+"""
+import sys
+import time
+
+from app.services.docx_skeletons import TEMPLATE_STYLES, _build_styled, new_document, warm_skeletons
+
+
+def bench(iterations: int = 200) -> None:
+    warm_skeletons()
+    for template_id in TEMPLATE_STYLES:
+        t0 = time.perf_counter()
+        for _ in range(iterations):
+            _build_styled(template_id)
+        fresh_ms = (time.perf_counter() - t0) * 1000 / iterations
+
+        t0 = time.perf_counter()
+        for _ in range(iterations):
+            new_document(template_id)
+        cached_ms = (time.perf_counter() - t0) * 1000 / iterations
+
+        print(f"{template_id:8s} fresh={fresh_ms:.2f}ms skeleton={cached_ms:.2f}ms")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,97 @@
+import pytest
+
+from app.services import analysis_jobs
+from app.services.analysis_jobs import AnalysisJobRunner, AnalysisJobStore
+from app.services.credit_ledger import CreditLedger, SqliteCreditBackend
+
+
+@pytest.fixture
+def ledger(monkeypatch):
+    backend = SqliteCreditBackend()
+    backend.set_balance("u1", 3)
+    ledger = CreditLedger(backend)
+    monkeypatch.setattr(analysis_jobs, "get_credit_ledger", lambda: ledger)
+    return ledger
+
+
+@pytest.fixture
+def runner(ledger):
+    return AnalysisJobRunner(AnalysisJobStore(), workers=1, wait_timeout=1)
+
+
+def recover_as_other_boot(runner, monkeypatch):
+    """What another server sharing the job DB does when it misjudges our job as orphaned."""
+    with monkeypatch.context() as m:
+        m.setattr(analysis_jobs, "boot_id", lambda: "other-boot")
+        return runner.recover_orphans()
+
+
+def test_success_commits(runner, ledger):
+    reservation = ledger.reserve("u1")
+    body, status = runner.run_inline("u1", reservation, lambda: ({"fit": 1}, 200), "k")
+    assert (body, status) == ({"fit": 1}, 200)
+    assert reservation.state == "committed"
+    assert ledger.backend.balance("u1") == 2
+
+
+def test_failure_refunds_once(runner, ledger):
+    reservation = ledger.reserve("u1")
+    body, status = runner.run_inline("u1", reservation, lambda: ({"error": "analysis_timeout"}, 504), "k")
+    assert status == 504
+    assert ledger.backend.balance("u1") == 3
+
+
+def test_exception_refunds_once(runner, ledger):
+    reservation = ledger.reserve("u1")
+
+    def boom():
+        raise RuntimeError("model crashed")
+
+    assert runner.run_inline("u1", reservation, boom, "k")[1] == 500
+    assert ledger.backend.balance("u1") == 3
+
+
+def test_failure_after_recovery_is_not_refunded_again(runner, ledger, monkeypatch):
+    reservation = ledger.reserve("u1")
+
+    def analysis():
+        assert recover_as_other_boot(runner, monkeypatch) == 1
+        return {"error": "Analysis failed"}, 500
+
+    body, status = runner.run_inline("u1", reservation, analysis, "k")
+    assert (body["error"], status) == ("interrupted", 500)
+    assert ledger.backend.balance("u1") == 3  # one refund, by recovery
+    assert reservation.state == "refunded"
+
+
+def test_success_after_recovery_is_a_lost_race(runner, ledger, monkeypatch):
+    reservation = ledger.reserve("u1")
+
+    def analysis():
+        recover_as_other_boot(runner, monkeypatch)
+        return {"fit": 1}, 200
+
+    body, status = runner.run_inline("u1", reservation, analysis, "k")
+    assert (body["error"], status) == ("interrupted", 500)
+    assert ledger.backend.balance("u1") == 3
+    assert runner.store.counts() == {"failed": 1}  # the result was not stored over the failed row
+    assert runner.stats()["failed"] == 1
+
+
+def test_job_failed_before_it_starts_does_not_run(runner, ledger, monkeypatch):
+    reservation = ledger.reserve("u1")
+    ran = []
+    job_id, _ = runner._register("u1", reservation, "k")
+    recover_as_other_boot(runner, monkeypatch)
+    body, status = runner._execute(job_id, reservation, lambda: ran.append(1) or ({}, 200))
+    assert ran == []
+    assert status == 500
+    assert ledger.backend.balance("u1") == 3
+
+
+def test_duplicate_waits_for_the_original(runner, ledger):
+    first = ledger.reserve("u1")
+    runner.run_inline("u1", first, lambda: ({"fit": 1}, 200), "k")
+    duplicate = runner.duplicate_of("k")
+    assert runner.outcome(duplicate, "u1") == ({"fit": 1}, 200)
+    assert ledger.backend.balance("u1") == 2  # charged once
@@ -0,0 +1,137 @@
+import time
+from types import SimpleNamespace
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+from app.utils.auth_tokens import Identity, TokenVerifier
+
+SECRET = "test-secret-at-least-32-bytes-long!!"
+
+
+class StubJWKClient:
+    """Stands in for jwt.PyJWKClient: serves locally generated public keys by kid."""
+
+    def __init__(self, keys: dict):
+        self.keys = keys
+        self.lookups = 0
+
+    def get_signing_key_from_jwt(self, token):
+        self.lookups += 1
+        kid = jwt.get_unverified_header(token).get("kid")
+        if kid not in self.keys:
+            raise jwt.PyJWKClientError(f"unknown kid {kid}")
+        return SimpleNamespace(key=self.keys[kid])
+
+
+@pytest.fixture(scope="module")
+def rsa_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@pytest.fixture(scope="module")
+def ec_key():
+    return ec.generate_private_key(ec.SECP256R1())
+
+
+@pytest.fixture
+def remote():
+    calls = []
+
+    def lookup(token):
+        calls.append(token)
+        return Identity(uid="remote-user")
+
+    lookup.calls = calls
+    return lookup
+
+
+@pytest.fixture
+def verifier(rsa_key, ec_key, remote):
+    jwks = StubJWKClient({"rsa": rsa_key.public_key(), "ec": ec_key.public_key()})
+    return TokenVerifier(jwt_secret=SECRET, jwks_client=jwks, cache_ttl=300, remote_lookup=remote)
+
+
+def claims(**overrides):
+    base = {"sub": "user-1", "email": "a@example.com", "aud": "authenticated", "exp": int(time.time()) + 600}
+    base.update(overrides)
+    return base
+
+
+def test_hs256_token_is_accepted(verifier, remote):
+    identity = verifier.verify(jwt.encode(claims(), SECRET, algorithm="HS256"))
+    assert identity.uid == "user-1"
+    assert identity.email == "a@example.com"
+    assert remote.calls == []
+
+
+@pytest.mark.parametrize("kid,alg,key", [("rsa", "RS256", "rsa_key"), ("ec", "ES256", "ec_key")])
+def test_asymmetric_token_is_accepted(verifier, remote, request, kid, alg, key):
+    token = jwt.encode(claims(), request.getfixturevalue(key), algorithm=alg, headers={"kid": kid})
+    assert verifier.verify(token).uid == "user-1"
+    assert remote.calls == []
+
+
+def test_expired_token_is_rejected(verifier, remote):
+    token = jwt.encode(claims(exp=int(time.time()) - 10), SECRET, algorithm="HS256")
+    assert verifier.verify(token) is None
+    assert remote.calls == []
+
+
+def test_wrong_audience_is_rejected(verifier, rsa_key):
+    token = jwt.encode(claims(aud="anon"), rsa_key, algorithm="RS256", headers={"kid": "rsa"})
+    assert verifier.verify(token) is None
+
+
+def test_bad_signature_is_rejected(verifier, remote):
+    assert verifier.verify(jwt.encode(claims(), "some-other-secret-of-32-bytes-long", algorithm="HS256")) is None
+    other = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    assert verifier.verify(jwt.encode(claims(), other, algorithm="RS256", headers={"kid": "rsa"})) is None
+    assert remote.calls == []
+
+
+def test_alg_none_falls_back_to_remote_lookup(verifier, remote):
+    token = jwt.encode(claims(), None, algorithm="none")
+    identity = verifier.verify(token)
+    assert identity.uid == "remote-user"  # never trusted locally
+    assert remote.calls == [token]
+
+
+def test_unknown_kid_falls_back_to_remote_lookup(verifier, remote, rsa_key):
+    token = jwt.encode(claims(), rsa_key, algorithm="RS256", headers={"kid": "rotated"})
+    assert verifier.verify(token).uid == "remote-user"
+    assert remote.calls == [token]
+
+
+def test_verified_identity_is_cached(verifier):
+    token = jwt.encode(claims(), SECRET, algorithm="HS256")
+    verifier.verify(token)
+    verifier.verify(token)
+    assert verifier.stats()["local_verifications"] == 1
+    assert verifier.stats()["cache_hits"] == 1
+
+
+def test_cache_ttl_is_capped_at_exp(verifier):
+    exp = int(time.time()) + 30
+    token = jwt.encode(claims(exp=exp), SECRET, algorithm="HS256")
+    verifier.verify(token)
+    _, valid_until = verifier._cache[verifier._cache_key(token)]
+    assert valid_until == exp  # not now + cache_ttl (300)
+
+
+def test_cache_ttl_applies_before_exp(verifier):
+    verifier.cache_ttl = 5
+    token = jwt.encode(claims(), SECRET, algorithm="HS256")
+    before = time.time()
+    verifier.verify(token)
+    _, valid_until = verifier._cache[verifier._cache_key(token)]
+    assert before + 5 <= valid_until <= time.time() + 5
+
+
+def test_remote_identity_is_cached_until_exp(verifier):
+    exp = int(time.time()) + 30
+    token = jwt.encode(claims(exp=exp), None, algorithm="none")
+    assert verifier.verify(token).expires_at == exp
+    _, valid_until = verifier._cache[verifier._cache_key(token)]
+    assert valid_until == exp
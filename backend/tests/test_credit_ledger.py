@@ -0,0 +1,158 @@
+import threading
+
+import pytest
+
+from app.services.credit_ledger import CreditLedger, SqliteCreditBackend, SupabaseCreditBackend
+
+
+@pytest.fixture
+def ledger():
+    backend = SqliteCreditBackend()
+    backend.set_balance("u1", 3)
+    return CreditLedger(backend)
+
+
+def test_reserve_takes_credits(ledger):
+    reservation = ledger.reserve("u1")
+    assert reservation.balance == 2
+    assert ledger.backend.balance("u1") == 2
+
+
+def test_reserve_refuses_when_balance_too_low(ledger):
+    assert ledger.reserve("u1", 4) is None
+    assert ledger.backend.balance("u1") == 3
+    assert ledger.reserve("nobody") is None
+
+
+def test_concurrent_reserves_never_overspend(ledger):
+    results = []
+
+    def take():
+        results.append(ledger.reserve("u1"))
+
+    threads = [threading.Thread(target=take) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(r is not None for r in results) == 3
+    assert ledger.backend.balance("u1") == 0
+
+
+def test_refund_returns_credits_once(ledger):
+    reservation = ledger.reserve("u1")
+    ledger.refund(reservation)
+    ledger.refund(reservation)
+    assert reservation.state == "refunded"
+    assert ledger.backend.balance("u1") == 3
+
+
+def test_committed_reservation_is_not_refunded(ledger):
+    reservation = ledger.reserve("u1")
+    ledger.commit(reservation)
+    ledger.refund(reservation)
+    assert ledger.backend.balance("u1") == 2
+
+
+def test_grant_is_idempotent_per_reference(ledger):
+    assert ledger.grant("u1", 10, "cs_1", 500) == 13
+    assert ledger.grant("u1", 10, "cs_1", 500) is None
+    assert ledger.grant("u1", 10, "cs_2", 500) == 23
+
+
+def test_grant_creates_missing_profile(ledger):
+    assert ledger.grant("u2", 5, "cs_3") == 5
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.op = "select"
+        self.values = None
+        self.filters = []
+
+    def select(self, *_):
+        return self
+
+    def limit(self, _):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def update(self, values):
+        self.op, self.values = "update", values
+        return self
+
+    def insert(self, values):
+        self.op, self.values = "insert", values
+        return self
+
+    def _match(self):
+        return [r for r in self.db[self.table] if all(r.get(c) == v for c, v in self.filters)]
+
+    def execute(self):
+        if self.op == "select":
+            return _Result(self._match())
+        if self.op == "update":
+            rows = self._match()
+            for row in rows:
+                row.update(self.values)
+            return _Result(rows)
+        hook = self.db.get("fail_insert")
+        if hook:
+            hook(self.table, self.values)
+        key = "stripe_session_id" if self.table == "purchases" else "user_id"
+        if any(r.get(key) == self.values[key] for r in self.db[self.table]):
+            raise Exception("duplicate key value violates unique constraint")
+        self.db[self.table].append(dict(self.values))
+        return _Result([self.values])
+
+
+class _Client:
+    """Just enough of the Supabase client for the compare-and-set fallback."""
+
+    def __init__(self):
+        self.db = {"profiles": [{"user_id": "u1", "credits": 1}], "purchases": []}
+
+    def table(self, name):
+        return _Query(self.db, name)
+
+    def rpc(self, name, params):
+        raise Exception("Could not find the function public.%s" % name)
+
+
+def test_fallback_grant_retry_after_failed_purchase_write():
+    client = _Client()
+    backend = SupabaseCreditBackend(client)
+    calls = []
+
+    def fail_once(table, values):
+        if table == "purchases" and not calls:
+            calls.append(values)
+            raise Exception("connection reset")
+
+    client.db["fail_insert"] = fail_once
+    with pytest.raises(Exception):
+        backend.grant("u1", 10, "in_1", 500, "SUBSCRIPTION_RENEWAL")
+    assert client.db["profiles"][0]["credits"] == 1
+    assert client.db["purchases"] == []
+
+    # The retry (e.g. the next webhook attempt) still grants
+    assert backend.grant("u1", 10, "in_1", 500, "SUBSCRIPTION_RENEWAL") == 11
+    assert backend.grant("u1", 10, "in_1", 500, "SUBSCRIPTION_RENEWAL") is None
+    assert client.db["profiles"][0]["credits"] == 11
+
+
+def test_missing_rpc_only_disables_that_rpc():
+    backend = SupabaseCreditBackend(_Client())
+    with pytest.raises(LookupError):
+        backend._rpc("grant_credits", {})
+    assert backend._rpc_missing == {"grant_credits"}
@@ -0,0 +1,178 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from openai import AsyncOpenAI
+
+from app.services.llm_gateway import LLMBusyError, LLMCancelledError, LLMGateway, LLMTimeoutError
+
+
+class FakeOpenAI(BaseHTTPRequestHandler):
+    """
+    Minimal /v1/responses endpoint. The request's `input` controls it:
+    "sleep:<seconds>" delays the answer; stream=True sends the text back as
+    response.output_text.delta events, one word each. Requests whose client
+    hung up before the answer was written are counted in `aborted`.
+    """
+
+    aborted = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        text = body.get("input") or ""
+        if text.startswith("sleep:"):
+            time.sleep(float(text.split(":", 1)[1]))
+        try:
+            if body.get("stream"):
+                self._stream(text)
+            else:
+                self._respond(text)
+        except (BrokenPipeError, ConnectionResetError):
+            FakeOpenAI.aborted += 1
+
+    def _respond(self, text):
+        data = json.dumps({
+            "id": "resp_test",
+            "object": "response",
+            "created_at": 0,
+            "model": "fake",
+            "status": "completed",
+            "output": [{
+                "type": "message",
+                "id": "msg_test",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": f"echo {text}", "annotations": []}],
+            }],
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, text):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for seq, word in enumerate(text.split()):
+            event = {
+                "type": "response.output_text.delta",
+                "delta": word,
+                "item_id": "msg_test",
+                "output_index": 0,
+                "content_index": 0,
+                "sequence_number": seq,
+            }
+            self.wfile.write(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAI)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/v1"
+    httpd.shutdown()
+
+
+def make_gateway(server, monkeypatch, **kwargs):
+    monkeypatch.setenv("OPENAI_BASE_URL", server)
+    client = AsyncOpenAI(api_key="test", max_retries=0)
+    return LLMGateway(client, **kwargs)
+
+
+def wait_idle(gateway, seconds=2.0):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        stats = gateway.stats()
+        if stats["in_flight"] == 0 and stats["waiting"] == 0:
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_run_returns_the_completion(server, monkeypatch):
+    gateway = make_gateway(server, monkeypatch)
+    response = gateway.responses("u1", model="fake", input="hello")
+    assert response.output_text == "echo hello"
+    assert gateway.stats()["completed"] == 1
+
+
+def test_busy_when_no_slot_frees_up(server, monkeypatch):
+    gateway = make_gateway(server, monkeypatch, max_concurrency=1, queue_timeout=0.2)
+    slow = threading.Thread(target=lambda: gateway.responses("u1", model="fake", input="sleep:1"))
+    slow.start()
+    time.sleep(0.1)
+    with pytest.raises(LLMBusyError):
+        gateway.responses("u2", model="fake", input="hello")
+    slow.join()
+    assert gateway.stats()["rejected"] == 1
+
+
+def test_per_user_limit(server, monkeypatch):
+    gateway = make_gateway(server, monkeypatch, max_concurrency=4, per_user_concurrency=1, queue_timeout=0.2)
+    slow = threading.Thread(target=lambda: gateway.responses("u1", model="fake", input="sleep:1"))
+    slow.start()
+    time.sleep(0.1)
+    with pytest.raises(LLMBusyError, match="per_user_limit"):
+        gateway.responses("u1", model="fake", input="hello")
+    assert gateway.responses("u2", model="fake", input="hello").output_text == "echo hello"
+    slow.join()
+
+
+def test_deadline(server, monkeypatch):
+    gateway = make_gateway(server, monkeypatch)
+    started = time.monotonic()
+    with pytest.raises(LLMTimeoutError):
+        gateway.responses("u1", timeout=0.3, model="fake", input="sleep:2")
+    assert time.monotonic() - started < 1.5
+    assert gateway.stats()["timeouts"] == 1
+    assert wait_idle(gateway)
+
+
+def test_client_disconnect_cancels_the_call(server, monkeypatch):
+    gateway = make_gateway(server, monkeypatch)
+    aborted = FakeOpenAI.aborted
+    gone_at = time.monotonic() + 0.3
+    started = time.monotonic()
+    with pytest.raises(LLMCancelledError):
+        gateway.responses("u1", disconnected=lambda: time.monotonic() > gone_at, model="fake", input="sleep:2")
+    assert time.monotonic() - started < 1.5
+    assert gateway.stats()["cancelled"] == 1
+    assert wait_idle(gateway)  # the task was cancelled and gave its slots back
+    deadline = time.monotonic() + 3
+    while FakeOpenAI.aborted == aborted and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert FakeOpenAI.aborted > aborted  # the HTTP request was dropped, not left running
+
+
+def test_stream_yields_events_as_they_arrive(server, monkeypatch):
+    gateway = make_gateway(server, monkeypatch)
+    events = gateway.stream(
+        "u1", lambda: gateway.client.responses.create(model="fake", input="one two three", stream=True)
+    )
+    deltas = [e.delta for e in events if getattr(e, "type", None) == "response.output_text.delta"]
+    assert deltas == ["one", "two", "three"]
+    assert gateway.stats()["completed"] == 1
+
+
+def test_stream_disconnect_cancels_it(server, monkeypatch):
+    gateway = make_gateway(server, monkeypatch)
+    gone_at = time.monotonic() + 0.3
+    events = gateway.stream(
+        "u1",
+        lambda: gateway.client.responses.create(model="fake", input="sleep:2", stream=True),
+        disconnected=lambda: time.monotonic() > gone_at,
+    )
+    with pytest.raises(LLMCancelledError):
+        list(events)
+    assert wait_idle(gateway)
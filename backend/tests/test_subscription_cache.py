@@ -0,0 +1,139 @@
+import pytest
+
+from app.services import subscription_cache
+from app.services.subscription_cache import SubscriptionCache
+
+
+class FakeClock:
+    """Replaces the module's `time`: monotonic() and time() move together."""
+
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+class FakeStripe:
+    """Local stand-in for stripe.Subscription.retrieve."""
+
+    def __init__(self):
+        self.subscriptions = {}
+        self.calls = []
+
+    def __call__(self, subscription_id):
+        self.calls.append(subscription_id)
+        sub = self.subscriptions.get(subscription_id)
+        return subscription_cache.subscription_state(sub) if sub else None
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(subscription_cache, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def stripe_api():
+    api = FakeStripe()
+    api.subscriptions["sub_1"] = {"id": "sub_1", "status": "active", "current_period_end": 100, "metadata": {"uid": "u1"}}
+    return api
+
+
+@pytest.fixture
+def cache(clock, stripe_api):
+    return SubscriptionCache(ttl=60, fetcher=stripe_api)
+
+
+def event(status: str, created: int, sub_id: str = "sub_1", kind: str = "customer.subscription.updated"):
+    return {"type": kind, "created": created, "data": {"object": {"id": sub_id, "status": status, "metadata": {}}}}
+
+
+def test_miss_then_hit(cache, stripe_api):
+    assert cache.get("sub_1")["status"] == "active"
+    assert cache.get("sub_1")["metadata"] == {"uid": "u1"}
+    assert stripe_api.calls == ["sub_1"]
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_unknown_subscription_is_not_cached(cache, stripe_api):
+    assert cache.get("sub_missing") is None
+    assert cache.get("sub_missing") is None
+    assert stripe_api.calls == ["sub_missing", "sub_missing"]
+
+
+def test_returned_state_is_a_copy(cache):
+    cache.get("sub_1")["status"] = "mutated"
+    assert cache.get("sub_1")["status"] == "active"
+
+
+def test_entry_expires_after_ttl(cache, stripe_api, clock):
+    cache.get("sub_1")
+    clock.advance(59)
+    cache.get("sub_1")
+    assert len(stripe_api.calls) == 1
+    stripe_api.subscriptions["sub_1"]["status"] = "past_due"
+    clock.advance(2)
+    assert cache.get("sub_1")["status"] == "past_due"
+    assert len(stripe_api.calls) == 2
+
+
+def test_max_age_zero_forces_a_fetch(cache, stripe_api):
+    cache.get("sub_1")
+    stripe_api.subscriptions["sub_1"]["status"] = "active_renewed"
+    assert cache.get("sub_1", max_age=0)["status"] == "active_renewed"
+    assert len(stripe_api.calls) == 2
+
+
+def test_event_updates_entry_without_fetch(cache, stripe_api, clock):
+    assert cache.apply_event(event("past_due", int(clock.now) + 1))
+    assert cache.get("sub_1")["status"] == "past_due"
+    assert stripe_api.calls == []
+
+
+def test_older_event_is_ignored(cache, clock):
+    created = int(clock.now)
+    assert cache.apply_event(event("canceled", created + 10))
+    assert not cache.apply_event(event("active", created + 5))  # delivered late
+    assert cache.get("sub_1")["status"] == "canceled"
+    assert cache.stats()["event_updates"] == 1
+
+
+def test_event_older_than_a_fetch_is_ignored(cache, clock):
+    cache.get("sub_1")  # fetched now, so anything created before now is stale
+    assert not cache.apply_event(event("incomplete", int(clock.now) - 30))
+    assert cache.get("sub_1")["status"] == "active"
+
+
+def test_non_subscription_events_are_ignored(cache):
+    assert not cache.apply_event({"type": "invoice.paid", "created": 1, "data": {"object": {"id": "in_1"}}})
+    assert cache.stats()["entries"] == 0
+
+
+def test_put_after_modify(cache, stripe_api, clock):
+    cache.get("sub_1")
+    clock.advance(5)
+    modified = {"id": "sub_1", "status": "active", "cancel_at_period_end": True, "metadata": {"uid": "u1"}}
+    assert cache.put(modified)["cancel_at_period_end"] is True
+    assert cache.get("sub_1")["cancel_at_period_end"] is True
+    assert len(stripe_api.calls) == 1
+    # the webhook for a change made before our modify must not undo it
+    assert not cache.apply_event(event("active", int(clock.now) - 1))
+    assert cache.get("sub_1")["cancel_at_period_end"] is True
+
+
+def test_lru_bound(clock, stripe_api):
+    cache = SubscriptionCache(ttl=60, max_entries=2, fetcher=stripe_api)
+    for sub_id in ("sub_a", "sub_b", "sub_c"):
+        cache.put({"id": sub_id, "status": "active"})
+    assert cache.stats()["entries"] == 2
+    cache.get("sub_a")
+    assert stripe_api.calls == ["sub_a"]  # evicted first
@@ -2,7 +2,7 @@ import { useState, useRef } from "react";
 import {
     suggestResume,
     extractTextFromFileAPI,
-    smartAnalyze,
+    smartAnalyzeJob,
     getMe,
 } from "../services/apiClient";
 import { useMe } from "../context/MeContext.jsx";
@@ -155,7 +155,7 @@ export default function ResumeConstructor() {
         setLoading(true);
         setError(null);
         try {
-            const analysis = await smartAnalyze({
+            const analysis = await smartAnalyzeJob({
                 resumeText: rawResume,
                 jobText,
                 jobTitle,
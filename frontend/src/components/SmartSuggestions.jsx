@@ -1,5 +1,5 @@
 import { useState, useEffect } from "react";
-import { smartAnalyze, smartEnrich, getMe, createCheckoutSession } from "../services/apiClient";
+import { smartAnalyzeJob, smartEnrich, smartEnrichStream, getMe, createCheckoutSession } from "../services/apiClient";
 import AuthBox from "./AuthBox";
 
 
@@ -40,26 +40,45 @@ export default function SmartSuggestions({ resumeText, jobText, jobTitle, data:
       if (!me) { setNeedAuth(true); setLoading(false); return; }
 
       // Phase 1 — ML results (fast)
-      const mlResult = await smartAnalyze({ resumeText, jobText, jobTitle });
+      const mlResult = await smartAnalyzeJob({ resumeText, jobText, jobTitle });
       setData(mlResult);
       setLoading(false);
 
       // Phase 2 — OpenAI suggestions (slower, runs in background)
       setLoadingSuggestions(true);
+      const enrichArgs = {
+        resumeText,
+        jobText,
+        jobTitle,
+        presentSkills: mlResult?.present_skills || [],
+        missingSkills: mlResult?.missing_skills || [],
+        criticalGaps: mlResult?.critical_gaps || [],
+        // enrichment /analyze already started for these inputs
+        analysisId: mlResult?.analysis_id,
+      };
       try {
-        const enriched = await smartEnrich({
-          resumeText,
-          jobText,
-          jobTitle,
-          presentSkills: mlResult?.present_skills || [],
-          missingSkills: mlResult?.missing_skills || [],
-          criticalGaps: mlResult?.critical_gaps || [],
+        // Suggestions appear one by one as the model produces them
+        const enriched = await smartEnrichStream(enrichArgs, (name, value) => {
+          if (name === "personal_suggestions") {
+            setData(prev => ({ ...prev, personal_suggestions: value }));
+          } else if (name === "lego_resume") {
+            setData(prev => ({ ...prev, lego_resume: value }));
+          } else if (name === "suggestion") {
+            setData(prev => ({ ...prev, lego_suggestions: [...(prev?.lego_suggestions || []), value] }));
+          }
         });
         if (enriched) {
           setData(prev => ({ ...prev, ...enriched }));
         }
       } catch {
-        // suggestions failed silently — ML results already shown
+        try {
+          const enriched = await smartEnrich(enrichArgs);
+          if (enriched) {
+            setData(prev => ({ ...prev, ...enriched }));
+          }
+        } catch {
+          // suggestions failed silently — ML results already shown
+        }
       } finally {
         setLoadingSuggestions(false);
       }
@@ -67,12 +67,48 @@ export async function smartAnalyze({ resumeText, jobText, jobTitle }) {
 
   let analysis;
   try { analysis = await res.json(); } catch { analysis = null; }
+  if (res.status === 429) {
+    const wait = res.headers.get("Retry-After");
+    throw new Error(`${analysis?.message || "The server is busy."}${wait ? ` Try again in ${wait}s.` : ""}`);
+  }
   if (!res.ok) throw new Error((analysis && (analysis.error || analysis.message)) || `Smart analysis failed (${res.status})`);
 
   return analysis || null;
 }
 
-export async function smartEnrich({ resumeText, jobText, jobTitle, presentSkills, missingSkills, criticalGaps }) {
+// Job-based variant of smartAnalyze: enqueue, then poll until the analysis is
+// done. Resolves with the same object smartAnalyze returns.
+export async function smartAnalyzeJob({ resumeText, jobText, jobTitle }, { timeoutMs = 180000 } = {}) {
+  const headers = await authHeaders();
+  const res = await fetch(`${API_BASE}/smart/analyze/jobs`, {
+    method: "POST",
+    headers: { ...headers, "Content-Type": "application/json", "Accept": "application/json" },
+    body: JSON.stringify({ resume_text: resumeText, job_text: jobText, job_title: jobTitle })
+  });
+
+  let job;
+  try { job = await res.json(); } catch { job = null; }
+  if (res.status === 429) {
+    const wait = res.headers.get("Retry-After");
+    throw new Error(`${job?.message || "The server is busy."}${wait ? ` Try again in ${wait}s.` : ""}`);
+  }
+  if (!res.ok || !job?.job_id) throw new Error((job && (job.error || job.message)) || `Smart analysis failed (${res.status})`);
+
+  const deadline = Date.now() + timeoutMs;
+  while (Date.now() < deadline) {
+    const r = await fetch(`${API_BASE}/smart/analyze/jobs/${job.job_id}`, { headers });
+    let status;
+    try { status = await r.json(); } catch { status = null; }
+    if (!r.ok) throw new Error((status && (status.error || status.message)) || `Smart analysis failed (${r.status})`);
+    if (status.status === "done") return status.result || null;
+    if (status.status === "failed") throw new Error(status.error || "Smart analysis failed");
+    const wait = Number(r.headers.get("Retry-After")) || 1;
+    await new Promise(resolve => setTimeout(resolve, wait * 1000));
+  }
+  throw new Error("Smart analysis is taking too long, please try again.");
+}
+
+export async function smartEnrich({ resumeText, jobText, jobTitle, presentSkills, missingSkills, criticalGaps, analysisId }) {
   const headers = await authHeaders();
   const res = await fetch(`${API_BASE}/smart/enrich`, {
     method: "POST",
@@ -84,6 +120,7 @@ export async function smartEnrich({ resumeText, jobText, jobTitle, presentSkills
       present_skills: presentSkills,
       missing_skills: missingSkills,
       critical_gaps: criticalGaps,
+      analysis_id: analysisId,
     })
   });
 
@@ -94,6 +131,55 @@ export async function smartEnrich({ resumeText, jobText, jobTitle, presentSkills
 }
 
 
+// Streaming variant of smartEnrich (Server-Sent Events over a POST).
+// onEvent(name, data) fires for personal_suggestions, lego_resume and each
+// suggestion as it completes; resolves with the final "done" payload.
+export async function smartEnrichStream({ resumeText, jobText, jobTitle, presentSkills, missingSkills, criticalGaps, analysisId }, onEvent) {
+  const headers = await authHeaders();
+  const res = await fetch(`${API_BASE}/smart/enrich/stream`, {
+    method: "POST",
+    headers: { ...headers, "Content-Type": "application/json", "Accept": "text/event-stream" },
+    body: JSON.stringify({
+      resume_text: resumeText,
+      job_text: jobText,
+      job_title: jobTitle,
+      present_skills: presentSkills,
+      missing_skills: missingSkills,
+      critical_gaps: criticalGaps,
+      analysis_id: analysisId,
+    })
+  });
+  if (!res.ok || !res.body) throw new Error(`Enrich stream failed (${res.status})`);
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let result = null;
+
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) !== -1) {
+      const frame = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      let name = "message";
+      let data = "";
+      for (const line of frame.split("\n")) {
+        if (line.startsWith("event: ")) name = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      const parsed = data ? JSON.parse(data) : null;
+      if (name === "error") throw new Error(parsed?.error || "Enrich stream failed");
+      if (name === "done") result = parsed;
+      else if (onEvent) onEvent(name, parsed);
+    }
+  }
+  return result;
+}
+
 export async function getMe() {
   const headers = await authHeaders();
   const r = await fetch(`${API_BASE}/me`, { headers });
@@ -161,21 +247,39 @@ export async function extractTextFromFileAPI(file) {
   const data = await res.json();
   return data.text ?? "";
 }
+// Last export per endpoint; the server answers 304 when the resume is unchanged.
+const exportCache = new Map();
+
+function exportHeaders(key) {
+  const headers = { "Content-Type": "application/json" };
+  const cached = exportCache.get(key);
+  if (cached?.etag) headers["If-None-Match"] = cached.etag;
+  return headers;
+}
+
+async function exportBlob(key, res) {
+  if (res.status === 304 && exportCache.has(key)) {
+    return exportCache.get(key).blob;
+  }
+  const blob = await res.blob();
+  const etag = res.headers.get("ETag");
+  if (etag) exportCache.set(key, { etag, blob });
+  return blob;
+}
+
 export async function downloadOptimizedResumeDocx(resume) {
   const res = await fetch(`${API_BASE}/export/resume-docx`, {
     method: "POST",
-    headers: {
-      "Content-Type": "application/json",
-    },
+    headers: exportHeaders("docx"),
     body: JSON.stringify({ resume }),
   });
 
-  if (!res.ok) {
+  if (!res.ok && res.status !== 304) {
     const text = await res.text();
     throw new Error(`Failed to export DOCX: ${res.status} ${text}`);
   }
 
-  return await res.blob();
+  return await exportBlob("docx", res);
 }
 
 export async function getResumeTemplates() {
@@ -196,17 +300,49 @@ export async function getResumeTemplates() {
 }
 
 export async function downloadStyledResume(resume, templateId) {
+  const key = `styled:${templateId}`;
   const res = await fetch(`${API_BASE}/export/resume-styled`, {
+    method: "POST",
+    headers: exportHeaders(key),
+    body: JSON.stringify({ resume, template_id: templateId }),
+  });
+
+  if (!res.ok && res.status !== 304) {
+    const text = await res.text();
+    throw new Error(`Failed to export styled resume: ${res.status} ${text}`);
+  }
+
+  return await exportBlob(key, res);
+}
+
+export async function downloadResumePdf(resume, templateId) {
+  const key = `pdf:${templateId}`;
+  const res = await fetch(`${API_BASE}/export/resume-pdf`, {
+    method: "POST",
+    headers: exportHeaders(key),
+    body: JSON.stringify({ resume, template_id: templateId }),
+  });
+
+  if (!res.ok && res.status !== 304) {
+    const text = await res.text();
+    throw new Error(`Failed to export PDF: ${res.status} ${text}`);
+  }
+
+  return await exportBlob(key, res);
+}
+
+export async function downloadResumeBundle(resume, templateIds, format = "docx") {
+  const res = await fetch(`${API_BASE}/export/resume-bundle`, {
     method: "POST",
     headers: {
       "Content-Type": "application/json",
     },
-    body: JSON.stringify({ resume, template_id: templateId }),
+    body: JSON.stringify({ resume, template_ids: templateIds, format }),
   });
 
   if (!res.ok) {
     const text = await res.text();
-    throw new Error(`Failed to export styled resume: ${res.status} ${text}`);
+    throw new Error(`Failed to export resume bundle: ${res.status} ${text}`);
   }
 
   return await res.blob();